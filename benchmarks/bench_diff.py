@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+差异算法性能基准测试
+
+生成 1 万到 100 万行的合成文本（含大量重复行），随机插入、删除和修改少量行，
+比较 difflib、myers、histogram 三种算法计算操作码的耗时。
+
+用法:
+    python benchmarks/bench_diff.py
+    python benchmarks/bench_diff.py --sizes 10000 100000 --edits 200
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from devkit_zero.tools import diff_tool  # noqa: E402
+
+
+def make_inputs(size: int, edits: int, seed: int = 0):
+    """生成一对测试输入：约一半的行来自很小的重复行集合"""
+    rng = random.Random(seed)
+    repeated = ["    }\n", "\n", "    return None\n", "# ------\n"]
+    lines1 = [
+        rng.choice(repeated) if rng.random() < 0.5
+        else f"line {i} value={rng.random():.6f}\n"
+        for i in range(size)
+    ]
+    lines2 = list(lines1)
+    for _ in range(edits):
+        pos = rng.randrange(len(lines2))
+        action = rng.random()
+        if action < 0.33:
+            lines2.insert(pos, f"inserted {rng.random():.6f}\n")
+        elif action < 0.66:
+            del lines2[pos]
+        else:
+            lines2[pos] = f"modified {rng.random():.6f}\n"
+    return lines1, lines2
+
+
+def run(sizes, edits, difflib_limit):
+    """运行基准测试并打印结果表"""
+    print(f"{'行数':>10} {'算法':>10} {'耗时(秒)':>10} {'变更块':>8}")
+    for size in sizes:
+        lines1, lines2 = make_inputs(size, edits)
+        for algorithm in diff_tool.DIFF_ALGORITHMS:
+            if algorithm == 'difflib' and size > difflib_limit:
+                print(f"{size:>10} {algorithm:>10} {'跳过':>10} {'-':>8}")
+                continue
+            start = time.perf_counter()
+            opcodes = diff_tool.get_opcodes(lines1, lines2, algorithm)
+            elapsed = time.perf_counter() - start
+            changes = sum(1 for opcode in opcodes if opcode[0] != 'equal')
+            print(f"{size:>10} {algorithm:>10} {elapsed:>10.3f} {changes:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='差异算法性能基准测试')
+    parser.add_argument('--sizes', nargs='+', type=int,
+                        default=[10000, 100000, 1000000], help='测试行数')
+    parser.add_argument('--edits', type=int, default=100, help='随机编辑次数')
+    parser.add_argument('--difflib-limit', type=int, default=100000,
+                        help='超过该行数时跳过 difflib (默认: 100000)')
+    args = parser.parse_args()
+    run(args.sizes, args.edits, args.difflib_limit)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,93 +4,2376 @@
 """
 
 import argparse
+import ast
+import bz2
 import json
 import csv
+import glob
+import gzip
+import heapq
+import io
+import lzma
+import mmap
+import operator
 import os
-from typing import Any, Dict, List
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from array import array
+from collections import deque
+from datetime import date
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import chain, compress, islice
+from typing import (Any, Callable, Dict, IO, Iterable, Iterator, List, MutableSequence,
+                    Optional, Sequence, Tuple)
 
 
-def json_to_csv(json_data: Any, output_path: str = None) -> str:
-    """将 JSON 数据转换为 CSV 格式"""
+# 支持的数据格式 (ndjson 为每行一个 JSON 对象)
+FORMATS = ('json', 'csv', 'ndjson')
+# 只能作为输出的格式
+OUTPUT_FORMATS = FORMATS + ('sqlite',)
+
+# 增量读取 JSON 时每次读入的字符数
+JSON_READ_SIZE = 1024 * 1024
+
+# JSON 转 CSV 时确定表头的方式：
+#   sample   - 根据前 N 行的字段确定 (之后出现的新字段会被忽略)
+#   header   - 使用声明的表头
+#   two-pass - 先把所有行暂存到临时文件并收集全部字段，再写出
+SCHEMA_STRATEGIES = ('sample', 'header', 'two-pass')
+DEFAULT_SCHEMA_SAMPLE_SIZE = 1000
+
+# 展开嵌套 JSON 时数组的处理方式：
+#   join    - 元素用分隔符连接 (对象元素编码为 JSON)
+#   explode - 每个元素输出一行，多个数组时为笛卡尔积
+#   json    - 整个数组编码为 JSON
+FLATTEN_ARRAYS = ('join', 'explode', 'json')
+
+# 列式读取时每批的行数
+TABLE_BATCH_SIZE = 65536
+
+# 列式读取 CSV 时相同取值共享同一个字符串对象，不同取值超过该数量的列不再共享
+SHARED_VALUES_LIMIT = 65536
+
+# 类型推断可以得到的列类型；先根据前 N 行猜测类型，再按批验证
+COLUMN_TYPES = ('null', 'bool', 'int', 'float', 'date', 'string')
+DEFAULT_INFER_SAMPLE_SIZE = 1000
+
+# 透明压缩：读取时按扩展名或文件头识别，写出时按扩展名选择
+COMPRESSIONS = ('gzip', 'bz2', 'xz')
+COMPRESSION_EXTENSIONS = {'.gz': 'gzip', '.gzip': 'gzip', '.bz2': 'bz2',
+                          '.xz': 'xz', '.lzma': 'xz'}
+# 默认压缩级别；gzip 不使用 9，压缩率相差很小但速度慢得多
+DEFAULT_COMPRESS_LEVELS = {'gzip': 6, 'bz2': 9, 'xz': 6}
+# 文件读写的缓冲区大小
+IO_BUFFER_SIZE = 1024 * 1024
+# 作为输入文件名时表示标准输入
+STDIN = '-'
+
+# 批量转换时输出文件名的模板，可用 {stem} {name} {ext} {parent}
+BATCH_OUTPUT_TEMPLATE = '{stem}.{ext}'
+# 各输出格式的文件扩展名
+FORMAT_EXTENSIONS = {'json': 'json', 'csv': 'csv', 'ndjson': 'ndjson', 'sqlite': 'db'}
+
+# 导入 SQLite：默认表名、已存在时的处理方式
+DEFAULT_SQLITE_TABLE = 'data'
+SQLITE_IF_EXISTS = ('fail', 'replace', 'append')
+# 批量导入时的 pragma；整个导入在一个事务中完成，失败时回滚
+SQLITE_BULK_PRAGMAS = (
+    'locking_mode = EXCLUSIVE',
+    'temp_store = MEMORY',
+    'cache_size = -262144',
+)
+# 只用于新建的数据库：不写回滚日志、不等待落盘，导入失败时直接删除数据库文件
+SQLITE_NEW_DATABASE_PRAGMAS = (
+    'journal_mode = OFF',
+    'synchronous = OFF',
+)
+
+# 外部排序：内存中的行超过内存上限或行数上限时排序后写入临时文件 (一个有序段)，
+# 最后用 heapq.merge 多路归并；有序段过多时先分组归并以限制同时打开的文件数
+DEFAULT_SORT_MEMORY = 256 * 1024 * 1024
+DEFAULT_SORT_RUN_ROWS = 1000000
+SORT_MAX_FANIN = 64
+
+# 并行解析 CSV 时每个任务处理的字节数
+CSV_CHUNK_SIZE = 4 * 1024 * 1024
+
+_WHITESPACE = re.compile(r'[ \t\r\n]*')
+# 可能出现在 JSON 数字中的字符
+_NUMBER_CHARS = frozenset('0123456789.eE+-')
+
+_COMPRESSION_MAGIC = ((b'\x1f\x8b', 'gzip'), (b'BZh', 'bz2'), (b'\xfd7zXZ\x00', 'xz'))
+_DECOMPRESSORS = {'gzip': gzip.open, 'bz2': bz2.open, 'xz': lzma.open}
+
+# 类型推断：一列的不同取值用换行连接后由一个正则整体匹配。
+# 整数不允许前导零，避免把 007 之类的编号当作数字
+_NULL_VALUES = frozenset({None, '', 'null', 'NULL', 'None'})
+_BOOL_VALUES = {'true': True, 'True': True, 'TRUE': True,
+                'false': False, 'False': False, 'FALSE': False}
+_INTEGER = r'[-+]?(?:0|[1-9]\d*)'
+_TYPE_PATTERNS = {
+    'bool': re.compile(r'(?:(?:true|True|TRUE|false|False|FALSE)\n)*\Z'),
+    'int': re.compile(rf'(?:{_INTEGER}\n)*\Z'),
+    'float': re.compile(
+        rf'(?:(?:{_INTEGER}(?:\.\d*)?|[-+]?\.\d+)(?:[eE][-+]?\d+)?\n)*\Z'),
+    'date': re.compile(r'(?:\d{4}-\d{2}-\d{2}\n)*\Z'),
+}
+_TYPE_PARSERS = {'bool': _BOOL_VALUES.__getitem__, 'int': int, 'float': float,
+                 'date': str}
+
+
+def _skip_whitespace(buffer: str, pos: int) -> int:
+    return _WHITESPACE.match(buffer, pos).end()
+
+
+def iter_json_array(stream: IO[str], read_size: int = JSON_READ_SIZE) -> Iterator[Any]:
+    """
+    增量解析 JSON 数组，逐个产出其中的元素
+
+    每次只读入 read_size 个字符，已解析的部分会被丢弃，内存占用只与单个
+    元素的大小有关，与整个数组的大小无关。
+
+    Args:
+        stream: 文本输入流
+        read_size: 每次读入的字符数
+
+    Returns:
+        数组元素的迭代器
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def fill(pos: int, size: int) -> Tuple[str, int, bool]:
+        chunk = stream.read(size)
+        return buffer[pos:] + chunk, 0, not chunk
+
+    # 定位数组开头
+    while True:
+        pos = _skip_whitespace(buffer, pos)
+        if pos < len(buffer) or eof:
+            break
+        buffer, pos, eof = fill(pos, read_size)
+    if pos >= len(buffer):
+        raise ValueError("JSON 数据为空")
+    if buffer[pos] != '[':
+        raise ValueError("JSON 数据必须是列表格式才能转换为 CSV")
+    pos += 1
+
+    expect_value = None  # None: 数组开头; True: 逗号之后; False: 元素之后
+    while True:
+        pos = _skip_whitespace(buffer, pos)
+        if pos >= len(buffer):
+            if eof:
+                raise ValueError("JSON 数组不完整")
+            buffer, pos, eof = fill(pos, read_size)
+            continue
+
+        char = buffer[pos]
+        if expect_value is not True and char == ']':
+            pos += 1
+            break
+        if expect_value is False:
+            if char != ',':
+                raise ValueError(f"JSON 数组格式错误: 期望 ',' 或 ']'，实际为 {char!r}")
+            pos += 1
+            expect_value = True
+            continue
+
+        # 元素可能跨越读入边界：解析失败、解析到缓冲区末尾或数字之后紧跟可能
+        # 属于同一个数字的字符 (如 "1." | "25") 时继续读入，并逐次加倍读入量，
+        # 避免超大元素被反复解析
+        size = read_size
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                if eof or (end < len(buffer) and not (
+                        isinstance(value, (int, float))
+                        and buffer[end] in _NUMBER_CHARS)):
+                    break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            buffer, pos, eof = fill(pos, size)
+            size *= 2
+        yield value
+        pos = end
+        expect_value = False
+
+    # 数组之后只允许空白
+    while True:
+        pos = _skip_whitespace(buffer, pos)
+        if pos < len(buffer):
+            raise ValueError(f"JSON 数组之后有多余的内容: {buffer[pos:pos + 20]!r}")
+        if eof:
+            return
+        buffer, pos, eof = fill(pos, read_size)
+
+
+def _check_object(row: Any, index: int) -> Dict[str, Any]:
+    if not isinstance(row, dict):
+        raise ValueError(f"第 {index + 1} 项不是 JSON 对象，无法转换为 CSV 行")
+    return row
+
+
+def _spill_rows(rows: Iterable[Dict[str, Any]],
+                observe: Optional[Callable[[Dict[str, Any]], None]] = None
+                ) -> Tuple[List[str], Iterator[Dict[str, Any]]]:
+    """第一遍把行写入临时文件并收集字段 (或交给 observe)，第二遍从临时文件逐行读回"""
+    spill = tempfile.TemporaryFile('w+', encoding='utf-8')
+    fields = set()
+    try:
+        for index, row in enumerate(rows):
+            if observe:
+                observe(_check_object(row, index))
+            else:
+                fields.update(_check_object(row, index).keys())
+            spill.write(json.dumps(row, ensure_ascii=False))
+            spill.write('\n')
+        spill.seek(0)
+        # CSV 中超出表头的多余字段 (键为 None) 没有列名，不写出
+        fields.discard(None)
+    except BaseException:
+        spill.close()
+        raise
+
+    def replay() -> Iterator[Dict[str, Any]]:
+        with spill:
+            for line in spill:
+                yield json.loads(line)
+
+    return sorted(fields), replay()
+
+
+def resolve_schema(rows: Iterable[Dict[str, Any]], strategy: str = 'sample',
+                   sample_size: int = DEFAULT_SCHEMA_SAMPLE_SIZE,
+                   header: Optional[List[str]] = None
+                   ) -> Tuple[List[str], Iterator[Dict[str, Any]]]:
+    """
+    确定 CSV 表头
+
+    Args:
+        rows: 对象行的迭代器
+        strategy: 表头策略 (sample, header, two-pass)
+        sample_size: sample 策略采样的行数
+        header: header 策略使用的表头
+
+    Returns:
+        (表头字段列表, 行迭代器)，行迭代器仍会产出所有行
+    """
+    if strategy not in SCHEMA_STRATEGIES:
+        raise ValueError(f"不支持的表头策略: {strategy}. 可用策略: {', '.join(SCHEMA_STRATEGIES)}")
+    if strategy == 'header':
+        if not header:
+            raise ValueError("header 策略需要声明表头")
+        return list(header), iter(rows)
+    if strategy == 'two-pass':
+        return _spill_rows(rows)
+
+    rows = iter(rows)
+    sample = list(islice(rows, sample_size))
+    fields = set()
+    for index, row in enumerate(sample):
+        fields.update(_check_object(row, index).keys())
+    fields.discard(None)
+    return sorted(fields), chain(sample, rows)
+
+
+def write_csv_rows(rows: Iterable[Dict[str, Any]], stream: IO[str],
+                   fieldnames: List[str]) -> int:
+    """
+    按表头逐行写出 CSV，表头之外的字段被忽略
+
+    Args:
+        rows: 对象行的迭代器
+        stream: 文本输出流 (需以 newline='' 打开)
+        fieldnames: 表头字段列表
+
+    Returns:
+        写出的行数 (不含表头)
+    """
+    writer = csv.writer(stream)
+    writer.writerow(fieldnames)
+    count = 0
+    for index, row in enumerate(rows):
+        get = _check_object(row, index).get
+        writer.writerow([get(field, '') for field in fieldnames])
+        count += 1
+    return count
+
+
+def iter_ndjson(stream: IO[str]) -> Iterator[Any]:
+    """逐行解析 NDJSON，跳过空行"""
+    for number, line in enumerate(stream, 1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"NDJSON 第 {number} 行格式错误: {e}")
+
+
+def iter_csv_rows(stream: IO[str]) -> Iterator[Dict[str, str]]:
+    """逐行读取 CSV，第一行为表头"""
+    return csv.DictReader(stream)
+
+
+def read_rows(stream: IO[str], fmt: str) -> Iterator[Any]:
+    """按格式逐行读取输入流"""
+    if fmt == 'json':
+        return iter_json_array(stream)
+    if fmt == 'ndjson':
+        return iter_ndjson(stream)
+    if fmt == 'csv':
+        return iter_csv_rows(stream)
+    raise ValueError(f"不支持的格式: {fmt}. 可用格式: {', '.join(FORMATS)}")
+
+
+def _json_items(rows: Iterable[Any], indent: Optional[int]) -> Iterator[str]:
+    """JSON 数组中的各个元素 (已按数组内的层级缩进)"""
+    prefix = '\n' + ' ' * (indent or 0)
+    for row in rows:
+        text = json.dumps(row, ensure_ascii=False, indent=indent)
+        yield text.replace('\n', prefix) if indent else text
+
+
+def _write_json_fragments(fragments: Iterable[Tuple[str, int]], stream: IO[str],
+                          indent: Optional[int]) -> int:
+    """把若干段已拼接好的数组元素写成一个 JSON 数组"""
+    count = 0
+    prefix = '\n' + ' ' * (indent or 0)
+    for text, rows in fragments:
+        if rows:
+            stream.write(',' + prefix if count else '[' + prefix)
+            stream.write(text)
+            count += rows
+    stream.write('\n]\n' if count else '[]\n')
+    return count
+
+
+def write_json_array(rows: Iterable[Any], stream: IO[str],
+                     indent: Optional[int] = 2) -> int:
+    """
+    逐行写出 JSON 数组，输出与 json.dumps(list(rows), indent=indent) 相同
+
+    Args:
+        rows: 行迭代器
+        stream: 文本输出流
+        indent: 缩进空格数，None 表示每行一个紧凑的对象
+
+    Returns:
+        写出的行数
+    """
+    return _write_json_fragments(((item, 1) for item in _json_items(rows, indent)),
+                                 stream, indent)
+
+
+def write_ndjson(rows: Iterable[Any], stream: IO[str]) -> int:
+    """逐行写出 NDJSON，返回写出的行数"""
+    count = 0
+    dumps = json.JSONEncoder(ensure_ascii=False).encode
+    for row in rows:
+        stream.write(dumps(row))
+        stream.write('\n')
+        count += 1
+    return count
+
+
+def _compile_path(path: Tuple[str, ...]) -> Callable[[Dict[str, Any]], Any]:
+    """把键路径编译为访问函数，路径中途不是对象时返回 None"""
+    if len(path) == 1:
+        return operator.methodcaller('get', path[0])
+    if len(path) == 2:
+        first, second = path
+
+        def get_pair(row: Dict[str, Any]) -> Any:
+            value = row.get(first)
+            return value.get(second) if isinstance(value, dict) else None
+        return get_pair
+
+    def get_nested(row: Dict[str, Any]) -> Any:
+        value: Any = row
+        for key in path:
+            if not isinstance(value, dict):
+                return None
+            value = value.get(key)
+        return value
+    return get_nested
+
+
+def _replace_path(row: Dict[str, Any], path: Tuple[str, ...],
+                  value: Any) -> Dict[str, Any]:
+    """沿路径浅拷贝对象，并把路径末端替换为 value"""
+    copy = dict(row)
+    key = path[0]
+    copy[key] = value if len(path) == 1 else _replace_path(row[key], path[1:], value)
+    return copy
+
+
+_PLAIN_CELLS = frozenset({str, int, float, bool})
+
+
+class Flattener:
+    """
+    把嵌套的 JSON 对象展开为扁平的 CSV 行
+
+    键路径只发现一次 (样本或全部行)，每条路径编译为一个访问函数；之后每一行
+    只需依次调用这些函数，不再递归遍历对象。列名为用分隔符连接的路径，如 user.name。
+    """
+
+    def __init__(self, separator: str = '.', arrays: str = 'join',
+                 array_separator: str = ';'):
+        """
+        初始化
+
+        Args:
+            separator: 路径分隔符
+            arrays: 数组的处理方式 (join, explode, json)
+            array_separator: join 方式连接数组元素的分隔符
+        """
+        if arrays not in FLATTEN_ARRAYS:
+            raise ValueError(f"不支持的数组处理方式: {arrays}. 可用方式: {', '.join(FLATTEN_ARRAYS)}")
+        self.separator = separator
+        self.arrays = arrays
+        self.array_separator = array_separator
+        self.fieldnames: List[str] = []
+        self._paths: Dict[Tuple[str, ...], None] = {}
+        self._array_paths: Dict[Tuple[str, ...], None] = {}
+        self._accessors: List[Callable[[Dict[str, Any]], Any]] = []
+        self._explode: List[Tuple[Tuple[str, ...],
+                                  Callable[[Dict[str, Any]], Any]]] = []
+
+    def discover(self, row: Dict[str, Any], prefix: Tuple[str, ...] = ()) -> None:
+        """记录一行中的全部键路径"""
+        for key, value in row.items():
+            path = prefix + (key,)
+            if isinstance(value, list) and self.arrays == 'explode':
+                self._array_paths[path] = None
+                for element in value:
+                    if isinstance(element, dict) and element:
+                        self.discover(element, path)
+                    else:
+                        self._paths[path] = None
+                if not value:
+                    self._paths[path] = None
+            elif isinstance(value, dict) and value:
+                self.discover(value, path)
+            else:
+                self._paths[path] = None
+
+    def compile(self, header: Optional[List[str]] = None) -> None:
+        """
+        根据发现的路径生成访问函数，列按名称排序
+
+        Args:
+            header: 声明的表头；给出时按表头中的路径输出，不需要事先发现路径
+        """
+        if header:
+            self.fieldnames = list(header)
+            paths = [tuple(name.split(self.separator)) for name in header]
+            explode = {}
+            if self.arrays == 'explode':
+                explode = {path[:end]: None
+                           for path in paths for end in range(1, len(path) + 1)}
+        else:
+            # 展开后元素为对象的数组只保留其下的路径 (空数组也会记录为叶子路径)
+            parents = {path[:end]
+                       for path in self._paths for end in range(1, len(path))}
+            names: Dict[str, Tuple[str, ...]] = {}
+            for path in self._paths:
+                if path not in parents or path not in self._array_paths:
+                    names.setdefault(self.separator.join(path), path)
+            self.fieldnames = sorted(names)
+            paths = [names[name] for name in self.fieldnames]
+            explode = self._array_paths
+        self._accessors = [_compile_path(path) for path in paths]
+        self._explode = [(path, _compile_path(path))
+                         for path in sorted(explode, key=len)]
+
+    def _cell(self, value: Any) -> Any:
+        if value is None:
+            return ''
+        if isinstance(value, list) and self.arrays != 'json':
+            return self.array_separator.join(
+                item if isinstance(item, str) else json.dumps(item, ensure_ascii=False)
+                for item in value)
+        if isinstance(value, (list, dict)):
+            return json.dumps(value, ensure_ascii=False)
+        return value
+
+    def _explode_row(self, row: Dict[str, Any]) -> List[Dict[str, Any]]:
+        rows = [row]
+        for path, get in self._explode:
+            exploded = []
+            for item in rows:
+                value = get(item)
+                if isinstance(value, list) and value:
+                    exploded.extend(_replace_path(item, path, element)
+                                    for element in value)
+                else:
+                    exploded.append(item)
+            rows = exploded
+        return rows
+
+    def flatten(self, row: Dict[str, Any]) -> Iterator[List[Any]]:
+        """把一行展开为一个或多个按 fieldnames 排列的值列表"""
+        cell = self._cell
+        for item in self._explode_row(row) if self._explode else (row,):
+            values = [get(item) for get in self._accessors]
+            yield [value if value.__class__ in _PLAIN_CELLS else cell(value)
+                   for value in values]
+
+
+def write_flat_csv(rows: Iterable[Dict[str, Any]], stream: IO[str],
+                   flattener: Flattener, schema: str = 'sample',
+                   sample_size: int = DEFAULT_SCHEMA_SAMPLE_SIZE,
+                   header: Optional[List[str]] = None) -> int:
+    """
+    展开嵌套对象后写出 CSV
+
+    Args:
+        rows: 对象行的迭代器
+        stream: 文本输出流 (需以 newline='' 打开)
+        flattener: 展开规则
+        schema: 发现键路径的方式 (sample, header, two-pass)
+        sample_size: sample 策略采样的行数
+        header: header 策略使用的表头 (路径形式)
+
+    Returns:
+        写出的行数 (explode 时为展开后的行数)
+    """
+    if schema not in SCHEMA_STRATEGIES:
+        raise ValueError(f"不支持的表头策略: {schema}. 可用策略: {', '.join(SCHEMA_STRATEGIES)}")
+    rows = iter(rows)
+    if schema == 'header':
+        if not header:
+            raise ValueError("header 策略需要声明表头")
+        flattener.compile(header)
+    elif schema == 'two-pass':
+        _, rows = _spill_rows(rows, flattener.discover)
+        flattener.compile()
+    else:
+        sample = list(islice(rows, sample_size))
+        for index, row in enumerate(sample):
+            flattener.discover(_check_object(row, index))
+        rows = chain(sample, rows)
+        flattener.compile()
+
+    writer = csv.writer(stream)
+    count = 0
+    for index, row in enumerate(rows):
+        for values in flattener.flatten(_check_object(row, index)):
+            if not count:
+                writer.writerow(flattener.fieldnames)
+            writer.writerow(values)
+            count += 1
+    return count
+
+
+def write_rows(rows: Iterable[Any], stream: IO[str], fmt: str, schema: str = 'sample',
+               sample_size: int = DEFAULT_SCHEMA_SAMPLE_SIZE,
+               header: Optional[List[str]] = None,
+               flatten: Optional[Flattener] = None) -> int:
+    """
+    按格式逐行写出
+
+    Args:
+        rows: 行迭代器
+        stream: 文本输出流 (CSV 需以 newline='' 打开)
+        fmt: 输出格式 (json, csv, ndjson)
+        schema: 输出 CSV 时的表头策略 (sample, header, two-pass)
+        sample_size: sample 策略采样的行数
+        header: header 策略使用的表头
+        flatten: 输出 CSV 时展开嵌套对象的规则
+
+    Returns:
+        写出的行数
+    """
+    if flatten is not None:
+        if fmt != 'csv':
+            raise ValueError("展开嵌套对象只适用于 CSV 输出")
+        return write_flat_csv(rows, stream, flatten, schema, sample_size, header)
+    if fmt == 'json':
+        return write_json_array(rows, stream)
+    if fmt == 'ndjson':
+        return write_ndjson(rows, stream)
+    if fmt != 'csv':
+        raise ValueError(f"不支持的格式: {fmt}. 可用格式: {', '.join(FORMATS)}")
+    rows = iter(rows)
+    head = list(islice(rows, 1))
+    if not head:
+        return 0
+    fieldnames, rows = resolve_schema(chain(head, rows), schema, sample_size, header)
+    return write_csv_rows(rows, stream, fieldnames)
+
+
+def _sort_rank(value: Any) -> Tuple[int, Any]:
+    """让不同类型的值可以互相比较：空值在前，然后是数字、字符串和其他值"""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (3, json.dumps(value, ensure_ascii=False, sort_keys=True))
+
+
+def sort_key_function(keys: Sequence[str]) -> Callable[[Dict[str, Any]], Any]:
+    """按列名生成排序键函数 (CSV 的值是字符串，按数值排序需要先推断类型)"""
+    if len(keys) == 1:
+        key = keys[0]
+        return lambda row: _sort_rank(row.get(key))
+    return lambda row: tuple(_sort_rank(row.get(key)) for key in keys)
+
+
+def _write_run(rows: Iterable[Dict[str, Any]], directory: str) -> str:
+    """把有序行写入临时目录中的一个新文件，返回文件路径"""
+    fd, path = tempfile.mkstemp(suffix='.ndjson', dir=directory)
+    with open(fd, 'w', encoding='utf-8', buffering=IO_BUFFER_SIZE) as f:
+        write_ndjson(rows, f)
+    return path
+
+
+def _read_run(path: str) -> Iterator[Dict[str, Any]]:
+    # 归并时同时打开最多 SORT_MAX_FANIN 个文件，读缓冲区不宜过大
+    with open(path, 'r', encoding='utf-8', buffering=64 * 1024) as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def _unique_rows(rows: Iterable[Dict[str, Any]],
+                 key: Callable[[Dict[str, Any]], Any]) -> Iterator[Dict[str, Any]]:
+    """有序行中每个排序键只保留第一行"""
+    previous = missing = object()
+    for row in rows:
+        current = key(row)
+        if previous is missing or current != previous:
+            previous = current
+            yield row
+
+
+def external_sort(rows: Iterable[Dict[str, Any]], keys: Sequence[str],
+                  unique: bool = False,
+                  memory_limit: int = DEFAULT_SORT_MEMORY,
+                  run_rows: int = DEFAULT_SORT_RUN_ROWS,
+                  temp_dir: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    外部归并排序，可以排序比内存大的输入
+
+    行先在内存中累积，估算的内存占用超过 memory_limit 或行数达到 run_rows 时
+    排序并写入临时文件；输入结束后用 heapq.merge 多路归并各有序段。全部数据
+    放得进内存时不写临时文件。排序是稳定的。
+
+    Args:
+        rows: 对象行的迭代器
+        keys: 排序列
+        unique: 每个排序键只保留 (输入顺序中的) 第一行
+        memory_limit: 内存中累积的行的估算字节数上限
+        run_rows: 每个有序段的行数上限
+        temp_dir: 临时文件目录
+
+    Returns:
+        有序行的迭代器
+    """
+    if not keys:
+        raise ValueError("排序需要至少一个排序列")
+    key = sort_key_function(keys)
+    with tempfile.TemporaryDirectory(prefix='devkit-sort-', dir=temp_dir) as directory:
+        runs: List[str] = []
+        buffer: List[Dict[str, Any]] = []
+        size = 0
+        for index, row in enumerate(rows):
+            buffer.append(_check_object(row, index))
+            size += sys.getsizeof(row) + sum(map(sys.getsizeof, row.values()))
+            if size >= memory_limit or len(buffer) >= run_rows:
+                buffer.sort(key=key)
+                runs.append(_write_run(_unique_rows(buffer, key) if unique else buffer,
+                                       directory))
+                buffer, size = [], 0
+        buffer.sort(key=key)
+        if runs:
+            if buffer:
+                runs.append(_write_run(_unique_rows(buffer, key) if unique else buffer,
+                                       directory))
+            buffer = []
+            while len(runs) > SORT_MAX_FANIN:
+                # 按顺序分组归并，保持相同排序键的行的输入顺序
+                merged_runs = []
+                for start in range(0, len(runs), SORT_MAX_FANIN):
+                    group = runs[start:start + SORT_MAX_FANIN]
+                    merged = heapq.merge(*map(_read_run, group), key=key)
+                    merged_runs.append(_write_run(merged, directory))
+                    for path in group:
+                        os.remove(path)
+                runs = merged_runs
+            ordered: Iterable[Dict[str, Any]] = heapq.merge(*map(_read_run, runs),
+                                                            key=key)
+        else:
+            ordered = buffer
+        yield from _unique_rows(ordered, key) if unique else ordered
+
+
+def convert_stream(input_stream: IO[str], output_stream: IO[str], from_format: str,
+                   to_format: str, infer_types: bool = False,
+                   select: Optional[List[str]] = None, where: Optional[str] = None,
+                   sort_by: Optional[List[str]] = None, unique: bool = False,
+                   sort_memory: int = DEFAULT_SORT_MEMORY,
+                   sort_run_rows: int = DEFAULT_SORT_RUN_ROWS, **options) -> int:
+    """
+    以流式方式在 json、csv、ndjson 之间转换，逐行读取、逐行写出
+
+    Args:
+        input_stream: 文本输入流
+        output_stream: 文本输出流
+        from_format: 源格式
+        to_format: 目标格式
+        infer_types: 推断 CSV 各列的类型，输出数字、布尔值和 null 而不是字符串
+        select: 只输出这些列 (按此顺序)，其余列在读取时即被丢弃
+        where: 过滤表达式，见 compile_predicate
+        sort_by: 按这些列外部排序 (列需包含在 select 中)
+        unique: 排序时每个排序键只保留第一行
+        sort_memory: 排序时内存中累积的行的估算字节数上限
+        sort_run_rows: 排序时每个有序段的行数上限
+        **options: 传给 write_rows 的选项 (schema, sample_size, header)
+
+    Returns:
+        写出的行数
+    """
+    if sort_by and select and set(sort_by) - set(select):
+        raise ValueError("排序列必须包含在 select 的列中")
+    if unique and not sort_by:
+        raise ValueError("去重需要同时指定排序列")
+    if infer_types and from_format != 'csv':
+        raise ValueError("类型推断只适用于 CSV 输入")
+    if not (infer_types or select or where):
+        rows: Iterable[Any] = read_rows(input_stream, from_format)
+        source = input_stream
+    else:
+        columns = _needed_columns(select, where)
+        types = None
+        source = input_stream
+        if infer_types:
+            # 先扫描一遍确定整列的类型，避免类型放宽前已经输出的行与之后的行类型不同
+            source, types = _scan_and_rewind(input_stream, columns)
+        tables = iter_tables(source, from_format, columns=columns,
+                             required=_where_columns(where))
+        tables = transform_tables(tables, select, where, infer_types, types)
+        if select and to_format == 'csv':
+            options.update(schema='header', header=select)
+        rows = chain.from_iterable(table.iter_rows() for table in tables)
+    if from_format == 'csv' and to_format == 'csv' and not select and \
+            options.get('schema') != 'header' and options.get('flatten') is None:
+        # CSV 到 CSV 保持源文件的列顺序：每行都含有全部表头字段，第一行的键即表头
+        rows = iter(rows)
+        head = list(islice(rows, 1))
+        if head:
+            options.update(schema='header',
+                           header=[name for name in head[0] if name is not None])
+            rows = chain(head, rows)
+    try:
+        if sort_by:
+            rows = external_sort(rows, sort_by, unique, sort_memory, sort_run_rows)
+        return write_rows(rows, output_stream, to_format, **options)
+    finally:
+        if source is not input_stream:
+            source.close()
+
+
+class Table:
+    """
+    列式存储的表格
+
+    每列是一个 list 或 array.array，表头字符串只保存一份 (sys.intern)。
+    与逐行的字典列表相比，省去了每行一个字典和重复的键；数值列还可以转换为
+    array('q') / array('d')，每个值只占 8 字节。
+
+    与 csv.DictReader 一致，超出表头的多余字段存放在键为 None 的列中。
+    """
+
+    def __init__(self, fieldnames: Sequence[Optional[str]],
+                 columns: Optional[Sequence[MutableSequence]] = None):
+        """
+        初始化表格
+
+        Args:
+            fieldnames: 列名列表
+            columns: 与列名一一对应的列数据，默认全部为空列
+        """
+        self.fieldnames: List[Optional[str]] = []
+        self.columns: List[MutableSequence] = []
+        self._index: Dict[Optional[str], int] = {}
+        if columns is None:
+            columns = [[] for _ in fieldnames]
+        if len(columns) != len(fieldnames):
+            raise ValueError("列数与表头数量不一致")
+        for name, column in zip(fieldnames, columns):
+            self._add_column(name, column)
+
+    def __len__(self) -> int:
+        return len(self.columns[0]) if self.columns else 0
+
+    def _add_column(self, name: Optional[str], column: MutableSequence) -> int:
+        if name in self._index:
+            raise ValueError(f"重复的列名: {name}")
+        self._index[name] = len(self.columns)
+        self.fieldnames.append(sys.intern(name) if isinstance(name, str) else name)
+        self.columns.append(column)
+        return len(self.columns) - 1
+
+    def column(self, name: Optional[str]) -> MutableSequence:
+        """按列名取出一列"""
+        try:
+            return self.columns[self._index[name]]
+        except KeyError:
+            raise KeyError(f"不存在的列: {name}") from None
+
+    def select(self, names: Sequence[Optional[str]]) -> 'Table':
+        """投影到指定的列 (列数据不会被复制)"""
+        return Table(names, [self.column(name) for name in names])
+
+    def set_column(self, name: Optional[str], column: MutableSequence) -> None:
+        """替换或新增一列"""
+        if len(column) != len(self) and self.columns:
+            raise ValueError(f"列 {name} 的长度与表格行数不一致")
+        if name in self._index:
+            self.columns[self._index[name]] = column
+        else:
+            self._add_column(name, column)
+
+    def to_array(self, name: str, typecode: str) -> None:
+        """
+        把一列转换为紧凑的 array，例如 'q' (整数) 或 'd' (浮点数)
+
+        Args:
+            name: 列名
+            typecode: array 类型码
+
+        Raises:
+            ValueError: 列中含有 None 或无法转换的值
+        """
+        try:
+            self.set_column(name, array(typecode, self.column(name)))
+        except (TypeError, OverflowError) as e:
+            raise ValueError(f"列 {name} 无法转换为 array('{typecode}'): {e}") from None
+
+    def extend(self, other: 'Table') -> None:
+        """追加另一张表的行，缺少的列以 None 填充"""
+        count = len(self)
+        for name, column in zip(other.fieldnames, other.columns):
+            index = self._index.get(name)
+            if index is None:
+                index = self._add_column(name, [None] * count)
+            self.columns[index].extend(column)
+        total = count + len(other)
+        for column in self.columns:
+            if len(column) < total:
+                column.extend([None] * (total - len(column)))
+
+    def iter_tuples(self) -> Iterator[tuple]:
+        """按行产出值元组，顺序与 fieldnames 相同"""
+        return zip(*self.columns)
+
+    def iter_rows(self) -> Iterator[Dict[Optional[str], Any]]:
+        """按行产出字典 (只在需要时临时构造)"""
+        fields = self.fieldnames
+        if None not in self._index:
+            for values in zip(*self.columns):
+                yield dict(zip(fields, values))
+            return
+        for values in zip(*self.columns):
+            row = dict(zip(fields, values))
+            if row[None] is None:
+                del row[None]
+            yield row
+
+    @classmethod
+    def from_records(cls, fieldnames: Sequence[str], records: List[List[str]],
+                     columns: Optional[Sequence[str]] = None) -> 'Table':
+        """
+        从 csv.reader 产出的记录构造，按 csv.DictReader 的规则处理长短不一的行
+
+        Args:
+            fieldnames: 表头
+            records: 记录列表 (空记录被跳过)
+            columns: 只构造这些列，其余字段不会被复制
+
+        Returns:
+            表格
+        """
+        width = len(fieldnames)
+        positions = None if columns is None else _column_positions(fieldnames, columns)
+        records = list(filter(None, records))
+        if set(map(len, records)) - {width}:
+            extras = [record[width:] or None for record in records]
+            records = [record[:width] + [None] * (width - len(record))
+                       for record in records]
+            if any(extras):
+                fieldnames = list(fieldnames) + [None]
+                records = [record + [extra] for record, extra in zip(records, extras)]
+        if positions is not None:
+            return cls(columns, [list(map(operator.itemgetter(position), records))
+                                 for position in positions])
+        if not records:
+            return cls(fieldnames)
+        return cls(fieldnames, [list(column) for column in zip(*records)])
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, Any]],
+                  columns: Optional[Sequence[str]] = None) -> 'Table':
+        """
+        从字典行构造，列按首次出现的顺序排列，缺失的值为 None
+
+        Args:
+            rows: 对象行的迭代器
+            columns: 只取这些列
+
+        Returns:
+            表格
+        """
+        if columns is not None:
+            rows = [_check_object(row, index) for index, row in enumerate(rows)]
+            return cls(columns, [list(map(operator.methodcaller('get', name), rows))
+                                 for name in columns])
+        table = cls([])
+        columns, index = table.columns, table._index
+        for count, row in enumerate(rows):
+            for key, value in _check_object(row, count).items():
+                position = index.get(key)
+                if position is None:
+                    position = table._add_column(key, [None] * count)
+                columns[position].append(value)
+            if len(row) < len(columns):
+                for column in columns:
+                    if len(column) == count:
+                        column.append(None)
+        return table
+
+
+def _column_positions(fieldnames: Sequence[Optional[str]],
+                      columns: Sequence[str]) -> List[int]:
+    """列名在表头中的位置"""
+    index = {name: position for position, name in enumerate(fieldnames)}
+    try:
+        return [index[name] for name in columns]
+    except KeyError as e:
+        raise ValueError(f"不存在的列: {e.args[0]}") from None
+
+
+def _share_values(table: Table, caches: List[Optional[Dict[Any, Any]]]) -> None:
+    """让各列中相同的取值共享同一个对象，低基数的列 (城市、状态等) 因此几乎不占额外内存"""
+    for index, cache in enumerate(caches):
+        if cache is None or index >= len(table.columns):
+            continue
+        column = table.columns[index]
+        table.columns[index] = list(map(cache.setdefault, column, column))
+        if len(cache) > SHARED_VALUES_LIMIT:
+            caches[index] = None
+
+
+def iter_tables(stream: IO[str], fmt: str, batch_size: int = TABLE_BATCH_SIZE,
+                columns: Optional[Sequence[str]] = None,
+                required: Sequence[str] = ()) -> Iterator[Table]:
+    """
+    按批读取输入，每批构造一张列式表格
+
+    CSV 直接从 csv.reader 的记录按列构造，不经过逐行字典，并且同一列中相同的
+    取值共享同一个字符串对象。
+
+    Args:
+        stream: 文本输入流
+        fmt: 输入格式 (json, csv, ndjson)
+        batch_size: 每批的行数
+        columns: 只读取这些列 (CSV 中不存在的列会报错，JSON 中缺失的值为 None)
+        required: 必须存在的列 (如过滤表达式用到的列)。CSV 读到表头时检查，
+                  JSON 在输入结束时检查每一列是否至少在一行中出现过
+
+    Returns:
+        表格迭代器
+
+    Raises:
+        ValueError: required 中有不存在的列
+    """
+    if fmt == 'csv':
+        reader = csv.reader(stream)
+        fieldnames = next(reader, None)
+        if fieldnames is None:
+            return
+        _column_positions(fieldnames, required)
+        if columns is not None:
+            _column_positions(fieldnames, columns)
+        caches: List[Optional[Dict[Any, Any]]] = [{} for _ in columns or fieldnames]
+        while True:
+            records = list(islice(reader, batch_size))
+            if not records:
+                return
+            table = Table.from_records(fieldnames, records, columns)
+            if len(table):
+                _share_values(table, caches)
+                yield table
+    rows = read_rows(stream, fmt)
+    missing = list(required)
+    empty = True
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        table = Table.from_rows(batch, columns)
+        empty = False
+        # 列一旦出现就不再检查，通常只有第一批需要扫描
+        missing = [name for name in missing
+                   if not any(name in row for row in batch)]
+        yield table
+    if missing and not empty:
+        raise ValueError(f"不存在的列: {missing[0]}")
+
+
+def read_table(stream: IO[str], fmt: str, batch_size: int = TABLE_BATCH_SIZE) -> Table:
+    """把整个输入读入一张列式表格"""
+    table = Table([])
+    for batch in iter_tables(stream, fmt, batch_size):
+        table.extend(batch)
+    return table
+
+
+def write_table(table: Table, stream: IO[str], fmt: str) -> int:
+    """
+    写出列式表格
+
+    CSV 按表格的列顺序写出 (忽略多余字段列)，值直接来自各列，不构造字典。
+
+    Args:
+        table: 表格
+        stream: 文本输出流 (CSV 需以 newline='' 打开)
+        fmt: 输出格式 (json, csv, ndjson)
+
+    Returns:
+        写出的行数
+    """
+    if fmt != 'csv':
+        return write_rows(table.iter_rows(), stream, fmt)
+    if not len(table):
+        return 0
+    names = [name for name in table.fieldnames if name is not None]
+    writer = csv.writer(stream)
+    writer.writerow(names)
+    writer.writerows(table.select(names).iter_tuples())
+    return len(table)
+
+
+def _matches_type(column_type: str, values: Sequence[str]) -> bool:
+    """用一次正则匹配检查一组取值是否都属于某个类型"""
+    text = '\n'.join(values) + '\n'
+    if text.count('\n') != len(values) or not _TYPE_PATTERNS[column_type].match(text):
+        return False
+    if column_type == 'date':
+        try:
+            for value in values:
+                date.fromisoformat(value)
+        except ValueError:
+            return False
+    return True
+
+
+def classify_values(values: Iterable[Optional[str]],
+                    guess: Optional[str] = None) -> str:
+    """
+    返回一组取值所属的最窄类型
+
+    只检查去重后的取值；给出 guess 时先验证猜测的类型，通常一次匹配即可确定。
+
+    Args:
+        values: 一列 (或一批) 取值
+        guess: 猜测的类型
+
+    Returns:
+        COLUMN_TYPES 中的一个
+    """
+    distinct = list(set(values) - _NULL_VALUES)
+    if not distinct:
+        return 'null'
+    if guess in _TYPE_PATTERNS and _matches_type(guess, distinct):
+        return guess
+    for column_type in _TYPE_PATTERNS:
+        if column_type != guess and _matches_type(column_type, distinct):
+            return column_type
+    return 'string'
+
+
+def _widen_type(first: str, second: str) -> str:
+    if first == second or second == 'null':
+        return first
+    if first == 'null':
+        return second
+    if {first, second} == {'int', 'float'}:
+        return 'float'
+    return 'string'
+
+
+def infer_column_types(table: Table, types: Optional[Dict[str, str]] = None,
+                       sample_size: Optional[int] = None) -> Dict[str, str]:
+    """
+    推断 (或验证) 表格各列的类型
+
+    Args:
+        table: 表格
+        types: 已知的列类型，作为猜测并只会被放宽 (int -> float -> string)
+        sample_size: 只检查每列的前 N 个值
+
+    Returns:
+        列名到类型的映射
+    """
+    types = dict(types or {})
+    for name, column in zip(table.fieldnames, table.columns):
+        if name is None:
+            continue
+        known = types.get(name)
+        values = column[:sample_size] if sample_size else column
+        types[name] = _widen_type(known or 'null', classify_values(values, known))
+    return types
+
+
+def apply_column_types(table: Table, types: Dict[str, str]) -> None:
+    """
+    按列类型转换表格中的值
+
+    每列只解析去重后的取值，再按映射表整列替换；空值 (空串、null、None) 变为 None。
+    字符串列保持原样，日期保留 ISO 格式的字符串；没有空值的数值列存为 array。
+
+    Args:
+        table: 表格 (原地修改)
+        types: 列名到类型的映射
+    """
+    for name, column_type in types.items():
+        if column_type == 'string' or name not in table.fieldnames:
+            continue
+        column = table.column(name)
+        if column_type == 'null':
+            table.set_column(name, [None] * len(column))
+            continue
+        parse = _TYPE_PARSERS[column_type]
+        distinct = set(column)
+        nulls = distinct & _NULL_VALUES
+        if not nulls and column_type in ('int', 'float'):
+            try:
+                table.set_column(name, array('q' if column_type == 'int' else 'd',
+                                             map(parse, column)))
+                continue
+            except OverflowError:
+                pass
+        distinct -= nulls
+        mapping = dict(zip(distinct, map(parse, distinct)))
+        mapping.update(dict.fromkeys(nulls))
+        table.set_column(name, list(map(mapping.__getitem__, column)))
+
+
+def iter_typed_tables(tables: Iterable[Table],
+                      sample_size: int = DEFAULT_INFER_SAMPLE_SIZE,
+                      types: Optional[Dict[str, str]] = None) -> Iterator[Table]:
+    """
+    按批推断并转换列类型
+
+    前 sample_size 行给出每列的猜测类型，之后每一批只需验证猜测；验证失败时
+    类型被放宽，并从这一批开始按放宽后的类型输出，已经产出的批次不会改变。
+    需要整列类型一致时先用 scan_column_types 确定最终类型再作为 types 传入。
+
+    Args:
+        tables: 表格迭代器 (一般来自 iter_tables)
+        sample_size: 用于猜测类型的行数
+        types: 已知的列类型
+
+    Returns:
+        转换后的表格迭代器
+    """
+    for table in tables:
+        if types is None:
+            types = infer_column_types(table, sample_size=sample_size)
+        types = infer_column_types(table, types)
+        apply_column_types(table, types)
+        yield table
+
+
+def scan_column_types(stream: IO[str], columns: Optional[List[str]] = None,
+                      sample_size: int = DEFAULT_INFER_SAMPLE_SIZE) -> Dict[str, str]:
+    """
+    读完整个 CSV 输入，验证每列的全部取值后得到最终的列类型 (只分类，不转换)
+
+    Args:
+        stream: 文本输入流
+        columns: 只检查这些列
+        sample_size: 用于猜测类型的行数
+
+    Returns:
+        列名到类型的映射
+    """
+    types = None
+    for table in iter_tables(stream, 'csv', columns=columns):
+        if types is None:
+            types = infer_column_types(table, sample_size=sample_size)
+        types = infer_column_types(table, types)
+    return types or {}
+
+
+def _scan_and_rewind(stream: IO[str], columns: Optional[List[str]] = None
+                     ) -> Tuple[IO[str], Dict[str, str]]:
+    """
+    第一遍扫描输入确定列类型，返回回到起点的输入流和类型
+
+    不能定位的流 (如标准输入) 先复制到临时文件，调用者负责关闭返回的临时文件。
+    """
+    if stream.seekable():
+        start = stream.tell()
+    else:
+        spool: IO[str] = tempfile.TemporaryFile('w+', encoding='utf-8', newline='')
+        shutil.copyfileobj(stream, spool, IO_BUFFER_SIZE)
+        stream, start = spool, 0
+        stream.seek(start)
+    types = scan_column_types(stream, columns)
+    stream.seek(start)
+    return stream, types
+
+
+_COMPARISONS = {
+    ast.Eq: operator.eq, ast.NotEq: operator.ne,
+    ast.Lt: operator.lt, ast.LtE: operator.le,
+    ast.Gt: operator.gt, ast.GtE: operator.ge,
+    ast.In: lambda value, container: value in container,
+    ast.NotIn: lambda value, container: value not in container,
+}
+
+
+def _as_number(value: Any) -> Any:
+    """与数字比较时把字符串转换为数字，无法转换时为 None"""
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return value
+
+
+def _numeric_getter(get: Callable[[tuple], Any]) -> Callable[[tuple], Any]:
+    return lambda values: _as_number(get(values))
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _safe_comparison(compare: Callable[[Any, Any], bool]) -> Callable[[Any, Any], bool]:
+    """空值只参与 == / !=，类型不可比较时结果为 False"""
+    def safe(left: Any, right: Any) -> bool:
+        if left is None or right is None:
+            return compare in (operator.eq, operator.ne) and compare(left, right)
+        try:
+            return compare(left, right)
+        except TypeError:
+            return False
+    return safe
+
+
+class _PredicateCompiler:
+    """把过滤表达式的语法树编译为嵌套的闭包，每个闭包接收按 columns 排列的值元组"""
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        self.columns: List[str] = []
+
+    def fail(self, node: ast.AST) -> ValueError:
+        return ValueError(f"不支持的过滤表达式: {self.expression} "
+                          f"(第 {getattr(node, 'col_offset', 0) + 1} 列)")
+
+    def column(self, name: str) -> Callable[[tuple], Any]:
+        if name not in self.columns:
+            self.columns.append(name)
+        return operator.itemgetter(self.columns.index(name))
+
+    def literal(self, node: ast.AST) -> Any:
+        try:
+            value = ast.literal_eval(node)
+        except ValueError:
+            raise self.fail(node) from None
+        if isinstance(value, (list, tuple, set)):
+            try:
+                return frozenset(value)
+            except TypeError:
+                return tuple(value)
+        return value
+
+    def reference(self, node: ast.AST) -> Optional[Callable[[tuple], Any]]:
+        """列引用：裸名称，或用 col('列 名') 引用不是标识符的列名"""
+        if isinstance(node, ast.Name) and node.id not in ('True', 'False', 'None'):
+            return self.column(node.id)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and \
+                node.func.id == 'col' and len(node.args) == 1 and not node.keywords:
+            name = self.literal(node.args[0])
+            if isinstance(name, str):
+                return self.column(name)
+            raise self.fail(node)
+        return None
+
+    def operand(self, node: ast.AST) -> Tuple[Optional[Callable[[tuple], Any]], Any]:
+        """(列访问函数, None) 或 (None, 常量)"""
+        reference = self.reference(node)
+        return (reference, None) if reference else (None, self.literal(node))
+
+    def compile(self, node: ast.AST) -> Callable[[tuple], Any]:
+        if isinstance(node, ast.BoolOp):
+            parts = [self.compile(value) for value in node.values]
+            if isinstance(node.op, ast.And):
+                return lambda values: all(part(values) for part in parts)
+            return lambda values: any(part(values) for part in parts)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            operand = self.compile(node.operand)
+            return lambda values: not operand(values)
+        if isinstance(node, ast.Compare):
+            pairs = []
+            left = node.left
+            for op, right in zip(node.ops, node.comparators):
+                pairs.append(self.comparison(left, op, right))
+                left = right
+            if len(pairs) == 1:
+                return pairs[0]
+            return lambda values: all(pair(values) for pair in pairs)
+        reference = self.reference(node)
+        if reference:
+            return lambda values: reference(values) not in _NULL_VALUES
+        raise self.fail(node)
+
+    def comparison(self, left: ast.AST, op: ast.cmpop,
+                   right: ast.AST) -> Callable[[tuple], bool]:
+        if type(op) not in _COMPARISONS:
+            raise self.fail(left)
+        compare = _safe_comparison(_COMPARISONS[type(op)])
+        left_get, left_value = self.operand(left)
+        right_get, right_value = self.operand(right)
+        numeric = _is_number(left_value) or _is_number(right_value) or (
+            isinstance(right_value, (frozenset, tuple)) and right_value and
+            all(_is_number(item) for item in right_value))
+        if numeric:
+            left_get = left_get and _numeric_getter(left_get)
+            right_get = right_get and _numeric_getter(right_get)
+        if left_get and right_get:
+            return lambda values: compare(left_get(values), right_get(values))
+        if left_get:
+            return lambda values: compare(left_get(values), right_value)
+        if right_get:
+            return lambda values: compare(left_value, right_get(values))
+        result = compare(left_value, right_value)
+        return lambda values: result
+
+
+def compile_predicate(expression: str) -> Tuple[List[str], Callable[[tuple], bool]]:
+    """
+    编译过滤表达式
+
+    表达式使用 Python 语法的一个安全子集：列名、常量 (字符串、数字、True/False/None、
+    常量列表)、比较 (== != < <= > >= in, not in，可以连写)、and / or / not。
+    列名不是标识符时用 col('列 名') 引用；单独的列名表示该列非空。
+    与数字常量比较时，字符串值会先转换为数字。表达式只编译一次，不使用 eval。
+
+    Args:
+        expression: 过滤表达式，例如 "age >= 18 and city in ['北京', '上海']"
+
+    Returns:
+        (表达式用到的列, 判定函数)，判定函数接收按这些列排列的值元组
+    """
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError as e:
+        raise ValueError(f"过滤表达式语法错误: {e.msg}") from None
+    compiler = _PredicateCompiler(expression)
+    predicate = compiler.compile(tree.body)
+    return compiler.columns, predicate
+
+
+def filter_table(table: Table, columns: Sequence[str],
+                 predicate: Callable[[tuple], bool]) -> Table:
+    """
+    按判定函数过滤表格的行，只读取判定用到的列 (表格中没有的列按空值处理)
+
+    Args:
+        table: 表格
+        columns: 判定函数用到的列
+        predicate: compile_predicate 返回的判定函数
+
+    Returns:
+        过滤后的表格 (全部保留时返回原表格)
+    """
+    values = [table.column(name) if name in table.fieldnames else [None] * len(table)
+              for name in columns]
+    if values:
+        mask = list(map(predicate, zip(*values)))
+    else:
+        mask = [predicate(())] * len(table)
+    if all(mask):
+        return table
+    return Table(table.fieldnames, [
+        array(column.typecode, compress(column, mask)) if isinstance(column, array)
+        else list(compress(column, mask))
+        for column in table.columns])
+
+
+def _where_columns(where: Optional[str]) -> List[str]:
+    """过滤表达式用到的列"""
+    return compile_predicate(where)[0] if where else []
+
+
+def _needed_columns(select: Optional[Sequence[str]],
+                    where: Optional[str]) -> Optional[List[str]]:
+    """投影与过滤共同需要读取的列，None 表示需要全部列"""
+    if not select:
+        return None
+    columns = list(select)
+    columns.extend(name for name in _where_columns(where) if name not in columns)
+    return columns
+
+
+def transform_tables(tables: Iterable[Table], select: Optional[Sequence[str]] = None,
+                     where: Optional[str] = None, infer_types: bool = False,
+                     types: Optional[Dict[str, str]] = None) -> Iterator[Table]:
+    """
+    依次对每批表格做类型推断、过滤和投影
+
+    Args:
+        tables: 表格迭代器 (最好已经用 iter_tables 的 columns 裁剪到需要的列)
+        select: 输出的列
+        where: 过滤表达式
+        infer_types: 是否推断列类型
+        types: 已知的列类型 (推断时作为猜测)
+
+    Returns:
+        处理后的表格迭代器，过滤后为空的批次会被跳过
+    """
+    columns, predicate = compile_predicate(where) if where else (None, None)
+    if infer_types:
+        tables = iter_typed_tables(tables, types=types)
+    for table in tables:
+        if predicate:
+            table = filter_table(table, columns, predicate)
+        if select:
+            table = table.select(select)
+        if len(table):
+            yield table
+
+
+def _record_end(data, start: int, pos: int, size: int) -> int:
+    """
+    返回 pos 处或之后第一个记录结束位置 (换行符之后)
+
+    start 必须是记录开头；引号内的换行不是记录边界，是否在引号内由 start 到
+    换行符之间双引号数量的奇偶性决定 (转义的 "" 成对出现，不影响奇偶性)。
+    """
+    quoted = data[start:pos].count(b'"') & 1
+    while True:
+        newline = data.find(b'\n', pos, size)
+        if newline < 0:
+            return size
+        quoted ^= data[pos:newline].count(b'"') & 1
+        if not quoted:
+            return newline + 1
+        pos = newline + 1
+
+
+def csv_chunk_ranges(path: str, chunk_size: int = CSV_CHUNK_SIZE
+                     ) -> Tuple[int, List[Tuple[int, int]]]:
+    """
+    把 CSV 文件切分为与记录边界对齐的字节范围
+
+    文件通过 mmap 读取，只用 find 和切片上的 bytes.count 在 C 层扫描引号和换行，
+    引号内含换行的字段不会被切开。
+
+    Args:
+        path: CSV 文件路径
+        chunk_size: 每个范围的近似字节数
+
+    Returns:
+        (表头结束位置, [(起点, 终点), ...])
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return 0, []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            header_end = _record_end(data, 0, 0, size)
+            ranges = []
+            start = header_end
+            while start < size:
+                end = size if size - start <= chunk_size else \
+                    _record_end(data, start, start + chunk_size, size)
+                ranges.append((start, end))
+                start = end
+    return header_end, ranges
+
+
+def _read_range(path: str, start: int, end: int) -> str:
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return f.read(end - start).decode('utf-8')
+
+
+def _chunk_table(path: str, start: int, end: int, fieldnames: List[str],
+                 columns: Optional[List[str]] = None) -> Table:
+    """解析一个字节范围内的记录，构造列式表格"""
+    reader = csv.reader(io.StringIO(_read_range(path, start, end), newline=''))
+    return Table.from_records(fieldnames, list(reader), columns)
+
+
+def _convert_csv_chunk(job: Tuple[str, int, int, List[str], str, Dict[str, Any]]
+                       ) -> Tuple[Any, int]:
+    """子进程中解析并序列化一个字节范围，返回 (输出文本, 行数)"""
+    path, start, end, fieldnames, to_format, options = job
+    select, where = options.get('select'), options.get('where')
+    types = options.get('types')
+    table = _chunk_table(path, start, end, fieldnames, _needed_columns(select, where))
+    if to_format == 'types':
+        return infer_column_types(table, types), len(table)
+    if types is not None or select or where:
+        tables = list(transform_tables([table], select, where, types is not None,
+                                       types))
+        table = tables[0] if tables else Table(select or fieldnames)
+    if to_format == 'table':
+        return table, len(table)
+    output = io.StringIO()
+    if to_format == 'json':
+        items = list(_json_items(table.iter_rows(), options.get('indent', 2)))
+        prefix = '\n' + ' ' * (options.get('indent', 2) or 0)
+        return (',' + prefix).join(items), len(items)
+    if to_format == 'ndjson':
+        count = write_ndjson(table.iter_rows(), output)
+        return output.getvalue(), count
+    if to_format == 'csv':
+        writer = csv.writer(output)
+        writer.writerows(table.select(select or fieldnames).iter_tuples())
+        return output.getvalue(), len(table)
+    raise ValueError(f"不支持的格式: {to_format}. 可用格式: {', '.join(FORMATS)}")
+
+
+def _run_chunks(func: Callable, jobs: Iterable, max_workers: Optional[int] = None,
+                ordered: bool = True) -> Iterator[Any]:
+    """
+    在进程池中处理任务，同时只提交有限数量的任务以限制内存占用
+
+    ordered 为 True 时按任务顺序产出结果，否则按完成顺序产出。
+    """
+    jobs = iter(jobs)
+    window = (max_workers or os.cpu_count() or 1) * 2
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque(executor.submit(func, job) for job in islice(jobs, window))
+        if ordered:
+            while pending:
+                future = pending.popleft()
+                for job in islice(jobs, 1):
+                    pending.append(executor.submit(func, job))
+                yield future.result()
+            return
+        waiting = set(pending)
+        while waiting:
+            done, waiting = wait(waiting, return_when=FIRST_COMPLETED)
+            for future in done:
+                for job in islice(jobs, 1):
+                    waiting.add(executor.submit(func, job))
+                yield future.result()
+
+
+def _csv_jobs(path: str, to_format: str, chunk_size: int,
+              options: Dict[str, Any]) -> Tuple[List[str], List[tuple]]:
+    header_end, ranges = csv_chunk_ranges(path, chunk_size)
+    text = _read_range(path, 0, header_end)
+    header = next(csv.reader(io.StringIO(text, newline='')), [])
+    if header:
+        _column_positions(header, _where_columns(options.get('where')))
+    return header, [(path, start, end, header, to_format, options)
+                    for start, end in ranges]
+
+
+def iter_csv_parallel(path: str, max_workers: Optional[int] = None,
+                      chunk_size: int = CSV_CHUNK_SIZE,
+                      ordered: bool = True) -> Iterator[Dict[str, Optional[str]]]:
+    """
+    在多个进程中并行解析 CSV 文件，逐行产出与 csv.DictReader 相同的字典
+
+    Args:
+        path: CSV 文件路径
+        max_workers: 并行进程数，默认由 concurrent.futures 决定
+        chunk_size: 每个任务处理的字节数
+        ordered: 是否保持原始行顺序
+
+    Returns:
+        行字典的迭代器
+    """
+    header, jobs = _csv_jobs(path, 'table', chunk_size, {})
+    for table, _ in _run_chunks(_convert_csv_chunk, jobs, max_workers, ordered):
+        yield from table.iter_rows()
+
+
+def convert_csv_parallel(path: str, output_stream: IO[str], to_format: str,
+                         max_workers: Optional[int] = None,
+                         chunk_size: int = CSV_CHUNK_SIZE, ordered: bool = True,
+                         infer_types: bool = False, select: Optional[List[str]] = None,
+                         where: Optional[str] = None) -> int:
+    """
+    并行转换 CSV 文件：解析和序列化都在子进程中完成，主进程只按顺序写出文本
+
+    推断类型时先并行扫描一遍：主进程根据文件开头的样本猜测各列类型，各子进程
+    验证自己的分块，合并后的最终类型再用于第二遍转换，所有分块的类型一致。
+
+    Args:
+        path: CSV 文件路径
+        output_stream: 文本输出流
+        to_format: 目标格式 (json, csv, ndjson)
+        max_workers: 并行进程数，默认由 concurrent.futures 决定
+        chunk_size: 每个任务处理的字节数
+        ordered: 是否保持原始行顺序，为 False 时按完成顺序写出
+        infer_types: 推断各列的类型
+        select: 只输出这些列
+        where: 过滤表达式
+
+    Returns:
+        写出的行数
+    """
+    if to_format not in FORMATS:
+        raise ValueError(f"不支持的格式: {to_format}. 可用格式: {', '.join(FORMATS)}")
+    options: Dict[str, Any] = {'select': select, 'where': where}
+    if where:
+        compile_predicate(where)
+    if infer_types:
+        # 第一遍：各子进程验证自己分块中的全部取值，合并后得到整列的最终类型
+        with open(path, 'r', newline='', encoding='utf-8') as f:
+            sample = next(iter_tables(f, 'csv', DEFAULT_INFER_SAMPLE_SIZE,
+                                      _needed_columns(select, where)), Table([]))
+        types = infer_column_types(sample)
+        scan = {'select': select, 'where': where, 'types': types}
+        _, jobs = _csv_jobs(path, 'types', chunk_size, scan)
+        for chunk_types, _ in _run_chunks(_convert_csv_chunk, jobs, max_workers, False):
+            for name, column_type in chunk_types.items():
+                types[name] = _widen_type(types.get(name, 'null'), column_type)
+        options['types'] = types
+    header, jobs = _csv_jobs(path, to_format, chunk_size, options)
+    results = _run_chunks(_convert_csv_chunk, jobs, max_workers, ordered)
+    if to_format == 'json':
+        return _write_json_fragments(results, output_stream, 2)
+    count = 0
+    for text, rows in results:
+        if rows and not count and to_format == 'csv':
+            csv.writer(output_stream).writerow(select or header)
+        output_stream.write(text)
+        count += rows
+    return count
+
+
+def detect_compression(path: str, sniff: bool = True) -> Optional[str]:
+    """
+    根据扩展名 (以及文件头) 判断压缩格式
+
+    Args:
+        path: 文件路径
+        sniff: 扩展名无法判断时是否读取文件头
+
+    Returns:
+        gzip、bz2、xz 或 None (未压缩)
+    """
+    compression = COMPRESSION_EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    if compression or not sniff or not os.path.isfile(path):
+        return compression
+    with open(path, 'rb') as f:
+        head = f.read(6)
+    for magic, name in _COMPRESSION_MAGIC:
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def open_text(path: str, mode: str = 'r', compression: Optional[str] = 'auto',
+              level: Optional[int] = None) -> IO[str]:
+    """
+    以 UTF-8 文本方式打开文件，透明地处理 gzip、bz2、xz 压缩
+
+    使用大缓冲区读写，压缩数据边读边解压，不需要先解压到临时文件。
+
+    Args:
+        path: 文件路径
+        mode: 'r' 或 'w'
+        compression: 'auto' 表示按扩展名 (读取时还会检查文件头) 判断，None 表示不压缩
+        level: 压缩级别，默认见 DEFAULT_COMPRESS_LEVELS
+
+    Returns:
+        文本流 (newline='')
+    """
+    if mode not in ('r', 'w'):
+        raise ValueError(f"不支持的打开方式: {mode}")
+    if compression == 'auto':
+        compression = detect_compression(path, sniff=mode == 'r')
+    if compression is None:
+        return open(path, mode, newline='', encoding='utf-8', buffering=IO_BUFFER_SIZE)
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"不支持的压缩格式: {compression}. "
+                         f"可用格式: {', '.join(COMPRESSIONS)}")
+
+    if mode == 'r':
+        binary: Any = _DECOMPRESSORS[compression](path, 'rb')
+        buffered: Any = io.BufferedReader(binary, IO_BUFFER_SIZE)
+    else:
+        if level is None:
+            level = DEFAULT_COMPRESS_LEVELS[compression]
+        if compression == 'gzip':
+            binary = gzip.open(path, 'wb', compresslevel=level)
+        elif compression == 'bz2':
+            binary = bz2.open(path, 'wb', compresslevel=level)
+        else:
+            binary = lzma.open(path, 'wb', preset=level)
+        buffered = io.BufferedWriter(binary, IO_BUFFER_SIZE)
+    return io.TextIOWrapper(buffered, encoding='utf-8', newline='')
+
+
+class _BorrowedStream:
+    """借用的文本流：读取操作转发给原来的流，关闭时不关闭原来的流"""
+
+    def __init__(self, stream: IO[str]):
+        self._stream = stream
+        self.closed = False
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._stream, name)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._stream)
+
+    def __enter__(self) -> '_BorrowedStream':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.closed = True
+
+
+class _SequentialReader(io.BufferedReader):
+    """只能顺序读取的缓冲流：解压管道输入时 gzip 等对象仍会声称支持定位"""
+
+    def seekable(self) -> bool:
+        return False
+
+
+def open_stdin(compression: Optional[str] = 'auto') -> IO[str]:
+    """
+    以 UTF-8 文本流方式读取标准输入，边读边解码 (和解压)，不会把全部数据读入内存
+
+    关闭返回的流不会关闭标准输入本身。
+
+    Args:
+        compression: 'auto' 表示按数据头判断，None 表示不压缩
+
+    Returns:
+        文本流 (newline='')
+    """
+    try:
+        fd = sys.stdin.fileno()
+    except (AttributeError, ValueError, io.UnsupportedOperation):
+        # 标准输入已被替换为没有文件描述符的文本流
+        return _BorrowedStream(sys.stdin)
+    binary: Any = open(fd, 'rb', buffering=IO_BUFFER_SIZE, closefd=False)
+    if compression == 'auto':
+        head = binary.peek(6)
+        compression = next((name for magic, name in _COMPRESSION_MAGIC
+                            if head.startswith(magic)), None)
+    if compression is not None:
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"不支持的压缩格式: {compression}. "
+                             f"可用格式: {', '.join(COMPRESSIONS)}")
+        decompressed = _DECOMPRESSORS[compression](binary, 'rb')
+        reader = io.BufferedReader if binary.seekable() else _SequentialReader
+        binary = reader(decompressed, IO_BUFFER_SIZE)
+    return io.TextIOWrapper(binary, encoding='utf-8', newline='')
+
+
+def open_input(input_file: Optional[str] = None,
+               input_data: Optional[str] = None) -> IO[str]:
+    """
+    打开明确指定的输入源，不会根据内容猜测它是文件名还是数据
+
+    Args:
+        input_file: 文件路径 (可以是压缩文件)，STDIN ('-') 表示标准输入
+        input_data: 内联数据
+
+    Returns:
+        文本流
+    """
+    if (input_file is None) == (input_data is None):
+        raise ValueError("需要且只能指定输入文件或输入数据之一")
+    if input_data is not None:
+        return io.StringIO(input_data)
+    if input_file == STDIN:
+        return open_stdin()
+    return open_text(input_file)
+
+
+def _quote_identifier(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _sqlite_type(column: Sequence[Any]) -> str:
+    """根据一列的值确定 SQLite 列类型 (无法确定时不声明类型)"""
+    if isinstance(column, array):
+        return 'INTEGER' if column.typecode == 'q' else 'REAL'
+    kinds = set(map(type, column)) - {type(None)}
+    if kinds and kinds <= {int, bool}:
+        return 'INTEGER'
+    if kinds and kinds <= {int, float}:
+        return 'REAL'
+    if kinds == {str}:
+        return 'TEXT'
+    return ''
+
+
+def _column_definition(name: str, column: Sequence[Any]) -> str:
+    return f'{_quote_identifier(name)} {_sqlite_type(column)}'.rstrip()
+
+
+def _sqlite_values(column: Sequence[Any]) -> Sequence[Any]:
+    """把 sqlite3 不支持的嵌套值编码为 JSON 文本"""
+    if isinstance(column, array) or not set(map(type, column)) & {dict, list}:
+        return column
+    return [json.dumps(value, ensure_ascii=False)
+            if isinstance(value, (dict, list)) else value
+            for value in column]
+
+
+def load_sqlite(tables: Iterable[Table], database: str,
+                table_name: str = DEFAULT_SQLITE_TABLE, if_exists: str = 'fail',
+                indexes: Sequence[str] = ()) -> int:
+    """
+    把列式表格批量写入 SQLite 数据库
+
+    按列拼成元组后 executemany 写入；列类型由第一批数据 (推断后的类型) 决定，
+    之后出现的新列通过 ALTER TABLE 追加；索引在全部数据写入后再创建。
+    替换旧表、建表、写入和建索引在同一个事务中完成，输入有错误时已有的表
+    保持不变。新建的数据库不写回滚日志，失败时删除数据库文件。
+
+    Args:
+        tables: 表格迭代器
+        database: 数据库文件路径
+        table_name: 表名
+        if_exists: 表已存在时 fail 报错、replace 替换、append 追加
+        indexes: 导入完成后创建索引的列
+
+    Returns:
+        写入的行数
+    """
+    if if_exists not in SQLITE_IF_EXISTS:
+        raise ValueError(f"不支持的处理方式: {if_exists}. 可用方式: {', '.join(SQLITE_IF_EXISTS)}")
+    created = database != ':memory:' and not os.path.exists(database)
+    connection = sqlite3.connect(database, isolation_level=None)
+    try:
+        pragmas = SQLITE_BULK_PRAGMAS + (SQLITE_NEW_DATABASE_PRAGMAS if created else ())
+        for pragma in pragmas:
+            connection.execute(f'PRAGMA {pragma}')
+        target = _quote_identifier(table_name)
+        connection.execute('BEGIN')
+        exists = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+            (table_name,)).fetchone()
+        if exists and if_exists == 'fail':
+            raise ValueError(f"表 {table_name} 已存在")
+        columns: List[str] = []
+        if exists and if_exists == 'replace':
+            connection.execute(f'DROP TABLE {target}')
+            exists = None
+        elif exists:
+            columns = [row[1] for row in
+                       connection.execute(f'PRAGMA table_info({target})')]
+
+        count = 0
+        for table in tables:
+            named = [(name, column)
+                     for name, column in zip(table.fieldnames, table.columns)
+                     if name is not None]
+            if not exists:
+                definitions = ', '.join(_column_definition(name, column)
+                                        for name, column in named)
+                connection.execute(f'CREATE TABLE {target} ({definitions})')
+                columns = [name for name, _ in named]
+                exists = True
+            for name, column in named:
+                if name not in columns:
+                    connection.execute(f'ALTER TABLE {target} ADD COLUMN '
+                                       f'{_column_definition(name, column)}')
+                    columns.append(name)
+            data = dict(named)
+            values = [_sqlite_values(data[name]) if name in data
+                      else [None] * len(table)
+                      for name in columns]
+            placeholders = ', '.join('?' * len(columns))
+            connection.executemany(f'INSERT INTO {target} VALUES ({placeholders})',
+                                   zip(*values))
+            count += len(table)
+
+        for name in indexes:
+            if name not in columns:
+                raise ValueError(f"不存在的列: {name}")
+            index = _quote_identifier(f'idx_{table_name}_{name}')
+            connection.execute(f'CREATE INDEX IF NOT EXISTS {index} ON {target} '
+                               f'({_quote_identifier(name)})')
+        connection.execute('COMMIT')
+        return count
+    except BaseException:
+        if not created and connection.in_transaction:
+            connection.execute('ROLLBACK')
+        connection.close()
+        if created and os.path.exists(database):
+            os.remove(database)
+        raise
+    finally:
+        connection.close()
+
+
+def convert_to_sqlite(input_stream: IO[str], from_format: str, database: str,
+                      table_name: str = DEFAULT_SQLITE_TABLE, if_exists: str = 'fail',
+                      indexes: Sequence[str] = (), select: Optional[List[str]] = None,
+                      where: Optional[str] = None) -> int:
+    """
+    把输入流导入 SQLite 数据库，CSV 输入总是先扫描一遍确定整列的类型
+
+    Args:
+        input_stream: 文本输入流
+        from_format: 源格式
+        database: 数据库文件路径
+        table_name: 表名
+        if_exists: 表已存在时的处理方式 (fail, replace, append)
+        indexes: 导入完成后创建索引的列
+        select: 只导入这些列
+        where: 过滤表达式
+
+    Returns:
+        写入的行数
+    """
+    columns = _needed_columns(select, where)
+    required = _where_columns(where)
+    if from_format != 'csv':
+        tables = iter_tables(input_stream, from_format, columns=columns,
+                             required=required)
+        return load_sqlite(transform_tables(tables, select, where), database,
+                           table_name, if_exists, indexes)
+    source, types = _scan_and_rewind(input_stream, columns)
+    try:
+        tables = iter_tables(source, 'csv', columns=columns, required=required)
+        tables = transform_tables(tables, select, where, True, types)
+        return load_sqlite(tables, database, table_name, if_exists, indexes)
+    finally:
+        if source is not input_stream:
+            source.close()
+
+
+def stream_json_to_csv(input_stream: IO[str], output_stream: IO[str],
+                       schema: str = 'sample',
+                       sample_size: int = DEFAULT_SCHEMA_SAMPLE_SIZE,
+                       header: Optional[List[str]] = None) -> int:
+    """以流式方式把 JSON 数组转换为 CSV，内存占用与输入大小无关，返回写出的行数"""
+    return convert_stream(input_stream, output_stream, 'json', 'csv', schema=schema,
+                          sample_size=sample_size, header=header)
+
+
+def json_to_csv(json_data: Any = None, output_path: str = None,
+                schema: str = 'two-pass', sample_size: int = DEFAULT_SCHEMA_SAMPLE_SIZE,
+                header: Optional[List[str]] = None, flatten: bool = False,
+                arrays: str = 'join', separator: str = '.',
+                input_file: Optional[str] = None) -> str:
+    """
+    将 JSON 数据转换为 CSV 格式 (flatten 为 True 时把嵌套对象展开为 a.b 形式的列)
+
+    json_data 总是被当作数据 (JSON 字符串或列表)；读取文件请用 input_file，'-' 表示标准输入。
+    """
+    if input_file is not None:
+        if json_data is not None:
+            raise ValueError("json_data 和 input_file 只能指定一个")
+        with open_input(input_file) as source:
+            return _rows_to_csv(iter_json_array(source), output_path, schema,
+                                sample_size, header, flatten, arrays, separator)
     if isinstance(json_data, str):
-        data = json.loads(json_data)
+        rows: Iterable[Any] = iter_json_array(io.StringIO(json_data))
+    elif isinstance(json_data, list):
+        rows = json_data
     else:
-        data = json_data
-    
-    if not isinstance(data, list):
         raise ValueError("JSON 数据必须是列表格式才能转换为 CSV")
-    
-    if not data:
-        return ""
-    
-    # 获取所有可能的字段
-    fieldnames = set()
-    for item in data:
-        if isinstance(item, dict):
-            fieldnames.update(item.keys())
-    
-    fieldnames = sorted(list(fieldnames))
-    
+    return _rows_to_csv(rows, output_path, schema, sample_size, header, flatten, arrays,
+                        separator)
+
+
+def _rows_to_csv(rows: Iterable[Any], output_path: Optional[str], schema: str,
+                 sample_size: int, header: Optional[List[str]], flatten: bool,
+                 arrays: str, separator: str) -> str:
+    """json_to_csv 的实现：写到文件时返回提示信息，否则返回 CSV 文本"""
+    flattener = Flattener(separator, arrays) if flatten else None
     if output_path:
-        with open(output_path, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(data)
+        with open_text(output_path, 'w') as csvfile:
+            write_rows(rows, csvfile, 'csv', schema, sample_size, header, flattener)
         return f"CSV 文件已保存到: {output_path}"
-    else:
-        import io
+    output = io.StringIO()
+    write_rows(rows, output, 'csv', schema, sample_size, header, flattener)
+    return output.getvalue()
+
+
+def csv_to_json(csv_data: Optional[str] = None, output_path: str = None,
+                infer_types: bool = False, input_file: Optional[str] = None) -> str:
+    """
+    将 CSV 数据转换为 JSON 格式 (逐行转换，不在内存中保存全部行)
+
+    csv_data 总是被当作 CSV 文本，不会检查它是否是文件名；读取文件 (可以是 gzip、bz2、
+    xz 压缩文件) 请用 input_file，'-' 表示标准输入。
+    """
+    with open_input(input_file, csv_data) as source:
+        if output_path:
+            with open_text(output_path, 'w') as f:
+                convert_stream(source, f, 'csv', 'json', infer_types)
+            return f"JSON 文件已保存到: {output_path}"
         output = io.StringIO()
-        writer = csv.DictWriter(output, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(data)
-        return output.getvalue()
-
-
-def csv_to_json(csv_data: str, output_path: str = None) -> str:
-    """将 CSV 数据转换为 JSON 格式"""
-    import io
-    
-    if os.path.exists(csv_data):
-        # 如果是文件路径
-        with open(csv_data, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            data = list(reader)
-    else:
-        # 如果是 CSV 字符串
-        reader = csv.DictReader(io.StringIO(csv_data))
-        data = list(reader)
-    
-    json_str = json.dumps(data, ensure_ascii=False, indent=2)
-    
-    if output_path:
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(json_str)
-        return f"JSON 文件已保存到: {output_path}"
+        convert_stream(source, output, 'csv', 'json', infer_types)
+        return output.getvalue().rstrip('\n')
+
+
+def find_batch_inputs(pattern: str, from_format: str) -> List[str]:
+    """
+    找出批量转换的输入文件
+
+    Args:
+        pattern: 目录或 glob 模式 (支持 ** 递归匹配)
+        from_format: 源格式，pattern 为目录时只选取该格式的文件 (含压缩文件)
+
+    Returns:
+        排序后的文件路径列表
+    """
+    if os.path.isdir(pattern):
+        suffixes = tuple(f'.{from_format}{ext}'
+                         for ext in [''] + list(COMPRESSION_EXTENSIONS))
+        with os.scandir(pattern) as entries:
+            paths = [entry.path for entry in entries
+                     if entry.is_file() and entry.name.lower().endswith(suffixes)]
     else:
-        return json_str
+        paths = [path for path in glob.iglob(pattern, recursive=True)
+                 if os.path.isfile(path)]
+    return sorted(paths)
+
+
+def batch_output_path(path: str, to_format: str, template: str = BATCH_OUTPUT_TEMPLATE,
+                      output_dir: Optional[str] = None) -> str:
+    """
+    按模板生成批量转换中一个输入文件对应的输出路径
+
+    Args:
+        path: 输入文件路径
+        to_format: 目标格式
+        template: 文件名模板，{stem} 为去掉格式和压缩扩展名的文件名，{name} 为原文件名，
+                  {ext} 为目标格式的扩展名，{parent} 为所在目录名
+        output_dir: 输出目录，默认与输入文件相同
+
+    Returns:
+        输出文件路径
+    """
+    directory, name = os.path.split(path)
+    stem = name
+    root, ext = os.path.splitext(stem)
+    if ext.lower() in COMPRESSION_EXTENSIONS:
+        stem = root
+    stem = os.path.splitext(stem)[0] or stem
+    filename = template.format(stem=stem, name=name, ext=FORMAT_EXTENSIONS[to_format],
+                               parent=os.path.basename(os.path.abspath(directory)))
+    return os.path.join(output_dir if output_dir is not None else directory, filename)
+
+
+def _conversion_options(args) -> Dict[str, Any]:
+    """根据命令行参数构造 convert_stream 的选项 (每次调用都创建新的 Flattener)"""
+    header = args.header.split(',') if args.header else None
+    select = args.select.split(',') if args.select else None
+    schema = args.schema
+    if schema is None:
+        # CSV 输入每行的字段都相同，采样即可得到完整表头；JSON 输入需要收集全部字段
+        if header:
+            schema = 'header'
+        else:
+            schema = 'sample' if args.from_format == 'csv' else 'two-pass'
+    options = {'schema': schema, 'sample_size': args.sample_size, 'header': header,
+               'infer_types': args.infer_types, 'select': select, 'where': args.where}
+    if args.sort_by:
+        options.update(sort_by=args.sort_by.split(','), unique=args.unique,
+                       sort_memory=args.sort_memory * 1024 * 1024,
+                       sort_run_rows=args.run_size)
+    elif args.unique:
+        raise ValueError("--unique 需要同时指定 --sort-by")
+    if args.flatten:
+        options['flatten'] = Flattener(args.flatten_separator, args.arrays,
+                                       args.array_separator)
+    return options
+
+
+def _convert_source(args, source: IO[str], output: Optional[str],
+                    input_path: Optional[str] = None) -> int:
+    """
+    按命令行参数转换一个输入
+
+    Args:
+        args: 命令行参数
+        source: 输入文本流
+        output: 输出文件路径，None 时写到标准输出
+        input_path: 输入文件路径；给出且允许时对 CSV 文件并行解析
+
+    Returns:
+        写出的行数
+    """
+    options = _conversion_options(args)
+    if args.to_format == 'sqlite':
+        if args.sort_by:
+            raise ValueError("导入 SQLite 时不支持排序，请在查询时使用 ORDER BY")
+        if not output:
+            raise ValueError("导入 SQLite 需要用 --output 指定数据库文件")
+        return convert_to_sqlite(source, args.from_format, output, args.table,
+                                 args.if_exists, args.index, options['select'],
+                                 args.where)
+
+    def convert(out: IO[str]) -> int:
+        # 并行路径只支持按列名排序的默认表头；声明表头、展开和排序走串行路径
+        parallel = (input_path and args.jobs and args.jobs > 1
+                    and args.from_format == 'csv' and not args.sort_by
+                    and options['schema'] != 'header' and 'flatten' not in options)
+        if parallel and detect_compression(input_path) is None:
+            return convert_csv_parallel(input_path, out, args.to_format, args.jobs,
+                                        ordered=not args.unordered,
+                                        infer_types=args.infer_types,
+                                        select=options['select'], where=args.where)
+        return convert_stream(source, out, args.from_format, args.to_format, **options)
+
+    if output:
+        compression = None if args.compression == 'none' else args.compression
+        with open_text(output, 'w', compression, args.compress_level) as out:
+            return convert(out)
+    return convert(sys.stdout)
+
+
+def _convert_batch_file(job: Tuple[Any, str, str]) -> Dict[str, Any]:
+    """批量转换中在工作进程里转换一个文件；失败时记录错误并删除不完整的输出"""
+    args, path, output = job
+    result = {'file': path, 'output': output, 'rows': 0, 'bytes': 0, 'seconds': 0.0,
+              'status': 'ok', 'error': None}
+    existed = os.path.exists(output)
+    start = time.perf_counter()
+    try:
+        result['bytes'] = os.path.getsize(path)
+        with open_text(path) as source:
+            result['rows'] = _convert_source(args, source, output)
+    except Exception as e:
+        result.update(status='error', error=str(e) or type(e).__name__)
+        if not existed and os.path.exists(output):
+            os.remove(output)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def convert_batch(args, paths: Sequence[str], max_workers: Optional[int] = None
+                  ) -> List[Dict[str, Any]]:
+    """
+    用进程池并发转换多个文件，单个文件失败不影响其余文件
+
+    Args:
+        args: 命令行参数 (格式、输出模板、输出目录及各项转换选项)
+        paths: 输入文件路径
+        max_workers: 进程数，默认为 CPU 数；为 1、只有一个文件或多个文件导入同一个
+                     数据库时在当前进程依次转换。导入同一个数据库时 --if-exists 只作用于
+                     第一个导入成功的文件，其后的文件都追加到同一张表
+
+    Returns:
+        按输入顺序排列的每个文件的结果 (file, output, rows, bytes, seconds, status, error)
+    """
+    outputs = [batch_output_path(path, args.to_format, args.output_template,
+                                 args.output_dir)
+               for path in paths]
+    seen: Dict[str, str] = {}
+    inputs = {os.path.abspath(path) for path in paths}
+    for path, output in zip(paths, outputs):
+        key = os.path.abspath(output)
+        if key in inputs:
+            raise ValueError(f"输出文件会覆盖输入文件: {output}")
+        if args.to_format != 'sqlite' and key in seen:
+            raise ValueError(f"{seen[key]} 和 {path} 的输出文件相同: {output}，"
+                             f"请调整 --output-template")
+        seen[key] = path
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    jobs = [(args, path, output) for path, output in zip(paths, outputs)]
+    workers = max_workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) <= 1 or len(seen) < len(jobs):
+        # 多个文件导入同一个数据库时不能并发
+        results = []
+        loaded = set()
+        appending = argparse.Namespace(**dict(vars(args), if_exists='append'))
+        for path, output in zip(paths, outputs):
+            key = os.path.abspath(output)
+            # 前面的文件已经建好 (或替换了) 这张表，后面的文件只能追加
+            result = _convert_batch_file((appending if key in loaded else args,
+                                          path, output))
+            if result['status'] == 'ok':
+                loaded.add(key)
+            results.append(result)
+        return results
+    # 大量小文件时按组分发给工作进程，减少进程间通信的次数
+    chunksize = max(1, len(jobs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+        return list(executor.map(_convert_batch_file, jobs, chunksize=chunksize))
+
+
+def format_batch_report(results: Sequence[Dict[str, Any]], elapsed: float) -> str:
+    """
+    格式化批量转换结果
+
+    Args:
+        results: convert_batch 的返回值
+        elapsed: 总耗时 (秒)
+
+    Returns:
+        每个文件一行的报告及汇总
+    """
+    lines = [f"📁 批量转换 {len(results)} 个文件:"]
+    for result in results:
+        if result['status'] == 'ok':
+            rate = result['rows'] / result['seconds'] if result['seconds'] else 0
+            lines.append(f"✅ {result['file']} -> {result['output']} "
+                         f"({result['rows']} 行, {rate:,.0f} 行/秒)")
+        else:
+            lines.append(f"❌ {result['file']}: {result['error']}")
+
+    succeeded = sum(1 for result in results if result['status'] == 'ok')
+    rows = sum(result['rows'] for result in results)
+    size = sum(result['bytes'] for result in results if result['status'] == 'ok')
+    rate = rows / elapsed if elapsed else 0
+    throughput = size / (1024 * 1024) / elapsed if elapsed else 0
+    lines.append("")
+    lines.append(f"📊 总计: {succeeded} 成功, {len(results) - succeeded} 失败, {rows} 行")
+    lines.append(f"⏱️ 耗时: {elapsed:.2f} 秒 ({rate:,.0f} 行/秒, {throughput:.1f} MB/秒)")
+    return "\n".join(lines)
 
 
 def register_parser(subparsers):
     """注册 converter 命令的参数解析器"""
     parser = subparsers.add_parser('convert', help='数据格式转换工具')
-    parser.add_argument('--input', '-i', required=True, help='输入文件或数据')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--input', '-i',
+                        help='输入文件或数据 (存在该文件时按文件读取，- 为标准输入)；'
+                             '建议使用 --input-file 或 --input-data 明确指定')
+    source.add_argument('--input-file', '-f',
+                        help='输入文件 (可以是 gzip、bz2、xz 压缩文件)，- 表示从标准输入流式读取')
+    source.add_argument('--input-data', '-d', help='内联的输入数据')
+    source.add_argument('--batch', metavar='DIR_OR_GLOB',
+                        help='批量转换目录中 --from 格式的文件，或匹配 glob 模式的文件 '
+                             '(如 "data/**/*.csv")，用 --jobs 个进程并发转换')
     parser.add_argument('--from', dest='from_format', required=True,
-                       choices=['json', 'csv'], help='源格式')
+                       choices=FORMATS, help='源格式')
     parser.add_argument('--to', dest='to_format', required=True,
-                       choices=['json', 'csv'], help='目标格式')
-    parser.add_argument('--output', '-o', help='输出文件路径')
+                       choices=OUTPUT_FORMATS, help='目标格式 (sqlite 需要 --output 指定数据库文件)')
+    parser.add_argument('--output', '-o', help='输出文件路径 (.gz、.bz2、.xz 结尾时自动压缩)')
+    parser.add_argument('--output-dir', help='批量转换的输出目录 (默认: 与输入文件相同)')
+    parser.add_argument('--output-template', default=BATCH_OUTPUT_TEMPLATE,
+                       help='批量转换的输出文件名模板，可用 {stem} {name} {ext} {parent}，'
+                            '以 .gz 等结尾时压缩输出 (默认: %(default)s)')
+    parser.add_argument('--compression', choices=('auto', 'none') + COMPRESSIONS,
+                       default='auto',
+                       help='输出文件的压缩格式，auto 按扩展名判断 (默认: auto)；'
+                            '输入文件按扩展名或文件头自动识别')
+    parser.add_argument('--compress-level', type=int, choices=range(10), metavar='0-9',
+                       help='压缩级别 (默认: gzip 6, bz2 9, xz 6)')
+    parser.add_argument('--schema', choices=SCHEMA_STRATEGIES,
+                       help='JSON 转 CSV 时确定表头的方式: two-pass 暂存到临时文件后收集全部'
+                            '字段, sample 根据前 N 行 (之后新出现的字段会被丢弃), header 使用 '
+                            '--header (默认: 给出 --header 时为 header，CSV 输入为 sample，'
+                            '否则为 two-pass)')
+    parser.add_argument('--sample-size', type=int, default=DEFAULT_SCHEMA_SAMPLE_SIZE,
+                       help=f'sample 策略采样的行数 (默认: {DEFAULT_SCHEMA_SAMPLE_SIZE})')
+    parser.add_argument('--header', help='header 策略使用的表头，逗号分隔')
+    parser.add_argument('--flatten', action='store_true',
+                       help='输出 CSV 时把嵌套对象展开为 a.b 形式的列')
+    parser.add_argument('--flatten-separator', default='.', help='展开时的路径分隔符 (默认: .)')
+    parser.add_argument('--arrays', choices=FLATTEN_ARRAYS, default='join',
+                       help='展开时数组的处理方式: join 连接元素, explode 每个元素一行, '
+                            'json 编码为 JSON (默认: join)')
+    parser.add_argument('--array-separator', default=';', help='join 方式的元素分隔符 (默认: ;)')
+    parser.add_argument('--table', default=DEFAULT_SQLITE_TABLE,
+                       help=f'导入 SQLite 时的表名 (默认: {DEFAULT_SQLITE_TABLE})')
+    parser.add_argument('--if-exists', choices=SQLITE_IF_EXISTS, default='fail',
+                       help='SQLite 表已存在时的处理方式 (默认: fail)')
+    parser.add_argument('--index', action='append', default=[],
+                       help='导入 SQLite 后为该列创建索引，可重复指定')
+    parser.add_argument('--infer-types', action='store_true',
+                       help='推断 CSV 各列的类型 (int, float, bool, null, date, string)，'
+                            '输出数字和布尔值而不是字符串；先读一遍输入确定整列的类型 '
+                            '(标准输入会先复制到临时文件)')
+    parser.add_argument('--select',
+                       help='只输出这些列，逗号分隔 (按此顺序输出，其余列在读取时即被丢弃)')
+    parser.add_argument('--where',
+                       help="过滤表达式，例如 \"age >= 18 and city in ['北京', '上海']\"")
+    parser.add_argument('--sort-by',
+                       help='按这些列排序，逗号分隔 (数据大于内存时使用临时文件外部排序)')
+    parser.add_argument('--unique', action='store_true',
+                       help='排序时每个排序键只保留第一行')
+    parser.add_argument('--sort-memory', type=int,
+                       default=DEFAULT_SORT_MEMORY // (1024 * 1024),
+                       help='排序时内存中累积的数据上限 MB (默认: %(default)s)')
+    parser.add_argument('--run-size', type=int, default=DEFAULT_SORT_RUN_ROWS,
+                       help='排序时每个临时有序段的行数上限 (默认: %(default)s)')
+    parser.add_argument('--jobs', '-j', type=int,
+                       help='并行解析 CSV 文件的进程数 (仅 --from csv 且输入为文件)；'
+                            '批量转换时为同时转换的文件数 (默认: CPU 数)')
+    parser.add_argument('--unordered', action='store_true',
+                       help='并行解析时按完成顺序输出，不保持原始行顺序')
     parser.set_defaults(func=main)
 
 
+def _resolve_input(args) -> Tuple[Optional[str], Optional[str]]:
+    """
+    确定命令行指定的输入源
+
+    Returns:
+        (输入文件, 输入数据)，其中恰有一个不为 None
+    """
+    if args.input_file is not None:
+        return args.input_file, None
+    if args.input_data is not None:
+        return None, args.input_data
+    # --input 兼容旧用法：多行内容一定是数据，不再检查文件是否存在
+    if args.input == STDIN or ('\n' not in args.input and os.path.isfile(args.input)):
+        return args.input, None
+    return None, args.input
+
+
 def main(args):
     """converter 工具的主函数"""
     try:
-        if args.from_format == 'json' and args.to_format == 'csv':
-            return json_to_csv(args.input, args.output)
-        elif args.from_format == 'csv' and args.to_format == 'json':
-            return csv_to_json(args.input, args.output)
-        else:
-            raise ValueError(f"不支持从 {args.from_format} 转换到 {args.to_format}")
+        if args.batch:
+            if args.output:
+                raise ValueError("批量转换请使用 --output-dir 和 --output-template 指定输出")
+            paths = find_batch_inputs(args.batch, args.from_format)
+            if not paths:
+                raise ValueError(f"没有找到要转换的文件: {args.batch}")
+            start = time.perf_counter()
+            results = convert_batch(args, paths, args.jobs)
+            report = format_batch_report(results, time.perf_counter() - start)
+            failed = sum(1 for result in results if result['status'] != 'ok')
+            if failed:
+                print(report)
+                raise ValueError(f"{failed} 个文件转换失败")
+            return report
+
+        # 输入逐行读取，结果逐行写到输出文件或标准输出
+        input_file, input_data = _resolve_input(args)
+        with open_input(input_file, input_data) as source:
+            count = _convert_source(args, source, args.output,
+                                    None if input_file == STDIN else input_file)
+        if args.to_format == 'sqlite':
+            return f"已导入 {count} 行到 {args.output} 的表 {args.table}"
+        if args.output:
+            return f"{args.to_format.upper()} 文件已保存到: {args.output} ({count} 行)"
+        return None
     except Exception as e:
         raise RuntimeError(f"转换失败: {e}")
 
@@ -99,4 +2382,4 @@ if __name__ == "__main__":
     # 测试代码
     test_json = '[{"name": "张三", "age": 25}, {"name": "李四", "age": 30}]'
     print("JSON to CSV:")
-    print(json_to_csv(test_json))
\ No newline at end of file
+    print(json_to_csv(test_json))
@@ -4,12 +4,727 @@
 """
 
 import argparse
+import codecs
 import difflib
+import hashlib
+import heapq
+import html
+import math
+import mmap
 import os
-from typing import List, Tuple, Optional
+import re
+import shutil
+import sys
+import tempfile
+import zlib
+from array import array
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import (Any, Callable, Dict, Hashable, Iterable, Iterator, List, Sequence,
+                    Tuple, Optional, Union)
 
 
-def compare_texts(text1: str, text2: str, context_lines: int = 3) -> List[str]:
+# 可选的差异算法：difflib 为标准库 SequenceMatcher，myers / histogram 为内置实现
+DIFF_ALGORITHMS = ('difflib', 'myers', 'histogram')
+DEFAULT_ALGORITHM = 'difflib'
+
+# histogram 算法中出现次数超过该值的行不作为锚点，区域内没有可用锚点时退回 Myers
+HISTOGRAM_MAX_CHAIN = 64
+
+# 行内差异：细化粒度与默认的最大行长度 (超过则不细化)
+INTRALINE_MODES = ('word', 'char')
+DEFAULT_INTRALINE_MAX_LENGTH = 1000
+
+# 移动检测：连续至少这么多行才认为是移动的代码块
+DEFAULT_MOVE_MIN_LINES = 3
+
+# 流式对比时比较公共前缀/后缀所用的块大小
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# 二进制文件：检测时采样的字节数、分块方式与默认块大小
+BINARY_SAMPLE_SIZE = 8192
+BINARY_CHUNKING = ('fixed', 'cdc')
+DEFAULT_BLOCK_SIZE = 4096
+# 内容定义分块的锚点 (随机数据中平均每 64KB 出现一次) 与最大块大小相对块大小的倍数
+CDC_ANCHOR = b'\xa5\x5a'
+CDC_MAX_FACTOR = 256
+
+# 近似相似度：shingle 单位、默认 shingle 长度与默认误差上限
+SHINGLE_UNITS = ('word', 'line', 'char')
+DEFAULT_SHINGLE_SIZE = 3
+DEFAULT_SIMILARITY_ERROR = 0.05
+
+# 近似重复文件查找：LSH 签名长度、默认相似度阈值与阈值处的候选召回率
+LSH_BINS = 120
+DEFAULT_DUPLICATE_THRESHOLD = 0.8
+LSH_RECALL = 0.99
+
+# 三方合并冲突标记的长度 (与 git 相同)
+MERGE_MARKER_SIZE = 7
+
+Opcode = Tuple[str, int, int, int, int]
+Block = Tuple[int, int, int]
+Segment = Tuple[str, bool]
+
+_WORD_PATTERN = re.compile(r'\w+|\s+|[^\w\s]')
+_HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+# 行尾的换行符 (与 str.splitlines 的分隔符一致)
+_LINE_ENDING = re.compile(r'(?:\r\n|[\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029])\Z')
+
+
+def intern_lines(*sequences: Sequence[Hashable]) -> Tuple[array, ...]:
+    """
+    将多组行映射为共享的整数 ID 数组
+
+    相同内容的行得到相同的 ID，之后的比较只需比较整数。
+    """
+    ids: Dict[Hashable, int] = {}
+    return tuple(array('l', [ids.setdefault(line, len(ids)) for line in lines])
+                 for lines in sequences)
+
+
+def _middle_snake(a: Sequence[int], alo: int, ahi: int,
+                  b: Sequence[int], blo: int, bhi: int) -> Tuple[int, int, int, int]:
+    """
+    Myers 线性空间算法的中间蛇查找
+
+    前向与反向同时搜索，返回最优编辑路径中间的一段对角线 (x0, y0, x1, y1)，
+    坐标均为绝对下标。调用方保证两侧区间非空且首尾元素不相同。
+    """
+    n = ahi - alo
+    m = bhi - blo
+    delta = n - m
+    odd = delta & 1
+    max_d = (n + m + 1) // 2
+    offset = max_d + 1
+    forward = array('l', [0]) * (2 * max_d + 3)
+    backward = array('l', [0]) * (2 * max_d + 3)
+
+    for d in range(max_d + 1):
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and
+                           forward[offset + k - 1] < forward[offset + k + 1]):
+                x = forward[offset + k + 1]
+            else:
+                x = forward[offset + k - 1] + 1
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[alo + x] == b[blo + y]:
+                x += 1
+                y += 1
+            forward[offset + k] = x
+            if odd and -(d - 1) <= delta - k <= d - 1:
+                if x + backward[offset + delta - k] >= n:
+                    return alo + x0, blo + y0, alo + x, blo + y
+
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and
+                           backward[offset + k - 1] < backward[offset + k + 1]):
+                x = backward[offset + k + 1]
+            else:
+                x = backward[offset + k - 1] + 1
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[ahi - 1 - x] == b[bhi - 1 - y]:
+                x += 1
+                y += 1
+            backward[offset + k] = x
+            if not odd and -d <= delta - k <= d:
+                if x + forward[offset + delta - k] >= n:
+                    return ahi - x, bhi - y, ahi - x0, bhi - y0
+
+    raise AssertionError("middle snake not found")
+
+
+def _strip_common(a: Sequence[int], alo: int, ahi: int,
+                  b: Sequence[int], blo: int, bhi: int,
+                  stack: list) -> Tuple[int, int, int, int, Optional[Block]]:
+    """去掉区间的公共前缀与后缀：后缀块压栈稍后输出，前缀块随新区间一起返回"""
+    i, j = alo, blo
+    while i < ahi and j < bhi and a[i] == b[j]:
+        i += 1
+        j += 1
+    prefix = (alo, blo, i - alo) if i > alo else None
+    alo, blo = i, j
+
+    i, j = ahi, bhi
+    while i > alo and j > blo and a[i - 1] == b[j - 1]:
+        i -= 1
+        j -= 1
+    if i < ahi:
+        stack.append((i, j, ahi - i))
+    return alo, i, blo, j, prefix
+
+
+def _iter_myers_blocks(a: Sequence[int], b: Sequence[int], alo: int = 0,
+                       ahi: Optional[int] = None, blo: int = 0,
+                       bhi: Optional[int] = None) -> Iterator[Block]:
+    """
+    使用 Myers O(ND) 线性空间算法计算匹配块 (i, j, size)
+
+    匹配块按从前到后的顺序逐个产出，调用方可以边计算边输出。
+    """
+    ahi = len(a) if ahi is None else ahi
+    bhi = len(b) if bhi is None else bhi
+    # 栈中的四元组为待比较区间，三元组为已确定的匹配块
+    stack: list = [(alo, ahi, blo, bhi)]
+    while stack:
+        item = stack.pop()
+        if len(item) == 3:
+            yield item
+            continue
+        alo, ahi, blo, bhi, prefix = _strip_common(a, item[0], item[1],
+                                                   b, item[2], item[3], stack)
+        if prefix:
+            yield prefix
+        if alo < ahi and blo < bhi:
+            x0, y0, x1, y1 = _middle_snake(a, alo, ahi, b, blo, bhi)
+            stack.append((x1, ahi, y1, bhi))
+            if x1 > x0:
+                stack.append((x0, y0, x1 - x0))
+            stack.append((alo, x0, blo, y0))
+
+
+def _iter_histogram_blocks(a: Sequence[int], b: Sequence[int]) -> Iterator[Block]:
+    """
+    使用 histogram 算法计算匹配块
+
+    在每个区间中选择出现次数最少的公共行作为锚点并向两侧扩展，
+    再对锚点左右两侧递归；找不到低频锚点的区间交给 Myers 处理。
+    """
+    stack: list = [(0, len(a), 0, len(b))]
+    while stack:
+        item = stack.pop()
+        if len(item) == 3:
+            yield item
+            continue
+        alo, ahi, blo, bhi, prefix = _strip_common(a, item[0], item[1],
+                                                   b, item[2], item[3], stack)
+        if prefix:
+            yield prefix
+        if alo >= ahi or blo >= bhi:
+            continue
+
+        positions: Dict[int, List[int]] = {}
+        for i in range(alo, ahi):
+            positions.setdefault(a[i], []).append(i)
+
+        # (出现次数, -长度, 与区间中点的距离, i, j, 长度)：长度相同时选靠近中点的锚点，
+        # 避免改动均匀分布时每次只切掉一小段而退化为平方复杂度
+        best = None
+        middle = alo + ahi
+        has_common = False
+        j = blo
+        while j < bhi:
+            next_j = j + 1
+            chain = positions.get(b[j])
+            if chain is not None:
+                has_common = True
+                count = len(chain)
+                if count <= HISTOGRAM_MAX_CHAIN and (best is None or count <= best[0]):
+                    for i in chain:
+                        si, sj = i, j
+                        while si > alo and sj > blo and a[si - 1] == b[sj - 1]:
+                            si -= 1
+                            sj -= 1
+                        ei, ej = i + 1, j + 1
+                        while ei < ahi and ej < bhi and a[ei] == b[ej]:
+                            ei += 1
+                            ej += 1
+                        candidate = (count, si - ei, abs(si + ei - middle),
+                                     si, sj, ei - si)
+                        if best is None or candidate < best:
+                            best = candidate
+                        if ej > next_j:
+                            next_j = ej
+            j = next_j
+
+        if best is None:
+            if has_common:
+                yield from _iter_myers_blocks(a, b, alo, ahi, blo, bhi)
+            continue
+
+        _, _, _, i, j, size = best
+        stack.append((i + size, ahi, j + size, bhi))
+        stack.append((i, j, size))
+        stack.append((alo, i, blo, j))
+
+
+def iter_blocks(a: Sequence[int], b: Sequence[int], algorithm: str) -> Iterator[Block]:
+    """按所选的内置算法 (myers, histogram) 逐个产出匹配块"""
+    if algorithm == 'myers':
+        return _iter_myers_blocks(a, b)
+    if algorithm == 'histogram':
+        return _iter_histogram_blocks(a, b)
+    raise ValueError(f"不支持的差异算法: {algorithm}. 可用算法: {', '.join(DIFF_ALGORITHMS)}")
+
+
+def iter_opcodes_from_blocks(blocks: Iterable[Block], n: int,
+                             m: int) -> Iterator[Opcode]:
+    """将有序匹配块转换为与 SequenceMatcher.get_opcodes() 相同格式的操作码"""
+    i = j = 0
+    pending = None  # 尚未输出的 equal 操作码，相邻的匹配块会合并到其中
+    for ai, bj, size in blocks:
+        if size == 0:
+            continue
+        if i < ai or j < bj:
+            if pending:
+                yield pending
+            if i < ai and j < bj:
+                yield ('replace', i, ai, j, bj)
+            elif i < ai:
+                yield ('delete', i, ai, j, bj)
+            else:
+                yield ('insert', i, ai, j, bj)
+            pending = ('equal', ai, ai + size, bj, bj + size)
+        elif pending:
+            pending = ('equal', pending[1], ai + size, pending[3], bj + size)
+        else:
+            pending = ('equal', ai, ai + size, bj, bj + size)
+        i, j = ai + size, bj + size
+    if pending:
+        yield pending
+    if i < n and j < m:
+        yield ('replace', i, n, j, m)
+    elif i < n:
+        yield ('delete', i, n, j, m)
+    elif j < m:
+        yield ('insert', i, n, j, m)
+
+
+def get_opcodes(lines1: Sequence[Hashable], lines2: Sequence[Hashable],
+                algorithm: str = DEFAULT_ALGORITHM) -> List[Opcode]:
+    """
+    计算两组行之间的编辑操作码
+
+    Args:
+        lines1: 第一组行
+        lines2: 第二组行
+        algorithm: 差异算法 (difflib, myers, histogram)
+
+    Returns:
+        (tag, i1, i2, j1, j2) 操作码列表，格式与 SequenceMatcher.get_opcodes() 相同
+    """
+    if algorithm == 'difflib':
+        return difflib.SequenceMatcher(None, lines1, lines2).get_opcodes()
+    if algorithm not in DIFF_ALGORITHMS:
+        raise ValueError(f"不支持的差异算法: {algorithm}. 可用算法: {', '.join(DIFF_ALGORITHMS)}")
+
+    a, b = intern_lines(lines1, lines2)
+    return list(iter_opcodes_from_blocks(iter_blocks(a, b, algorithm), len(a), len(b)))
+
+
+def comparison_keys(lines: Sequence[str], ignore_whitespace: bool = False,
+                    ignore_case: bool = False) -> Sequence[str]:
+    """
+    计算每行用于比较的键
+
+    键在比较之前一次性算好，相同内容的行只规范化一次，差异算法随后
+    只比较 (驻留后的) 键，而不是在比较循环中反复规范化。
+
+    Args:
+        lines: 行列表
+        ignore_whitespace: 忽略所有空白字符 (包括行尾换行符)
+        ignore_case: 忽略大小写
+
+    Returns:
+        与 lines 等长的键序列，不忽略任何差异时直接返回 lines
+    """
+    if not (ignore_whitespace or ignore_case):
+        return lines
+    cache: Dict[str, str] = {}
+    keys = []
+    for line in lines:
+        key = cache.get(line)
+        if key is None:
+            key = line
+            if ignore_whitespace:
+                key = ''.join(key.split())
+            if ignore_case:
+                key = key.casefold()
+            cache[line] = key
+        keys.append(key)
+    return keys
+
+
+def find_moves(a: Sequence[int], b: Sequence[int], opcodes: Iterable[Opcode],
+               min_lines: int = DEFAULT_MOVE_MIN_LINES
+               ) -> List[Tuple[int, int, int, int]]:
+    """
+    在删除和新增的行之间查找移动的代码块
+
+    先为所有被删除的行按行 ID 建立位置索引，再扫描新增的行：在索引中找到
+    相同的行后向后扩展，连续相同且不少于 min_lines 行的区间记为一次移动。
+    出现次数过多的行 (如空行、单独的括号) 不作为起点，但可以被扩展覆盖。
+
+    Args:
+        a: 第一组行的 ID (intern_lines 的结果)
+        b: 第二组行的 ID
+        opcodes: a 到 b 的操作码
+        min_lines: 移动块的最少行数
+
+    Returns:
+        (i1, i2, j1, j2) 列表，表示 a[i1:i2] 移动到了 b[j1:j2]
+    """
+    opcodes = list(opcodes)
+    available = bytearray(len(a))
+    index: Dict[int, List[int]] = {}
+    for tag, i1, i2, _, _ in opcodes:
+        if tag in ('delete', 'replace'):
+            for i in range(i1, i2):
+                available[i] = 1
+                index.setdefault(a[i], []).append(i)
+
+    moves = []
+    for tag, _, _, j1, j2 in opcodes:
+        if tag not in ('insert', 'replace'):
+            continue
+        j = j1
+        while j < j2:
+            best_i, best_length = -1, 0
+            candidates = index.get(b[j], ())
+            if len(candidates) <= HISTOGRAM_MAX_CHAIN:
+                for i in candidates:
+                    if not available[i]:
+                        continue
+                    length = 1
+                    while (j + length < j2 and i + length < len(a)
+                           and available[i + length]
+                           and a[i + length] == b[j + length]):
+                        length += 1
+                    if length > best_length:
+                        best_i, best_length = i, length
+            if best_length >= min_lines:
+                available[best_i:best_i + best_length] = bytes(best_length)
+                moves.append((best_i, best_i + best_length, j, j + best_length))
+                j += best_length
+            else:
+                j += 1
+    return moves
+
+
+def _move_marker(marker: str, left_moved: bool, right_moved: bool) -> str:
+    """把并排视图的标记替换为移动标记: '<~' 移出, '~>' 移入, '~~' 两侧都是移动行"""
+    if left_moved and right_moved:
+        return '~~'
+    if left_moved:
+        return '<~'
+    if right_moved:
+        return '~>'
+    return marker
+
+
+@lru_cache(maxsize=8192)
+def _tokenize(line: str, mode: str) -> Tuple[str, ...]:
+    """切分行内 token (结果缓存，重复或移动的行不会重复切分)"""
+    if mode == 'char':
+        return tuple(line)
+    return tuple(_WORD_PATTERN.findall(line))
+
+
+def refine_line_pair(old: str, new: str, mode: str = 'word',
+                     max_length: Optional[int] = DEFAULT_INTRALINE_MAX_LENGTH
+                     ) -> Optional[Tuple[List[Segment], List[Segment]]]:
+    """
+    计算一对修改行的行内差异
+
+    Args:
+        old: 原行 (不含换行符)
+        new: 新行 (不含换行符)
+        mode: 细化粒度 (word, char)
+        max_length: 最大行长度，任一行超过该长度时不细化
+
+    Returns:
+        (原行片段, 新行片段)，每个片段为 (文本, 是否变化)；跳过细化时返回 None
+    """
+    if mode not in INTRALINE_MODES:
+        raise ValueError(f"不支持的行内差异粒度: {mode}. 可用粒度: {', '.join(INTRALINE_MODES)}")
+    if max_length is not None and max(len(old), len(new)) > max_length:
+        return None
+
+    tokens1 = _tokenize(old, mode)
+    tokens2 = _tokenize(new, mode)
+    a, b = intern_lines(tokens1, tokens2)
+    segments1: List[Segment] = []
+    segments2: List[Segment] = []
+    for tag, i1, i2, j1, j2 in iter_opcodes_from_blocks(_iter_myers_blocks(a, b),
+                                                        len(a), len(b)):
+        changed = tag != 'equal'
+        if i1 < i2:
+            segments1.append((''.join(tokens1[i1:i2]), changed))
+        if j1 < j2:
+            segments2.append((''.join(tokens2[j1:j2]), changed))
+    return segments1, segments2
+
+
+def _render_segments(segments: List[Segment], plain: Callable[[str], str],
+                     changed: Callable[[str], str]) -> str:
+    return ''.join(changed(text) if is_changed else plain(text)
+                   for text, is_changed in segments)
+
+
+def _split_line_ending(line: str) -> Tuple[str, str]:
+    body = line.rstrip('\r\n')
+    return body, line[len(body):]
+
+
+def _mark_replaced_lines(old_lines: List[str], new_lines: List[str], mode: str,
+                         max_length: Optional[int]) -> Tuple[List[str], List[str]]:
+    """按顺序配对修改块中的行，用 [-...-] 和 {+...+} 标记行内变化"""
+    old_lines, new_lines = list(old_lines), list(new_lines)
+    for index, (old, new) in enumerate(zip(old_lines, new_lines)):
+        old_body, old_ending = _split_line_ending(old)
+        new_body, new_ending = _split_line_ending(new)
+        refined = refine_line_pair(old_body, new_body, mode, max_length)
+        if refined:
+            old_lines[index] = _render_segments(refined[0], str,
+                                                lambda text: f'[-{text}-]') + old_ending
+            new_lines[index] = _render_segments(
+                refined[1], str, lambda text: f'{{+{text}+}}') + new_ending
+    return old_lines, new_lines
+
+
+def _group_opcodes(opcodes: Iterable[Opcode], n: int = 3) -> Iterator[List[Opcode]]:
+    """
+    按上下文行数将操作码分组为差异块 (与 SequenceMatcher.get_grouped_opcodes 一致)
+
+    逐个消费操作码，只需向前看一个元素，因此可以处理流式产出的操作码。
+    """
+    codes = iter(opcodes)
+    current = next(codes, None)
+    nn = n + n
+    first = True
+    group: List[Opcode] = []
+    while current is not None:
+        following = next(codes, None)
+        tag, i1, i2, j1, j2 = current
+        if tag == 'equal':
+            if first:
+                i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+            if following is None:
+                i2, j2 = min(i2, i1 + n), min(j2, j1 + n)
+        first = False
+
+        if tag == 'equal' and i2 - i1 > nn:
+            group.append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((tag, i1, i2, j1, j2))
+        current = following
+    if group and not (len(group) == 1 and group[0][0] == 'equal'):
+        yield group
+
+
+def _format_range_unified(start: int, stop: int) -> str:
+    """统一差异格式的行号范围 (与 difflib 相同)"""
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return f'{beginning}'
+    if not length:
+        beginning -= 1
+    return f'{beginning},{length}'
+
+
+def unified_diff_from_opcodes(
+        lines1: Sequence[str], lines2: Sequence[str], opcodes: Iterable[Opcode],
+        fromfile: str = '', tofile: str = '', n: int = 3, lineterm: str = '\n',
+        intraline: Optional[str] = None,
+        intraline_max_length: Optional[int] = DEFAULT_INTRALINE_MAX_LENGTH
+) -> Iterator[str]:
+    """
+    根据操作码生成统一差异格式，输出与 difflib.unified_diff 相同
+
+    指定 intraline (word 或 char) 时，修改块中配对的行会用 [-...-] / {+...+}
+    标记行内变化，此时输出仅供阅读，不能作为补丁应用。
+    """
+    started = False
+    for group in _group_opcodes(opcodes, n):
+        if not started:
+            started = True
+            yield f'--- {fromfile}{lineterm}'
+            yield f'+++ {tofile}{lineterm}'
+
+        first, last = group[0], group[-1]
+        file1_range = _format_range_unified(first[1], last[2])
+        file2_range = _format_range_unified(first[3], last[4])
+        yield f'@@ -{file1_range} +{file2_range} @@{lineterm}'
+
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                for line in lines1[i1:i2]:
+                    yield ' ' + line
+                continue
+            old_lines = lines1[i1:i2]
+            new_lines = lines2[j1:j2]
+            if tag == 'replace' and intraline:
+                old_lines, new_lines = _mark_replaced_lines(
+                    old_lines, new_lines, intraline, intraline_max_length)
+            for line in old_lines:
+                yield '-' + line
+            for line in new_lines:
+                yield '+' + line
+
+
+class DiffResult:
+    """
+    一次差异计算的结果
+
+    操作码只在第一次使用时计算一次，unified、side-by-side、stats 和 html 视图都
+    基于同一组操作码按需渲染，同时输出多种视图时不会重复读取文件或重复计算。
+    指定 intraline 时，各视图中修改块内配对的行会标出行内差异；指定
+    ignore_whitespace / ignore_case 时按规范化后的键比较，输出仍为原始行；
+    指定 detect_moves 时在并排和 HTML 视图中标出移动的代码块。
+    """
+
+    VIEWS = ('unified', 'side-by-side', 'stats', 'html')
+
+    def __init__(self, lines1: Sequence[str], lines2: Sequence[str],
+                 algorithm: str = DEFAULT_ALGORITHM, fromfile: str = '文本1',
+                 tofile: str = '文本2', intraline: Optional[str] = None,
+                 intraline_max_length: Optional[int] = DEFAULT_INTRALINE_MAX_LENGTH,
+                 ignore_whitespace: bool = False, ignore_case: bool = False,
+                 detect_moves: bool = False):
+        if intraline is not None and intraline not in INTRALINE_MODES:
+            raise ValueError(f"不支持的行内差异粒度: {intraline}. "
+                             f"可用粒度: {', '.join(INTRALINE_MODES)}")
+        self.lines1 = lines1
+        self.lines2 = lines2
+        self.algorithm = algorithm
+        self.fromfile = fromfile
+        self.tofile = tofile
+        self.intraline = intraline
+        self.intraline_max_length = intraline_max_length
+        self.ignore_whitespace = ignore_whitespace
+        self.ignore_case = ignore_case
+        self.detect_moves = detect_moves
+        self._opcodes: Optional[List[Opcode]] = None
+        self._moves: Optional[List[Tuple[int, int, int, int]]] = None
+        self._stats: Optional[dict] = None
+
+    @classmethod
+    def from_texts(cls, text1: str, text2: str, algorithm: str = DEFAULT_ALGORITHM,
+                   fromfile: str = '文本1', tofile: str = '文本2',
+                   **options) -> 'DiffResult':
+        """从两段文本创建，options 传给构造函数 (如 intraline)"""
+        return cls(text1.splitlines(keepends=True), text2.splitlines(keepends=True),
+                   algorithm, fromfile, tofile, **options)
+
+    @classmethod
+    def from_files(cls, file1_path: str, file2_path: str,
+                   algorithm: str = DEFAULT_ALGORITHM, **options) -> 'DiffResult':
+        """从两个文件创建，每个文件只读取一次"""
+        if not os.path.exists(file1_path):
+            raise FileNotFoundError(f"文件不存在: {file1_path}")
+        if not os.path.exists(file2_path):
+            raise FileNotFoundError(f"文件不存在: {file2_path}")
+
+        with open(file1_path, 'r', encoding='utf-8') as f1:
+            lines1 = f1.readlines()
+        with open(file2_path, 'r', encoding='utf-8') as f2:
+            lines2 = f2.readlines()
+        return cls(lines1, lines2, algorithm, file1_path, file2_path, **options)
+
+    @property
+    def opcodes(self) -> List[Opcode]:
+        """编辑操作码 (首次访问时计算)"""
+        if self._opcodes is None:
+            self._opcodes = get_opcodes(self._keys(self.lines1),
+                                        self._keys(self.lines2), self.algorithm)
+        return self._opcodes
+
+    @property
+    def moves(self) -> List[Tuple[int, int, int, int]]:
+        """移动的代码块 (首次访问时计算，未开启 detect_moves 时为空)"""
+        if self._moves is None:
+            self._moves = []
+            if self.detect_moves:
+                a, b = intern_lines(self._keys(self.lines1), self._keys(self.lines2))
+                self._moves = find_moves(a, b, self.opcodes)
+        return self._moves
+
+    def _keys(self, lines: Sequence[str]) -> Sequence[str]:
+        return comparison_keys(lines, self.ignore_whitespace, self.ignore_case)
+
+    def unified(self, context_lines: int = 3) -> Iterator[str]:
+        """统一差异格式"""
+        return unified_diff_from_opcodes(self.lines1, self.lines2, self.opcodes,
+                                         self.fromfile, self.tofile, context_lines,
+                                         intraline=self.intraline,
+                                         intraline_max_length=self.intraline_max_length)
+
+    def side_by_side(self, width: int = 80,
+                     collapse: Optional[int] = None) -> Iterator[str]:
+        """按操作码对齐的并排对比格式，collapse 不为 None 时折叠相同区域"""
+        return iter_side_by_side(self.lines1, self.lines2, self.opcodes, width,
+                                 collapse, self.intraline, self.intraline_max_length,
+                                 self.moves)
+
+    def html(self, collapse: Optional[int] = None) -> Iterator[str]:
+        """HTML 并排对比页面，collapse 不为 None 时折叠相同区域"""
+        return iter_html(self.lines1, self.lines2, self.opcodes, self.fromfile,
+                         self.tofile, collapse, self.intraline,
+                         self.intraline_max_length, self.moves)
+
+    def _stats_opcodes(self) -> List[Opcode]:
+        """统计用的操作码：忽略行尾换行符，末尾缺少换行不算修改"""
+        keys1, keys2 = self._keys(self.lines1), self._keys(self.lines2)
+        endings = {match.group() if match else ''
+                   for match in map(_LINE_ENDING.search, chain(keys1, keys2))}
+        if len(endings) <= 1:
+            # 所有行的换行符相同时去掉换行符不会改变比较结果
+            return self.opcodes
+        return get_opcodes([_LINE_ENDING.sub('', key) for key in keys1],
+                           [_LINE_ENDING.sub('', key) for key in keys2], self.algorithm)
+
+    def stats(self) -> dict:
+        """变化统计 (首次访问时计算)"""
+        if self._stats is None:
+            additions = deletions = modifications = matches = 0
+            for tag, i1, i2, j1, j2 in self._stats_opcodes():
+                if tag == 'equal':
+                    matches += i2 - i1
+                elif tag == 'insert':
+                    additions += j2 - j1
+                elif tag == 'delete':
+                    deletions += i2 - i1
+                elif tag == 'replace':
+                    modifications += max(i2 - i1, j2 - j1)
+
+            # 与 SequenceMatcher.ratio() 的定义一致
+            total = len(self.lines1) + len(self.lines2)
+            self._stats = {
+                'total_lines_1': len(self.lines1),
+                'total_lines_2': len(self.lines2),
+                'additions': additions,
+                'deletions': deletions,
+                'modifications': modifications,
+                'similarity': 2.0 * matches / total if total else 1.0,
+                'total_changes': additions + deletions + modifications
+            }
+            if self.detect_moves:
+                self._stats['moved'] = sum(i2 - i1 for i1, i2, _, _ in self.moves)
+        return self._stats
+
+    def render(self, view: str, context_lines: int = 3, width: int = 80,
+               label: str = '文本', collapse: Optional[int] = None) -> List[str]:
+        """渲染指定视图为输出行列表 (不含换行符)"""
+        if view == 'unified':
+            return [line.rstrip('\n') for line in self.unified(context_lines)]
+        if view == 'side-by-side':
+            return list(self.side_by_side(width, collapse))
+        if view == 'stats':
+            return _format_stats(self.stats(), label)
+        if view == 'html':
+            return list(self.html(collapse))
+        raise ValueError(f"不支持的输出格式: {view}. 可用格式: {', '.join(self.VIEWS)}")
+
+
+def compare_texts(text1: str, text2: str, context_lines: int = 3,
+                  algorithm: str = DEFAULT_ALGORITHM) -> List[str]:
     """
     对比两段文本的差异
     
@@ -17,25 +732,16 @@ def compare_texts(text1: str, text2: str, context_lines: int = 3) -> List[str]:
         text1: 第一段文本
         text2: 第二段文本
         context_lines: 上下文行数
+        algorithm: 差异算法 (difflib, myers, histogram)
         
     Returns:
         差异对比结果列表
     """
-    lines1 = text1.splitlines(keepends=True)
-    lines2 = text2.splitlines(keepends=True)
-    
-    # 生成统一差异格式
-    diff = difflib.unified_diff(
-        lines1, lines2,
-        fromfile='文本1',
-        tofile='文本2',
-        n=context_lines
-    )
-    
-    return list(diff)
+    return list(DiffResult.from_texts(text1, text2, algorithm).unified(context_lines))
 
 
-def compare_files(file1_path: str, file2_path: str, context_lines: int = 3) -> List[str]:
+def compare_files(file1_path: str, file2_path: str, context_lines: int = 3,
+                  algorithm: str = DEFAULT_ALGORITHM) -> List[str]:
     """
     对比两个文件的差异
     
@@ -43,47 +749,1555 @@ def compare_files(file1_path: str, file2_path: str, context_lines: int = 3) -> L
         file1_path: 第一个文件路径
         file2_path: 第二个文件路径
         context_lines: 上下文行数
+        algorithm: 差异算法 (difflib, myers, histogram)
         
     Returns:
         差异对比结果列表
     """
-    if not os.path.exists(file1_path):
-        raise FileNotFoundError(f"文件不存在: {file1_path}")
-    if not os.path.exists(file2_path):
-        raise FileNotFoundError(f"文件不存在: {file2_path}")
-    
-    with open(file1_path, 'r', encoding='utf-8') as f1:
-        lines1 = f1.readlines()
-    
-    with open(file2_path, 'r', encoding='utf-8') as f2:
-        lines2 = f2.readlines()
-    
-    # 生成统一差异格式
-    diff = difflib.unified_diff(
-        lines1, lines2,
-        fromfile=file1_path,
-        tofile=file2_path,
-        n=context_lines
-    )
-    
-    return list(diff)
+    for path in (file1_path, file2_path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"文件不存在: {path}")
+    if is_binary_file(file1_path) or is_binary_file(file2_path):
+        if os.path.getsize(file1_path) == os.path.getsize(file2_path) and \
+                _same_content((file1_path, file2_path)):
+            return []
+        return [f"二进制文件 {file1_path} 和 {file2_path} 不同\n"]
+    result = DiffResult.from_files(file1_path, file2_path, algorithm)
+    return list(result.unified(context_lines))
+
+
+class _MappedFile:
+    """以 mmap 只读方式打开的文件，空文件退化为空字节串"""
+
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        if self.size:
+            self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.data = b''
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self._file.close()
+
+    def line_end(self, pos: int) -> int:
+        """返回从 pos 开始的行的结束位置 (包含换行符)"""
+        index = self.data.find(b'\n', pos)
+        return self.size if index < 0 else index + 1
+
+    def line_start(self, end: int) -> int:
+        """返回在 end 处结束的行的起始位置"""
+        return self.data.rfind(b'\n', 0, end - 1) + 1
+
+    def index_lines(self, start: int, end: int) -> Tuple[array, array]:
+        """
+        为 [start, end) 区间中的每一行计算哈希，返回 (哈希数组, 行起始偏移数组)
+
+        end 必须位于行边界。按块切分行以减少逐行查找的开销；文件末尾缺少
+        换行符的行使用不同的哈希，以便与带换行符的同内容行区分。
+        """
+        hashes = array('q')
+        offsets = array('Q')
+        data = self.data
+        pos = start
+        while pos < end:
+            chunk_end = min(self.line_end(min(pos + STREAM_CHUNK_SIZE, end) - 1), end)
+            lines = data[pos:chunk_end].split(b'\n')
+            tail = lines.pop()
+            hashes.extend(map(hash, lines))
+            for line in lines:
+                offsets.append(pos)
+                pos += len(line) + 1
+            if tail:
+                offsets.append(pos)
+                hashes.append(hash((tail, None)))
+                pos += len(tail)
+        offsets.append(end)
+        return hashes, offsets
+
+
+class _MappedLines:
+    """按需从 mmap 中解码行内容的只读序列，下标为文件中的绝对行号"""
+
+    def __init__(self, mapped: _MappedFile, offsets: array, base: int):
+        self._data = mapped.data
+        self._offsets = offsets
+        self._base = base
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: slice) -> List[str]:
+        offsets = self._offsets
+        start = index.start - self._base
+        stop = index.stop - self._base
+        return [self._data[offsets[i]:offsets[i + 1]].decode('utf-8')
+                for i in range(start, stop)]
+
+
+def _common_prefix_length(data1, data2, limit: int) -> int:
+    """按块比较两段数据，返回公共前缀的字节数"""
+    pos = 0
+    while pos < limit:
+        end = min(pos + STREAM_CHUNK_SIZE, limit)
+        chunk1, chunk2 = data1[pos:end], data2[pos:end]
+        if chunk1 != chunk2:
+            # 在块内二分查找第一个不同的字节
+            lo, hi = 0, end - pos
+            while hi - lo > 1:
+                mid = (lo + hi) // 2
+                if chunk1[lo:mid] == chunk2[lo:mid]:
+                    lo = mid
+                else:
+                    hi = mid
+            return pos + lo
+        pos = end
+    return limit
+
+
+def _common_suffix_length(data1, size1: int, data2, size2: int, limit: int) -> int:
+    """按块从末尾比较两段数据，返回公共后缀的字节数 (不超过 limit)"""
+    k = 0
+    while k < limit:
+        step = min(STREAM_CHUNK_SIZE, limit - k)
+        chunk1 = data1[size1 - k - step:size1 - k]
+        chunk2 = data2[size2 - k - step:size2 - k]
+        if chunk1 != chunk2:
+            lo, hi = 0, step
+            while hi - lo > 1:
+                mid = (lo + hi) // 2
+                if chunk1[step - mid:step - lo] == chunk2[step - mid:step - lo]:
+                    lo = mid
+                else:
+                    hi = mid
+            return k + lo
+        k += step
+    return limit
+
+
+@contextmanager
+def _mapped_diff(file1_path: str, file2_path: str, context_lines: int, algorithm: str):
+    """
+    以 mmap 方式打开两个文件并流式计算操作码
+
+    产出 (lines1, lines2, opcodes)：lines 为按需解码的行序列 (下标为绝对行号)，
+    opcodes 为操作码迭代器，只覆盖第一个差异到最后一个差异之间的区域
+    (两侧各保留 context_lines 行)。文件内容完全相同时产出 None。
+    """
+    for path in (file1_path, file2_path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"文件不存在: {path}")
+
+    file1 = _MappedFile(file1_path)
+    file2 = _MappedFile(file2_path)
+    try:
+        limit = min(file1.size, file2.size)
+        diff_pos = _common_prefix_length(file1.data, file2.data, limit)
+        if diff_pos == limit and file1.size == file2.size:
+            yield None
+            return
+
+        # 公共前缀中两个文件的字节完全相同，行边界也相同
+        start = file1.data.rfind(b'\n', 0, diff_pos) + 1
+        prefix_lines = 0
+        for pos in range(0, start, STREAM_CHUNK_SIZE):
+            end = min(pos + STREAM_CHUNK_SIZE, start)
+            prefix_lines += file1.data[pos:end].count(b'\n')
+        region_start = start
+        for _ in range(context_lines):
+            if region_start == 0:
+                break
+            region_start = file1.line_start(region_start)
+            prefix_lines -= 1
+
+        suffix = _common_suffix_length(file1.data, file1.size, file2.data, file2.size,
+                                       min(file1.size, file2.size) - start)
+        end1, end2 = file1.size - suffix, file2.size - suffix
+        if suffix:
+            # 公共后缀必须从两个文件的行首开始
+            at_line_start1 = end1 == start or file1.data[end1 - 1] == 0x0A
+            at_line_start2 = end2 == start or file2.data[end2 - 1] == 0x0A
+            if not (at_line_start1 and at_line_start2):
+                shift = file1.line_end(end1) - end1
+                end1 += shift
+                end2 += shift
+        for _ in range(context_lines):
+            end1 = file1.line_end(end1) if end1 < file1.size else end1
+            end2 = file2.line_end(end2) if end2 < file2.size else end2
+
+        hashes1, offsets1 = file1.index_lines(region_start, end1)
+        hashes2, offsets2 = file2.index_lines(region_start, end2)
+        lines1 = _MappedLines(file1, offsets1, prefix_lines)
+        lines2 = _MappedLines(file2, offsets2, prefix_lines)
+
+        blocks = iter_blocks(hashes1, hashes2, algorithm)
+        opcodes = (
+            (tag, i1 + prefix_lines, i2 + prefix_lines,
+             j1 + prefix_lines, j2 + prefix_lines)
+            for tag, i1, i2, j1, j2 in iter_opcodes_from_blocks(
+                blocks, len(hashes1), len(hashes2))
+        )
+        yield lines1, lines2, opcodes
+    finally:
+        file1.close()
+        file2.close()
+
+
+def stream_file_diff(file1_path: str, file2_path: str, context_lines: int = 3,
+                     algorithm: str = 'myers', intraline: Optional[str] = None,
+                     intraline_max_length: Optional[int] = DEFAULT_INTRALINE_MAX_LENGTH
+                     ) -> Iterator[str]:
+    """
+    以流式方式对比两个文件，逐行产出统一差异格式
+
+    文件通过 mmap 读取：公共前缀和后缀按块直接比较，不保存任何行；
+    只有第一个差异到最后一个差异之间的区域会被切分为行，并且每行只保存
+    一个 64 位哈希和一个偏移量。输出时再按偏移量从 mmap 中取出行内容，
+    差异块一旦确定就立即产出。
+
+    Args:
+        file1_path: 第一个文件路径
+        file2_path: 第二个文件路径
+        context_lines: 上下文行数
+        algorithm: 差异算法 (myers, histogram)
+        intraline: 修改行的行内差异粒度 (word, char)，None 表示不细化
+        intraline_max_length: 细化行内差异的最大行长度
+
+    Returns:
+        统一差异格式的行迭代器
+    """
+    with _mapped_diff(file1_path, file2_path, context_lines, algorithm) as mapped:
+        if mapped is not None:
+            lines1, lines2, opcodes = mapped
+            yield from unified_diff_from_opcodes(
+                lines1, lines2, opcodes, file1_path, file2_path, context_lines,
+                intraline=intraline, intraline_max_length=intraline_max_length)
+
+
+def stream_side_by_side(
+        file1_path: str, file2_path: str, width: int = 80, context_lines: int = 3,
+        algorithm: str = 'myers', intraline: Optional[str] = None,
+        intraline_max_length: Optional[int] = DEFAULT_INTRALINE_MAX_LENGTH
+) -> Iterator[str]:
+    """
+    以流式方式生成两个文件的并排对比，相同区域折叠为 context_lines 行上下文
+
+    读取方式与 stream_file_diff 相同，适合只有少量改动的大文件。
+    """
+    with _mapped_diff(file1_path, file2_path, context_lines, algorithm) as mapped:
+        if mapped is None:
+            yield from iter_side_by_side([], [], [], width, context_lines)
+        else:
+            lines1, lines2, opcodes = mapped
+            yield from iter_side_by_side(lines1, lines2, opcodes, width, context_lines,
+                                         intraline, intraline_max_length)
+
+
+def write_unified_diff(lines: Iterable[str], stream) -> int:
+    """
+    将统一差异格式的行写入输出流，缺少换行符的行按 patch 约定补充标记
+
+    Returns:
+        写入的行数
+    """
+    count = 0
+    for line in lines:
+        stream.write(line)
+        if not line.endswith('\n'):
+            stream.write('\n\\ No newline at end of file\n')
+        count += 1
+    return count
+
+
+def is_binary_file(path: str, sample_size: int = BINARY_SAMPLE_SIZE) -> bool:
+    """
+    判断文件是否为二进制文件
+
+    只读取开头 sample_size 字节：包含 NUL 字节或不是合法 UTF-8 即视为二进制
+    (采样末尾被截断的多字节字符不算错误)。
+    """
+    with open(path, 'rb') as f:
+        sample = f.read(sample_size)
+    if b'\0' in sample:
+        return True
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return True
+    return False
+
+
+def _cdc_boundaries(data, size: int, min_size: int, max_size: int) -> array:
+    """
+    内容定义分块的边界偏移量 (含 0 和 size)
+
+    边界取在锚点字节序列出现的位置，块长度限制在 [min_size, max_size]。
+    锚点用 bytes.find 在 C 层查找，插入或删除数据后，变化位置之后的边界
+    会随内容一起平移，相同内容仍然切分出相同的块。
+    """
+    boundaries = array('q', [0])
+    pos = 0
+    while size - pos > max_size:
+        found = data.find(CDC_ANCHOR, pos + min_size, pos + max_size)
+        pos = pos + max_size if found < 0 else found
+        boundaries.append(pos)
+    if pos < size:
+        boundaries.append(size)
+    return boundaries
+
+
+def _add_range(ranges: List[Tuple[int, int, int, int]], s1: int, e1: int,
+               s2: int, e2: int):
+    """追加变化范围，与上一个相邻的范围合并"""
+    if ranges and ranges[-1][1] == s1 and ranges[-1][3] == s2:
+        ranges[-1] = (ranges[-1][0], e1, ranges[-1][2], e2)
+    else:
+        ranges.append((s1, e1, s2, e2))
+
+
+def _fixed_block_ranges(data1, size1: int, data2, size2: int,
+                        block_size: int) -> List[Tuple[int, int, int, int]]:
+    """按位置逐块比较：先比较 1MB 的大块，不同时再定位到 block_size 的小块"""
+    ranges: List[Tuple[int, int, int, int]] = []
+    common = min(size1, size2)
+    for start in range(0, common, STREAM_CHUNK_SIZE):
+        end = min(start + STREAM_CHUNK_SIZE, common)
+        chunk1 = data1[start:end]
+        chunk2 = data2[start:end]
+        if chunk1 == chunk2:
+            continue
+        for block in range(0, end - start, block_size):
+            block_end = min(block + block_size, end - start)
+            if chunk1[block:block_end] != chunk2[block:block_end]:
+                _add_range(ranges, start + block, start + block_end,
+                           start + block, start + block_end)
+    if size1 != size2:
+        _add_range(ranges, common, size1, common, size2)
+    return ranges
+
+
+def _chunk_keys(data, boundaries: array) -> List[Tuple[int, int, int]]:
+    """每个块的 (CRC32, Adler-32, 长度)，两个校验和都按内存带宽计算"""
+    keys = []
+    with memoryview(data) as view:
+        for k in range(len(boundaries) - 1):
+            chunk = view[boundaries[k]:boundaries[k + 1]]
+            keys.append((zlib.crc32(chunk), zlib.adler32(chunk), len(chunk)))
+    return keys
+
+
+def _cdc_ranges(data1, size1: int, data2, size2: int, block_size: int,
+                algorithm: str) -> List[Tuple[int, int, int, int]]:
+    """内容定义分块后对块校验和序列做差异计算，返回变化的字节范围"""
+    max_size = block_size * CDC_MAX_FACTOR
+    bounds1 = _cdc_boundaries(data1, size1, block_size, max_size)
+    bounds2 = _cdc_boundaries(data2, size2, block_size, max_size)
+    a, b = intern_lines(_chunk_keys(data1, bounds1), _chunk_keys(data2, bounds2))
+
+    ranges: List[Tuple[int, int, int, int]] = []
+    for tag, i1, i2, j1, j2 in iter_opcodes_from_blocks(iter_blocks(a, b, algorithm),
+                                                        len(a), len(b)):
+        if tag != 'equal':
+            _add_range(ranges, bounds1[i1], bounds1[i2], bounds2[j1], bounds2[j2])
+    return ranges
+
+
+def compare_binary_files(file1_path: str, file2_path: str, chunking: str = 'fixed',
+                         block_size: int = DEFAULT_BLOCK_SIZE,
+                         algorithm: str = 'histogram') -> Dict[str, Any]:
+    """
+    按块对比两个二进制文件，不做任何解码
+
+    文件通过 mmap 读取。fixed 按位置比较固定大小的块，速度接近磁盘读取速度，
+    适合原地修改的文件；cdc 按内容定义的边界分块，对块的 (CRC32, Adler-32,
+    长度) 序列做差异计算，插入或删除数据导致后续内容整体平移时也只报告
+    真正变化的块。
+
+    Args:
+        file1_path: 第一个文件路径
+        file2_path: 第二个文件路径
+        chunking: 分块方式 (fixed, cdc)
+        block_size: fixed 的块大小，也是 cdc 的最小块大小
+        algorithm: cdc 对块序列使用的差异算法 (myers, histogram)
+
+    Returns:
+        包含 size1、size2、chunking、ranges ([(起点1, 终点1, 起点2, 终点2)] 字节范围)、
+        changed_bytes 和 change_ratio 的字典
+    """
+    if chunking not in BINARY_CHUNKING:
+        raise ValueError(f"不支持的分块方式: {chunking}. 可用方式: {', '.join(BINARY_CHUNKING)}")
+    if block_size <= 0:
+        raise ValueError("块大小必须为正数")
+    for path in (file1_path, file2_path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"文件不存在: {path}")
+
+    mapped1 = _MappedFile(file1_path)
+    try:
+        mapped2 = _MappedFile(file2_path)
+        try:
+            size1, size2 = mapped1.size, mapped2.size
+            if chunking == 'fixed':
+                ranges = _fixed_block_ranges(mapped1.data, size1, mapped2.data, size2,
+                                             block_size)
+            else:
+                ranges = _cdc_ranges(mapped1.data, size1, mapped2.data, size2,
+                                     block_size, algorithm)
+        finally:
+            mapped2.close()
+    finally:
+        mapped1.close()
+
+    changed = sum(max(e1 - s1, e2 - s2) for s1, e1, s2, e2 in ranges)
+    largest = max(size1, size2)
+    return {
+        'file1': file1_path,
+        'file2': file2_path,
+        'size1': size1,
+        'size2': size2,
+        'chunking': chunking,
+        'ranges': ranges,
+        'changed_bytes': changed,
+        'change_ratio': changed / largest if largest else 0.0
+    }
+
+
+def format_binary_diff(result: Dict[str, Any]) -> List[str]:
+    """格式化二进制对比结果"""
+    lines = [
+        f"二进制文件 {result['file1']} ({result['size1']} 字节) 和 "
+        f"{result['file2']} ({result['size2']} 字节)"
+    ]
+    if not result['ranges']:
+        lines.append("内容相同")
+        return lines
+    lines.append(f"分块方式: {result['chunking']}, 变化范围: {len(result['ranges'])} 处, "
+                 f"变化字节: {result['changed_bytes']} ({result['change_ratio']:.2%})")
+    for s1, e1, s2, e2 in result['ranges']:
+        lines.append(f"  {s1:#010x}-{e1:#010x} -> {s2:#010x}-{e2:#010x}")
+    return lines
+
+
+def _scan_tree(root: str) -> Dict[str, Tuple[str, int]]:
+    """使用 os.scandir 遍历目录，返回 {相对路径: (绝对路径, 文件大小)}"""
+    files: Dict[str, Tuple[str, int]] = {}
+    stack = [(root, '')]
+    while stack:
+        directory, prefix = stack.pop()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                rel_path = prefix + entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((entry.path, rel_path + '/'))
+                elif entry.is_file():
+                    files[rel_path] = (entry.path, entry.stat().st_size)
+    return files
+
+
+def file_digest(path: str) -> str:
+    """分块计算文件内容的 BLAKE2 摘要"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _same_content(pair: Tuple[str, str]) -> bool:
+    return file_digest(pair[0]) == file_digest(pair[1])
+
+
+def _diff_file_pair(job: Tuple[str, str, str, int, str]) -> Tuple[str, List[str]]:
+    """子进程中对比一对文件，返回 (相对路径, 统一差异行)"""
+    rel_path, path1, path2, context_lines, algorithm = job
+    if is_binary_file(path1) or is_binary_file(path2):
+        return rel_path, [f"二进制文件 {path1} 和 {path2} 不同\n"]
+    try:
+        lines = list(stream_file_diff(path1, path2, context_lines, algorithm))
+    except UnicodeDecodeError:
+        lines = [f"二进制文件 {path1} 和 {path2} 不同\n"]
+    return rel_path, lines
+
+
+def compare_directories(dir1: str, dir2: str, include_hunks: bool = False,
+                        context_lines: int = 3, algorithm: str = 'myers',
+                        max_workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    递归对比两个目录
+
+    按相对路径配对文件：大小不同的文件直接判定为修改，大小相同的文件在线程池中
+    计算内容摘要，只有内容确实不同的文件才会在进程池中并行计算文本差异。
+
+    Args:
+        dir1: 第一个目录
+        dir2: 第二个目录
+        include_hunks: 是否计算修改文件的差异块
+        context_lines: 上下文行数
+        algorithm: 差异算法 (myers, histogram)
+        max_workers: 并行工作线程/进程数，默认由 concurrent.futures 决定
+
+    Returns:
+        包含 added、removed、changed (相对路径列表)、identical (相同文件数)
+        和 hunks ({相对路径: 差异行列表}) 的字典
+    """
+    for directory in (dir1, dir2):
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"目录不存在: {directory}")
+
+    files1 = _scan_tree(dir1)
+    files2 = _scan_tree(dir2)
+    added = sorted(files2.keys() - files1.keys())
+    removed = sorted(files1.keys() - files2.keys())
+
+    changed = []
+    same_size = []
+    for rel_path in files1.keys() & files2.keys():
+        size1, size2 = files1[rel_path][1], files2[rel_path][1]
+        if size1 != size2:
+            changed.append(rel_path)
+        else:
+            same_size.append(rel_path)
+
+    identical = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pairs = [(files1[rel_path][0], files2[rel_path][0]) for rel_path in same_size]
+        for rel_path, same in zip(same_size, executor.map(_same_content, pairs)):
+            if same:
+                identical += 1
+            else:
+                changed.append(rel_path)
+    changed.sort()
+
+    hunks: Dict[str, List[str]] = {}
+    if include_hunks and changed:
+        jobs = [(rel_path, files1[rel_path][0], files2[rel_path][0], context_lines,
+                 algorithm) for rel_path in changed]
+        if len(jobs) == 1:
+            results: Iterable[Tuple[str, List[str]]] = map(_diff_file_pair, jobs)
+        else:
+            executor = ProcessPoolExecutor(max_workers=max_workers)
+            results = executor.map(_diff_file_pair, jobs, chunksize=16)
+        try:
+            hunks.update(results)
+        finally:
+            if len(jobs) > 1:
+                executor.shutdown()
+
+    return {
+        'added': added,
+        'removed': removed,
+        'changed': changed,
+        'identical': identical,
+        'hunks': hunks
+    }
+
+
+def format_directory_diff(result: Dict[str, Any]) -> List[str]:
+    """格式化目录对比结果"""
+    lines = [
+        f"新增文件: {len(result['added'])}, 删除文件: {len(result['removed'])}, "
+        f"修改文件: {len(result['changed'])}, 相同文件: {result['identical']}"
+    ]
+    lines.extend(f"+ {rel_path}" for rel_path in result['added'])
+    lines.extend(f"- {rel_path}" for rel_path in result['removed'])
+    lines.extend(f"~ {rel_path}" for rel_path in result['changed'])
+    for rel_path in result['changed']:
+        hunk_lines = result['hunks'].get(rel_path)
+        if hunk_lines:
+            lines.append("")
+            lines.extend(line.rstrip('\n') for line in hunk_lines)
+    return lines
+
+
+def _shingle_hashes(text: Union[str, bytes], k: int, unit: str) -> List[int]:
+    """
+    计算文本中所有 k-shingle 的哈希 (可能包含重复值)
+
+    词和行先用 zlib.crc32 映射为整数，再对 k 个相邻整数组成的元组取哈希。
+    整数元组的哈希不受 PYTHONHASHSEED 影响，因此签名可以跨进程比较。
+    """
+    data = text.encode('utf-8') if isinstance(text, str) else text
+    if unit == 'word':
+        tokens = list(map(zlib.crc32, data.split()))
+    elif unit == 'line':
+        tokens = list(map(zlib.crc32, data.splitlines()))
+    elif unit == 'char':
+        # 字符 shingle 直接取 k 字节的子串，每个子串本身就是一个 shingle
+        slices = map(slice, range(len(data) - k + 1), range(k, len(data) + 1))
+        tokens = list(map(zlib.crc32, map(data.__getitem__, slices)))
+        if not tokens and data:
+            tokens = [zlib.crc32(data)]
+        k = 1
+    else:
+        raise ValueError(f"不支持的 shingle 单位: {unit}. 可用单位: {', '.join(SHINGLE_UNITS)}")
+
+    if not tokens:
+        return []
+    if len(tokens) <= k:
+        return [hash(tuple(tokens))]
+    return list(map(hash, zip(*(tokens[i:] for i in range(k)))))
+
+
+def signature_size(error: float = DEFAULT_SIMILARITY_ERROR) -> int:
+    """
+    根据误差上限计算 MinHash 签名长度
+
+    估计值的标准差不超过 1/(2*sqrt(签名长度)) = error/2，
+    因此约 95% 的估计值与精确的 Jaccard 相似度相差不超过 error。
+    """
+    if not 0 < error < 1:
+        raise ValueError("误差上限必须在 0 和 1 之间")
+    return math.ceil(1 / (error * error))
+
+
+def minhash_signature(text: Union[str, bytes], error: float = DEFAULT_SIMILARITY_ERROR,
+                      k: int = DEFAULT_SHINGLE_SIZE, unit: str = 'word') -> List[int]:
+    """
+    计算文本的 MinHash 签名 (bottom-k 形式)
+
+    只用一个哈希函数，保留全部 shingle 哈希中最小的若干个值，
+    效果等价于多个独立哈希函数的 MinHash，但只需一次线性扫描。
+    哈希值近似均匀分布，因此先用阈值过滤出一小部分候选值再排序。
+
+    Args:
+        text: 文本或字节串
+        error: 相似度估计的误差上限
+        k: shingle 长度 (单位由 unit 决定)
+        unit: shingle 单位 (word, line, char)
+
+    Returns:
+        升序排列的签名
+    """
+    hashes = _shingle_hashes(text, k, unit)
+    size = signature_size(error)
+    if len(hashes) <= 4 * size:
+        return sorted(set(hashes))[:size]
+
+    fraction = 4 * size / len(hashes)
+    while True:
+        threshold = int(-2 ** 63 + fraction * 2 ** 64)
+        candidates = set(filter(threshold.__gt__, hashes))
+        if len(candidates) >= size or fraction >= 1:
+            return sorted(candidates)[:size]
+        fraction = min(fraction * 4, 1)
+
+
+def signature_similarity(signature1: List[int], signature2: List[int],
+                         error: float = DEFAULT_SIMILARITY_ERROR) -> float:
+    """根据两个 MinHash 签名 (使用相同的 error 计算) 估计 Jaccard 相似度"""
+    if not signature1 and not signature2:
+        return 1.0
+    set1, set2 = set(signature1), set(signature2)
+    union = heapq.nsmallest(signature_size(error), set1 | set2)
+    shared = sum(1 for value in union if value in set1 and value in set2)
+    return shared / len(union)
 
 
-def get_similarity_ratio(text1: str, text2: str) -> float:
+def estimate_similarity(text1: Union[str, bytes], text2: Union[str, bytes],
+                        error: float = DEFAULT_SIMILARITY_ERROR,
+                        k: int = DEFAULT_SHINGLE_SIZE, unit: str = 'word') -> float:
+    """
+    使用 k-shingle 与 MinHash 估计两段文本的相似度
+
+    结果是两段文本 shingle 集合的 Jaccard 相似度的估计值，约 95% 的情况下与
+    精确的 Jaccard 相似度相差不超过 error (见 signature_size)。它与 SequenceMatcher.ratio() 是不同的指标：
+    每处修改会影响附近 k 个 shingle，分散的少量修改就会让 Jaccard 相似度
+    明显低于 ratio()。耗时与文本长度成线性关系，纯 Python 实现处理数 MB 的
+    文本约需零点几秒。
+
+    Args:
+        text1: 第一段文本
+        text2: 第二段文本
+        error: 误差上限 (默认: 0.05)
+        k: shingle 长度
+        unit: shingle 单位 (word, line, char)
+
+    Returns:
+        相似度估计值 (0.0 - 1.0)
+    """
+    return signature_similarity(minhash_signature(text1, error, k, unit),
+                                minhash_signature(text2, error, k, unit), error)
+
+
+def get_similarity_ratio(text1: str, text2: str, approx: bool = False,
+                         error: float = DEFAULT_SIMILARITY_ERROR) -> float:
     """
     计算两段文本的相似度
     
     Args:
         text1: 第一段文本
         text2: 第二段文本
+        approx: 为 True 时改用 estimate_similarity 估计词 3-shingle 的 Jaccard
+                相似度，不计算完整差异 (适合大文本)。这与默认的字符级
+                SequenceMatcher.ratio() 不是同一个指标，数值通常更低，两者不能混用
+        error: 近似估计相对于 Jaccard 相似度的误差上限
         
     Returns:
         相似度比例 (0.0 - 1.0)
     """
+    if approx:
+        return estimate_similarity(text1, text2, error)
     return difflib.SequenceMatcher(None, text1, text2).ratio()
 
 
-def get_side_by_side_diff(text1: str, text2: str, width: int = 80) -> List[str]:
+def lsh_signature(text: Union[str, bytes], num_bins: int = LSH_BINS,
+                  k: int = DEFAULT_SHINGLE_SIZE, unit: str = 'word') -> Tuple[int, ...]:
+    """
+    计算用于 LSH 分桶的定长 MinHash 签名 (one permutation hashing)
+
+    将哈希空间均分为 num_bins 个区间，每个区间保留最小的哈希值；
+    空区间从右侧最近的非空区间借值并加上距离偏移 (rotation densification)，
+    这样签名的每个位置都可以在不同文件之间逐位比较。
+    """
+    empty = 1 << 64
+    mins = [empty] * num_bins
+    for value in set(_shingle_hashes(text, k, unit)):
+        value += 1 << 63
+        index = (value * num_bins) >> 64
+        if value < mins[index]:
+            mins[index] = value
+
+    if all(value == empty for value in mins):
+        return tuple(mins)
+    signature = list(mins)
+    for index in range(num_bins):
+        distance = 1
+        while signature[index] == empty:
+            borrowed = mins[(index + distance) % num_bins]
+            if borrowed != empty:
+                signature[index] = borrowed + distance * empty
+            distance += 1
+    return tuple(signature)
+
+
+def _lsh_bands(jaccard: float, num_bins: int,
+               recall: float = LSH_RECALL) -> Tuple[int, int]:
+    """
+    选择 LSH 分段方式 (bands, rows)
+
+    在 Jaccard 相似度为 jaccard 的文件对成为候选的概率 1 - (1 - j^r)^b 不低于
+    recall 的前提下，选择每段行数最多 (候选最少) 的分段方式。
+    """
+    for rows in range(num_bins, 0, -1):
+        if num_bins % rows:
+            continue
+        bands = num_bins // rows
+        if 1 - (1 - jaccard ** rows) ** bands >= recall:
+            return bands, rows
+    return num_bins, 1
+
+
+def _file_lsh_signature(path: str) -> Tuple[int, ...]:
+    with open(path, 'rb') as f:
+        return lsh_signature(f.read())
+
+
+def _line_ratio(lines1: Sequence[bytes], lines2: Sequence[bytes],
+                algorithm: str) -> float:
+    """基于行级差异的相似度 (定义与 SequenceMatcher.ratio() 相同)"""
+    total = len(lines1) + len(lines2)
+    if not total:
+        return 1.0
+    matches = sum(i2 - i1
+                  for tag, i1, i2, _, _ in get_opcodes(lines1, lines2, algorithm)
+                  if tag == 'equal')
+    return 2.0 * matches / total
+
+
+def find_near_duplicates(directory: str, threshold: float = DEFAULT_DUPLICATE_THRESHOLD,
+                         algorithm: str = 'histogram',
+                         max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    查找目录中内容近似相同的文件
+
+    先为每个文件计算定长 MinHash 签名 (在进程池中并行)，再用 LSH 按签名分段
+    分桶，只有落入同一个桶的文件对才会用完整的行级差异计算相似度进行确认。
+    已确认属于同一组的文件对不再重复比较。
+
+    Args:
+        directory: 要扫描的目录
+        threshold: 相似度阈值 (0.0 - 1.0)
+        algorithm: 确认候选文件对时使用的差异算法
+        max_workers: 并行计算签名的进程数
+
+    Returns:
+        相似文件组列表，每组包含 files (相对路径列表) 和
+        min_similarity (组内已确认文件对的最低相似度)
+    """
+    if not os.path.isdir(directory):
+        raise FileNotFoundError(f"目录不存在: {directory}")
+    if not 0 < threshold <= 1:
+        raise ValueError("相似度阈值必须在 0 和 1 之间")
+
+    tree = _scan_tree(directory)
+    rel_paths = sorted(rel_path for rel_path, (_, size) in tree.items() if size)
+    paths = [tree[rel_path][0] for rel_path in rel_paths]
+    if len(paths) < 2:
+        return []
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        signatures = list(executor.map(_file_lsh_signature, paths, chunksize=64))
+
+    # 行级相似度与 Dice 系数同形，按 J = R / (2 - R) 换算为 LSH 使用的 Jaccard 阈值
+    bands, rows = _lsh_bands(threshold / (2 - threshold), LSH_BINS)
+    parent = list(range(len(paths)))
+
+    def find(index: int) -> int:
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    line_cache: Dict[int, List[bytes]] = {}
+
+    def lines_of(index: int) -> List[bytes]:
+        if index not in line_cache:
+            if len(line_cache) > 1024:
+                line_cache.clear()
+            with open(paths[index], 'rb') as f:
+                line_cache[index] = f.read().splitlines()
+        return line_cache[index]
+
+    min_similarity: Dict[int, float] = {}
+    for band in range(bands):
+        buckets: Dict[Tuple[int, ...], List[int]] = {}
+        for index, signature in enumerate(signatures):
+            key = signature[band * rows:(band + 1) * rows]
+            buckets.setdefault(key, []).append(index)
+
+        for members in buckets.values():
+            for position, first in enumerate(members):
+                for second in members[position + 1:]:
+                    root1, root2 = find(first), find(second)
+                    if root1 == root2:
+                        continue
+                    ratio = _line_ratio(lines_of(first), lines_of(second), algorithm)
+                    if ratio >= threshold:
+                        parent[root2] = root1
+                        min_similarity[root1] = min(ratio,
+                                                    min_similarity.pop(root1, 1.0),
+                                                    min_similarity.pop(root2, 1.0))
+
+    clusters: Dict[int, List[str]] = {}
+    for index, rel_path in enumerate(rel_paths):
+        clusters.setdefault(find(index), []).append(rel_path)
+    return sorted(
+        ({'files': files, 'min_similarity': min_similarity[root]}
+         for root, files in clusters.items() if len(files) > 1),
+        key=lambda cluster: (-len(cluster['files']), cluster['files'][0])
+    )
+
+
+def format_duplicates(clusters: List[Dict[str, Any]], threshold: float) -> List[str]:
+    """格式化近似重复文件查找结果"""
+    if not clusters:
+        return [f"未发现相似度不低于 {threshold:.0%} 的文件"]
+    lines = [f"发现 {len(clusters)} 组相似文件 (阈值 {threshold:.0%}):"]
+    for number, cluster in enumerate(clusters, 1):
+        lines.append(f"[{number}] {len(cluster['files'])} 个文件, "
+                     f"最低相似度 {cluster['min_similarity']:.2%}")
+        lines.extend(f"    {rel_path}" for rel_path in cluster['files'])
+    return lines
+
+
+def _iter_sync_regions(blocks_ours: Iterable[Block], blocks_theirs: Iterable[Block]
+                       ) -> Iterator[Tuple[int, int, int, int]]:
+    """
+    求两组匹配块在基础版本上的交集
+
+    产出 (基础起点, 基础终点, ours 起点, theirs 起点)
+    """
+    ours = iter(blocks_ours)
+    theirs = iter(blocks_theirs)
+    block_a = next(ours, None)
+    block_b = next(theirs, None)
+    while block_a is not None and block_b is not None:
+        base_a, other_a, size_a = block_a
+        base_b, other_b, size_b = block_b
+        lo = max(base_a, base_b)
+        hi = min(base_a + size_a, base_b + size_b)
+        if lo < hi:
+            yield lo, hi, other_a + lo - base_a, other_b + lo - base_b
+        if base_a + size_a < base_b + size_b:
+            block_a = next(ours, None)
+        else:
+            block_b = next(theirs, None)
+
+
+def iter_merge_regions(base: Sequence[Hashable], ours: Sequence[Hashable],
+                       theirs: Sequence[Hashable],
+                       algorithm: str = 'histogram') -> Iterator[Tuple]:
+    """
+    计算三方合并的区域
+
+    三个版本的行先映射为共享的整数 ID，再分别计算 base→ours 和 base→theirs
+    的匹配块，两者在基础版本上的交集即为三方都相同的同步区域；同步区域之间
+    只有一方修改的取修改方，两方修改相同的取任一方，否则为冲突。
+
+    Args:
+        base: 基础版本的行
+        ours: 本方版本的行
+        theirs: 对方版本的行
+        algorithm: 差异算法 (myers, histogram)
+
+    Returns:
+        区域迭代器，每个区域为以下之一:
+        ('unchanged', 基础起点, 基础终点)、('ours', 起点, 终点)、
+        ('theirs', 起点, 终点)、('same', ours 起点, ours 终点)、
+        ('conflict', 基础起点, 基础终点, ours 起点, ours 终点, theirs 起点, theirs 终点)
+    """
+    z, a, b = intern_lines(base, ours, theirs)
+    syncs = _iter_sync_regions(iter_blocks(z, a, algorithm),
+                               iter_blocks(z, b, algorithm))
+
+    iz = ia = ib = 0
+    for zlo, zhi, alo, blo in chain(syncs, [(len(z), len(z), len(a), len(b))]):
+        if iz < zlo or ia < alo or ib < blo:
+            base_part = z[iz:zlo]
+            ours_part = a[ia:alo]
+            theirs_part = b[ib:blo]
+            if ours_part == base_part:
+                yield ('theirs', ib, blo)
+            elif theirs_part == base_part or ours_part == theirs_part:
+                yield ('ours' if theirs_part == base_part else 'same', ia, alo)
+            else:
+                yield ('conflict', iz, zlo, ia, alo, ib, blo)
+        if zlo < zhi:
+            yield ('unchanged', zlo, zhi)
+        iz, ia, ib = zhi, alo + zhi - zlo, blo + zhi - zlo
+
+
+def _conflict_lines(lines: Sequence[str]) -> Iterator[str]:
+    """冲突块中的行，缺少换行符的最后一行补上换行，避免与标记连在一起"""
+    for line in lines:
+        yield line if line.endswith('\n') else line + '\n'
+
+
+def merge_lines(base: Sequence[str], ours: Sequence[str], theirs: Sequence[str],
+                algorithm: str = 'histogram', ours_label: str = 'ours',
+                theirs_label: str = 'theirs', base_label: Optional[str] = None,
+                regions: Optional[Iterable[Tuple]] = None) -> Iterator[str]:
+    """
+    三方合并，逐行产出合并结果
+
+    冲突处使用与 git 相同的冲突标记；指定 base_label 时按 diff3 风格
+    在冲突块中同时输出基础版本内容。
+
+    Args:
+        base: 基础版本的行 (保留换行符)
+        ours: 本方版本的行
+        theirs: 对方版本的行
+        algorithm: 差异算法 (myers, histogram)
+        ours_label: 本方标签
+        theirs_label: 对方标签
+        base_label: 基础版本标签，None 表示不输出基础版本内容
+        regions: 已计算的合并区域，None 时自动计算
+
+    Returns:
+        合并结果的行迭代器
+    """
+    if regions is None:
+        regions = iter_merge_regions(base, ours, theirs, algorithm)
+    marker = MERGE_MARKER_SIZE
+    for region in regions:
+        kind = region[0]
+        if kind == 'unchanged':
+            yield from _iter_line_range(base, region[1], region[2])
+        elif kind in ('ours', 'same'):
+            yield from _iter_line_range(ours, region[1], region[2])
+        elif kind == 'theirs':
+            yield from _iter_line_range(theirs, region[1], region[2])
+        else:
+            _, zlo, zhi, alo, ahi, blo, bhi = region
+            yield f"{'<' * marker} {ours_label}\n"
+            yield from _conflict_lines(ours[alo:ahi])
+            if base_label is not None:
+                yield f"{'|' * marker} {base_label}\n"
+                yield from _conflict_lines(base[zlo:zhi])
+            yield '=' * marker + '\n'
+            yield from _conflict_lines(theirs[blo:bhi])
+            yield f"{'>' * marker} {theirs_label}\n"
+
+
+def _read_lines(path: str) -> List[str]:
+    """读取文件的行，保留原始换行符"""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"文件不存在: {path}")
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return f.readlines()
+
+
+def merge_files(base_path: str, ours_path: str, theirs_path: str, stream,
+                algorithm: str = 'histogram', show_base: bool = False) -> int:
+    """
+    三方合并三个文件，结果逐行写入 stream
+
+    Args:
+        base_path: 基础版本文件路径
+        ours_path: 本方版本文件路径
+        theirs_path: 对方版本文件路径
+        stream: 输出流
+        algorithm: 差异算法 (myers, histogram)
+        show_base: 冲突块中是否同时输出基础版本内容
+
+    Returns:
+        冲突数量
+    """
+    base = _read_lines(base_path)
+    ours = _read_lines(ours_path)
+    theirs = _read_lines(theirs_path)
+
+    conflicts = 0
+
+    def counted(regions: Iterable[Tuple]) -> Iterator[Tuple]:
+        nonlocal conflicts
+        for region in regions:
+            if region[0] == 'conflict':
+                conflicts += 1
+            yield region
+
+    regions = counted(iter_merge_regions(base, ours, theirs, algorithm))
+    stream.writelines(merge_lines(base, ours, theirs, algorithm, ours_path, theirs_path,
+                                  base_path if show_base else None, regions))
+    return conflicts
+
+
+def _patch_path(header: str) -> str:
+    """从 ---/+++ 文件头中取出路径 (去掉制表符后的时间戳)"""
+    return header[4:].split('\t')[0].rstrip('\r\n')
+
+
+def parse_patch(lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """
+    流式解析统一差异格式的补丁
+
+    每解析完一个文件就立即产出，不会一次读入整个补丁。差异块内的行按
+    头部记录的行数归属，因此以 '--- ' 开头的删除行不会被误认为文件头。
+
+    Args:
+        lines: 补丁的行 (保留换行符)
+
+    Returns:
+        文件补丁迭代器，每项为 {'old': 原路径, 'new': 新路径, 'hunks': 差异块列表}，
+        差异块为 {'old_start', 'old_count', 'new_start', 'new_count', 'lines'}，
+        lines 为 (操作符, 行内容) 列表
+    """
+    patch: Optional[Dict[str, Any]] = None
+    hunk: Optional[Dict[str, Any]] = None
+    old_path: Optional[str] = None
+    old_left = new_left = 0
+
+    for line in lines:
+        if line.startswith('\\'):
+            # "\ No newline at end of file"：上一行没有换行符
+            if hunk is not None and hunk['lines']:
+                op, text = hunk['lines'][-1]
+                hunk['lines'][-1] = (op, _split_line_ending(text)[0])
+            continue
+        if old_left > 0 or new_left > 0:
+            op, text = (' ', line) if line in ('\n', '\r\n') else (line[:1], line[1:])
+            if op not in (' ', '-', '+'):
+                raise ValueError(f"差异块内容不完整: {line.rstrip()!r}")
+            if op != '+':
+                old_left -= 1
+            if op != '-':
+                new_left -= 1
+            hunk['lines'].append((op, text))
+            continue
+
+        if line.startswith('--- '):
+            if patch is not None:
+                yield patch
+                patch = None
+            old_path = _patch_path(line)
+        elif line.startswith('+++ ') and old_path is not None:
+            patch = {'old': old_path, 'new': _patch_path(line), 'hunks': []}
+            old_path = None
+        elif line.startswith('@@'):
+            match = _HUNK_HEADER.match(line)
+            if match is None or patch is None:
+                raise ValueError(f"无效的差异块头: {line.rstrip()!r}")
+            old_start, old_count, new_start, new_count = match.groups()
+            old_left = 1 if old_count is None else int(old_count)
+            new_left = 1 if new_count is None else int(new_count)
+            hunk = {'old_start': int(old_start), 'old_count': old_left,
+                    'new_start': int(new_start), 'new_count': new_left, 'lines': []}
+            patch['hunks'].append(hunk)
+
+    if old_left > 0 or new_left > 0:
+        raise ValueError("补丁在差异块中间结束")
+    if patch is not None:
+        yield patch
+
+
+def _find_hunk(lines: Sequence[str], old: List[str], start: int,
+               expected: int) -> Optional[int]:
+    """从期望位置向两侧交替搜索 old 出现的位置，结果不早于 start"""
+    last = len(lines) - len(old)
+    if last < start:
+        return None
+    if not old:
+        return min(max(expected, start), last)
+    expected = min(max(expected, start), last)
+    first = old[0]
+    for distance in range(max(expected - start, last - expected) + 1):
+        for position in (expected - distance, expected + distance):
+            if (start <= position <= last and lines[position] == first
+                    and lines[position:position + len(old)] == old):
+                return position
+    return None
+
+
+def apply_hunks(lines: Sequence[str], hunks: Sequence[Dict[str, Any]],
+                fuzz: int = 0) -> Tuple[List[str], List[Tuple[int, int]]]:
+    """
+    按顺序一次性应用差异块
+
+    每个差异块先在期望位置 (已累计前面差异块的偏移) 匹配，找不到时向两侧
+    搜索；fuzz 大于 0 时依次忽略首尾最多 fuzz 行上下文后再尝试。已应用的
+    区域不会再被搜索，整个过程只向前扫描原文件一遍。
+
+    Args:
+        lines: 原文件的行
+        hunks: 差异块列表 (parse_patch 的结果)
+        fuzz: 允许忽略的首尾上下文行数
+
+    Returns:
+        (新文件的行, 每个差异块的 (偏移行数, 使用的模糊级别))
+    """
+    output: List[str] = []
+    applied: List[Tuple[int, int]] = []
+    pos = offset = 0
+    for index, hunk in enumerate(hunks, 1):
+        body = hunk['lines']
+        leading = next((k for k, (op, _) in enumerate(body) if op != ' '), len(body))
+        trailing = next((k for k, (op, _) in enumerate(reversed(body)) if op != ' '),
+                        len(body))
+        for level in range(fuzz + 1):
+            top = min(level, leading)
+            part = body[top:len(body) - min(level, trailing)]
+            old = [text for op, text in part if op != '+']
+            # 纯插入的差异块 (-N,0) 表示插入到第 N 行之后
+            anchor = hunk['old_start'] - (1 if hunk['old_count'] else 0) + top
+            found = _find_hunk(lines, old, pos, anchor + offset)
+            if found is not None:
+                break
+        else:
+            raise ValueError(f"第 {index} 个差异块无法应用 (原文件第 {hunk['old_start']} 行)")
+        output.extend(lines[pos:found])
+        output.extend(text for op, text in part if op != '-')
+        pos = found + len(old)
+        offset = found - anchor
+        applied.append((offset, level))
+    output.extend(lines[pos:])
+    return output, applied
+
+
+def _strip_patch_path(path: str, strip: int) -> str:
+    if path == '/dev/null' or strip <= 0:
+        return path
+    parts = path.split('/')
+    if len(parts) <= strip:
+        raise ValueError(f"路径层级不足，无法去掉 {strip} 级前缀: {path}")
+    return '/'.join(parts[strip:])
+
+
+def _patch_target(directory: str, path: str) -> str:
+    """
+    计算补丁目标文件的路径，拒绝指向 directory 之外的路径
+
+    Args:
+        directory: 补丁应用的根目录
+        path: 去掉前缀后的补丁路径
+
+    Returns:
+        目标文件路径
+    """
+    parts = re.split(r'[\\/]', path)
+    if os.path.isabs(path) or re.match(r'^[A-Za-z]:', path) or '..' in parts:
+        raise ValueError(f"补丁路径不安全 (绝对路径或包含 ..): {path}")
+    target = os.path.normpath(os.path.join(directory, path))
+    root = os.path.realpath(directory)
+    if os.path.commonpath([root, os.path.realpath(target)]) != root:
+        raise ValueError(f"补丁路径指向目录之外: {path}")
+    return target
+
+
+@contextmanager
+def _atomic_output(path: str):
+    """
+    产出同目录下临时文件的写入流，正常结束后替换目标文件
+
+    目标文件已存在时保留它的权限位；中途失败不会留下半个文件。
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory,
+                                     prefix=f".{os.path.basename(path)}.",
+                                     suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+            yield f
+        if os.path.exists(path):
+            shutil.copymode(path, temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _write_atomic(path: str, lines: Iterable[str]):
+    """写入同目录下的临时文件后替换目标文件，中途失败不会留下半个文件"""
+    with _atomic_output(path) as f:
+        f.writelines(lines)
+
+
+def _apply_file_patches(job: Tuple[str, List[Dict[str, Any]], int]) -> Dict[str, Any]:
+    """子进程中把同一文件的全部补丁依次应用，成功后一次性写回"""
+    target, patches, fuzz = job
+    result = {'file': target, 'status': 'ok', 'hunks': 0, 'offset': 0, 'fuzz': 0,
+              'error': None}
+    try:
+        if patches[0]['old'] == '/dev/null':
+            if os.path.exists(target):
+                raise FileExistsError(f"要创建的文件已存在: {target}")
+            lines: List[str] = []
+            result['status'] = 'created'
+        else:
+            lines = _read_lines(target)
+        for patch in patches:
+            lines, applied = apply_hunks(lines, patch['hunks'], fuzz)
+            result['hunks'] += len(applied)
+            result['offset'] += sum(1 for offset, _ in applied if offset)
+            result['fuzz'] = max([result['fuzz']] + [level for _, level in applied])
+
+        if patches[-1]['new'] == '/dev/null':
+            if lines:
+                raise ValueError(f"要删除的文件仍有内容: {target}")
+            os.remove(target)
+            result['status'] = 'deleted'
+        else:
+            _write_atomic(target, lines)
+    except (OSError, ValueError, UnicodeDecodeError) as e:
+        result['status'] = 'failed'
+        result['error'] = str(e)
+    return result
+
+
+def apply_patch(patch_path: str, directory: str = '.', fuzz: int = 0,
+                strip: Optional[int] = None,
+                max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    应用统一差异格式的补丁
+
+    补丁按流解析后按目标文件分组，不同文件在进程池中并行应用；每个文件
+    要么全部差异块应用成功并原子地替换，要么保持不变。
+
+    Args:
+        patch_path: 补丁文件路径
+        directory: 补丁中相对路径的根目录
+        fuzz: 允许忽略的首尾上下文行数
+        strip: 去掉路径前缀的层级，None 时对 git 风格的 a/ b/ 前缀自动去掉一级
+        max_workers: 并行进程数，默认由 concurrent.futures 决定
+
+    Returns:
+        每个文件的结果字典列表，包含 file、status (ok, created, deleted, failed)、
+        hunks、offset (发生偏移的差异块数)、fuzz (最大模糊级别) 和 error
+    """
+    if not os.path.exists(patch_path):
+        raise FileNotFoundError(f"补丁文件不存在: {patch_path}")
+
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    with open(patch_path, 'r', encoding='utf-8', newline='') as f:
+        for patch in parse_patch(f):
+            level = strip
+            if level is None:
+                old, new = patch['old'], patch['new']
+                git_style = (old.startswith('a/') or old == '/dev/null') and \
+                            (new.startswith('b/') or new == '/dev/null')
+                level = 1 if git_style else 0
+            name = patch['new'] if patch['new'] != '/dev/null' else patch['old']
+            target = _patch_target(directory, _strip_patch_path(name, level))
+            groups.setdefault(target, []).append(patch)
+
+    jobs = [(target, patches, fuzz) for target, patches in groups.items()]
+    if len(jobs) <= 1 or max_workers == 1:
+        return list(map(_apply_file_patches, jobs))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_apply_file_patches, jobs, chunksize=16))
+
+
+def format_patch_results(results: List[Dict[str, Any]]) -> List[str]:
+    """格式化补丁应用结果"""
+    failed = [result for result in results if result['status'] == 'failed']
+    lines = [f"已应用: {len(results) - len(failed)} 个文件, 失败: {len(failed)} 个文件"]
+    labels = {'ok': '修改', 'created': '新建', 'deleted': '删除'}
+    for result in results:
+        if result['status'] == 'failed':
+            lines.append(f"失败 {result['file']}: {result['error']}")
+            continue
+        detail = ''
+        if result['offset'] or result['fuzz']:
+            detail = f" ({result['offset']} 个差异块有偏移, 最大模糊级别 {result['fuzz']})"
+        lines.append(f"{labels[result['status']]} {result['file']}{detail}")
+    return lines
+
+
+def _count_lines(data: bytes) -> int:
+    """统计行数 (与 splitlines 对仅含换行符分隔的文本结果一致)"""
+    return data.count(b'\n') + (1 if data and not data.endswith(b'\n') else 0)
+
+
+def approximate_stats(data1: Union[str, bytes], data2: Union[str, bytes],
+                      error: float = DEFAULT_SIMILARITY_ERROR) -> dict:
+    """不计算完整差异，只统计行数并估计相似度"""
+    data1 = data1.encode('utf-8') if isinstance(data1, str) else data1
+    data2 = data2.encode('utf-8') if isinstance(data2, str) else data2
+    return {
+        'total_lines_1': _count_lines(data1),
+        'total_lines_2': _count_lines(data2),
+        'similarity': estimate_similarity(data1, data2, error),
+        'error': error
+    }
+
+
+def _format_approximate_stats(stats: dict, label: str) -> List[str]:
+    return [
+        f"{label}1行数: {stats['total_lines_1']}",
+        f"{label}2行数: {stats['total_lines_2']}",
+        f"近似相似度: {stats['similarity']:.2%} (±{stats['error']:.0%}, Jaccard)"
+    ]
+
+
+def _truncate(line: str, width: int) -> str:
+    """截断过长的行"""
+    if len(line) > width - 5:
+        return line[:width - 8] + "..."
+    return line
+
+
+def _iter_line_range(lines: Sequence[str], start: int, stop: int,
+                     chunk: int = 1024) -> Iterator[str]:
+    """分块切片遍历行，避免一次复制大段相同区域"""
+    for chunk_start in range(start, stop, chunk):
+        yield from lines[chunk_start:min(chunk_start + chunk, stop)]
+
+
+AlignedRow = Tuple[str, Optional[int], str, Optional[int], str]
+
+
+def _iter_aligned_rows(lines1: Sequence[str], lines2: Sequence[str],
+                       opcodes: Iterable[Opcode], collapse: Optional[int] = None
+                       ) -> Iterator[AlignedRow]:
+    """
+    根据操作码逐行对齐两侧内容
+
+    生成 (标记, 左侧行号, 左侧内容, 右侧行号, 右侧内容)，行号从 0 开始，
+    只出现在一侧的行另一侧行号为 None；折叠的相同区域生成 ('fold', 行数, '', None, '')。
+    """
+    codes = iter(opcodes)
+    current = next(codes, None)
+    # 流式输入中公共前缀没有建立索引，操作码从前缀之后开始
+    if current is not None and current[1] > 0 and collapse is not None:
+        yield 'fold', current[1], '', None, ''
+
+    first = True
+    while current is not None:
+        following = next(codes, None)
+        tag, i1, i2, j1, j2 = current
+        if tag == 'equal':
+            count = i2 - i1
+            head = 0 if first else collapse
+            tail = 0 if following is None else collapse
+            if collapse is None or head + tail >= count:
+                ranges = [(i1, j1, count)]
+            else:
+                ranges = [(i1, j1, head), (i2 - tail, j2 - tail, tail)]
+            for index, (start1, start2, length) in enumerate(ranges):
+                if index:
+                    yield 'fold', count - head - tail, '', None, ''
+                pairs = zip(_iter_line_range(lines1, start1, start1 + length),
+                            _iter_line_range(lines2, start2, start2 + length))
+                for offset, (left, right) in enumerate(pairs):
+                    yield '  ', start1 + offset, left, start2 + offset, right
+        else:
+            left_lines = lines1[i1:i2]
+            right_lines = lines2[j1:j2]
+            paired = min(len(left_lines), len(right_lines))
+            for offset in range(paired):
+                yield ('!=', i1 + offset, left_lines[offset],
+                       j1 + offset, right_lines[offset])
+            for offset in range(paired, len(left_lines)):
+                yield '<<', i1 + offset, left_lines[offset], None, ''
+            for offset in range(paired, len(right_lines)):
+                yield '>>', None, '', j1 + offset, right_lines[offset]
+        first = False
+        current = following
+
+
+def _moved_line_sets(moves: Optional[Iterable[Tuple[int, int, int, int]]]
+                     ) -> Tuple[set, set]:
+    moved_old: set = set()
+    moved_new: set = set()
+    for i1, i2, j1, j2 in moves or ():
+        moved_old.update(range(i1, i2))
+        moved_new.update(range(j1, j2))
+    return moved_old, moved_new
+
+
+def iter_side_by_side(
+        lines1: Sequence[str], lines2: Sequence[str], opcodes: Iterable[Opcode],
+        width: int = 80, collapse: Optional[int] = None,
+        intraline: Optional[str] = None,
+        intraline_max_length: Optional[int] = DEFAULT_INTRALINE_MAX_LENGTH,
+        moves: Optional[Iterable[Tuple[int, int, int, int]]] = None
+) -> Iterator[str]:
+    """
+    根据操作码逐行生成并排对比
+
+    插入和删除的行只出现在一侧、另一侧留空，因此后续行始终保持对齐。
+    标记含义: '  ' 相同, '!=' 修改, '<<' 仅左侧 (删除), '>>' 仅右侧 (新增)；
+    指定 moves 时移动的行标记为 '<~' (移出)、'~>' (移入) 或 '~~' (两侧都是)。
+
+    Args:
+        lines1: 第一组行
+        lines2: 第二组行
+        opcodes: 操作码 (可以是迭代器)
+        width: 每列的宽度
+        collapse: 相同区域保留的上下文行数，None 表示不折叠
+        intraline: 修改行的行内差异粒度 (word, char)，None 表示不细化
+        intraline_max_length: 细化行内差异的最大行长度
+        moves: find_moves 的结果，None 表示不标记移动
+
+    Returns:
+        并排对比结果的行迭代器
+    """
+    moved_old, moved_new = _moved_line_sets(moves)
+    yield f"{'文本1':<{width}} | {'文本2':<{width}}"
+    yield "-" * (width * 2 + 3)
+
+    rows = _iter_aligned_rows(lines1, lines2, opcodes, collapse)
+    for marker, left_no, left, right_no, right in rows:
+        if marker == 'fold':
+            yield f"{f'... 省略 {left_no} 行相同内容 ...':^{width * 2 + 3}}"
+            continue
+        left = left.rstrip('\r\n')
+        right = right.rstrip('\r\n')
+        if marker == '!=':
+            if left == right:
+                # 仅行尾换行符不同的行在并排视图中显示为相同
+                marker = '  '
+            elif intraline and left_no not in moved_old and right_no not in moved_new:
+                refined = refine_line_pair(left, right, intraline, intraline_max_length)
+                if refined:
+                    left = _render_segments(refined[0], str, lambda text: f'[-{text}-]')
+                    right = _render_segments(refined[1], str,
+                                             lambda text: f'{{+{text}+}}')
+        if marker != '  ':
+            marker = _move_marker(marker, left_no in moved_old, right_no in moved_new)
+        left, right = _truncate(left, width), _truncate(right, width)
+        yield f"{left:<{width}} {marker} {right:<{width}}"
+
+
+_HTML_ROW_CLASSES = {'  ': 'equal', '!=': 'replace', '<<': 'delete', '>>': 'insert'}
+
+
+def iter_html(lines1: Sequence[str], lines2: Sequence[str], opcodes: Iterable[Opcode],
+              fromfile: str = '文本1', tofile: str = '文本2',
+              collapse: Optional[int] = None, intraline: Optional[str] = None,
+              intraline_max_length: Optional[int] = DEFAULT_INTRALINE_MAX_LENGTH,
+              moves: Optional[Iterable[Tuple[int, int, int, int]]] = None
+              ) -> Iterator[str]:
+    """
+    根据操作码逐行生成 HTML 并排对比页面
+
+    Args:
+        lines1: 第一组行
+        lines2: 第二组行
+        opcodes: 操作码 (可以是迭代器)
+        fromfile: 左侧标题
+        tofile: 右侧标题
+        collapse: 相同区域保留的上下文行数，None 表示不折叠
+        intraline: 修改行的行内差异粒度 (word, char)，None 表示不细化
+        intraline_max_length: 细化行内差异的最大行长度
+        moves: find_moves 的结果，移动的行使用 moved 样式
+
+    Returns:
+        HTML 文档的行迭代器
+    """
+    moved_old, moved_new = _moved_line_sets(moves)
+    yield f"""<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <title>{html.escape(fromfile)} ↔ {html.escape(tofile)}</title>
+    <style>
+        table.diff {{
+            border-collapse: collapse;
+            width: 100%;
+            font-family: 'Consolas', 'Monaco', monospace;
+            font-size: 13px;
+        }}
+        table.diff th {{
+            background-color: #f6f8fa; text-align: left; padding: 4px 8px;
+        }}
+        table.diff td {{ padding: 0 8px; white-space: pre-wrap; vertical-align: top; }}
+        table.diff td.lineno {{ color: #6a737d; text-align: right; width: 1%; }}
+        tr.replace td.left, tr.delete td.left {{ background-color: #ffeef0; }}
+        tr.replace td.right, tr.insert td.right {{ background-color: #e6ffed; }}
+        tr.fold td {{ background-color: #f1f8ff; color: #6a737d; text-align: center; }}
+        table.diff td.moved {{ background-color: #fff5b1; }}
+        span.del {{ background-color: #fdb8c0; }}
+        span.ins {{ background-color: #acf2bd; }}
+    </style>
+</head>
+<body>
+<table class="diff">
+<tr><th colspan="2">{html.escape(fromfile)}</th>\
+<th colspan="2">{html.escape(tofile)}</th></tr>"""
+
+    rows = _iter_aligned_rows(lines1, lines2, opcodes, collapse)
+    for marker, left_no, left, right_no, right in rows:
+        if marker == 'fold':
+            yield (f'<tr class="fold"><td colspan="4">'
+                   f'... 省略 {left_no} 行相同内容 ...</td></tr>')
+            continue
+        left = left.rstrip('\r\n')
+        right = right.rstrip('\r\n')
+        left_class = 'left moved' if left_no in moved_old else 'left'
+        right_class = 'right moved' if right_no in moved_new else 'right'
+        refined = None
+        if marker == '!=' and intraline and left != right and \
+                left_no not in moved_old and right_no not in moved_new:
+            refined = refine_line_pair(left, right, intraline, intraline_max_length)
+        if refined:
+            left_html = _render_segments(
+                refined[0], html.escape,
+                lambda text: f'<span class="del">{html.escape(text)}</span>')
+            right_html = _render_segments(
+                refined[1], html.escape,
+                lambda text: f'<span class="ins">{html.escape(text)}</span>')
+        else:
+            left_html, right_html = html.escape(left), html.escape(right)
+        left_no = '' if left_no is None else left_no + 1
+        right_no = '' if right_no is None else right_no + 1
+        yield (f'<tr class="{_HTML_ROW_CLASSES[marker]}">'
+               f'<td class="lineno">{left_no}</td>'
+               f'<td class="{left_class}">{left_html}</td>'
+               f'<td class="lineno">{right_no}</td>'
+               f'<td class="{right_class}">{right_html}</td></tr>')
+
+    yield """</table>
+</body>
+</html>"""
+
+
+def get_side_by_side_diff(text1: str, text2: str, width: int = 80,
+                          collapse: Optional[int] = None,
+                          algorithm: str = DEFAULT_ALGORITHM) -> List[str]:
     """
     生成并排对比格式的差异
     
@@ -91,78 +2305,41 @@ def get_side_by_side_diff(text1: str, text2: str, width: int = 80) -> List[str]:
         text1: 第一段文本
         text2: 第二段文本
         width: 每列的宽度
+        collapse: 相同区域保留的上下文行数，None 表示不折叠
+        algorithm: 差异算法 (difflib, myers, histogram)
         
     Returns:
         并排差异对比结果列表
     """
-    lines1 = text1.splitlines()
-    lines2 = text2.splitlines()
-    
-    result = []
-    max_len = max(len(lines1), len(lines2))
-    
-    # 添加标题行
-    result.append(f"{'文本1':<{width}} | {'文本2':<{width}}")
-    result.append("-" * (width * 2 + 3))
-    
-    for i in range(max_len):
-        line1 = lines1[i] if i < len(lines1) else ""
-        line2 = lines2[i] if i < len(lines2) else ""
-        
-        # 截断过长的行
-        if len(line1) > width - 5:
-            line1 = line1[:width - 8] + "..."
-        if len(line2) > width - 5:
-            line2 = line2[:width - 8] + "..."
-        
-        # 标记不同的行
-        marker = "!=" if line1 != line2 else "  "
-        result.append(f"{line1:<{width}} {marker} {line2:<{width}}")
-    
-    return result
+    diff_result = DiffResult(text1.splitlines(), text2.splitlines(), algorithm)
+    return list(diff_result.side_by_side(width, collapse))
 
 
-def analyze_changes(text1: str, text2: str) -> dict:
+def analyze_changes(text1: str, text2: str, algorithm: str = DEFAULT_ALGORITHM) -> dict:
     """
     分析文本变化统计
     
     Args:
         text1: 第一段文本
         text2: 第二段文本
+        algorithm: 差异算法 (difflib, myers, histogram)
         
     Returns:
         变化统计字典
     """
-    lines1 = text1.splitlines()
-    lines2 = text2.splitlines()
-    
-    matcher = difflib.SequenceMatcher(None, lines1, lines2)
-    
-    additions = 0
-    deletions = 0
-    modifications = 0
-    
-    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
-        if tag == 'insert':
-            additions += j2 - j1
-        elif tag == 'delete':
-            deletions += i2 - i1
-        elif tag == 'replace':
-            modifications += max(i2 - i1, j2 - j1)
-    
-    total_lines1 = len(lines1)
-    total_lines2 = len(lines2)
-    similarity = matcher.ratio()
-    
-    return {
-        'total_lines_1': total_lines1,
-        'total_lines_2': total_lines2,
-        'additions': additions,
-        'deletions': deletions,
-        'modifications': modifications,
-        'similarity': similarity,
-        'total_changes': additions + deletions + modifications
-    }
+    return DiffResult(text1.splitlines(), text2.splitlines(), algorithm).stats()
+
+
+def _format_stats(stats: dict, label: str) -> List[str]:
+    return [
+        f"{label}1行数: {stats['total_lines_1']}",
+        f"{label}2行数: {stats['total_lines_2']}",
+        f"新增行数: {stats['additions']}",
+        f"删除行数: {stats['deletions']}",
+        f"修改行数: {stats['modifications']}",
+        f"相似度: {stats['similarity']:.2%}",
+        f"总变更数: {stats['total_changes']}"
+    ] + ([f"移动行数: {stats['moved']}"] if 'moved' in stats else [])
 
 
 def register_parser(subparsers):
@@ -173,17 +2350,67 @@ def register_parser(subparsers):
     input_group = parser.add_mutually_exclusive_group(required=True)
     input_group.add_argument('--files', nargs=2, metavar=('FILE1', 'FILE2'),
                            help='对比两个文件')
+    input_group.add_argument('--dirs', nargs=2, metavar=('DIR1', 'DIR2'),
+                           help='递归对比两个目录')
+    input_group.add_argument('--find-duplicates', metavar='DIR',
+                           help='查找目录中内容近似相同的文件')
+    input_group.add_argument('--merge', nargs=3, metavar=('BASE', 'OURS', 'THEIRS'),
+                           help='三方合并，冲突处输出冲突标记')
+    input_group.add_argument('--apply', metavar='PATCH',
+                           help='应用统一差异格式的补丁')
     input_group.add_argument('--text1', help='第一段文本')
     
     parser.add_argument('--text2', help='第二段文本 (与 --text1 配合使用)')
     
     # 输出选项
-    parser.add_argument('--format', choices=['unified', 'side-by-side', 'stats'],
-                       default='unified', help='输出格式 (默认: unified)')
+    parser.add_argument('--format', nargs='+', choices=DiffResult.VIEWS,
+                       default=['unified'],
+                       help='输出格式，可同时指定多个，共用一次差异计算 (默认: unified)')
     parser.add_argument('--context', '-c', type=int, default=3,
                        help='上下文行数 (默认: 3)')
     parser.add_argument('--width', '-w', type=int, default=80,
                        help='并排模式的列宽 (默认: 80)')
+    parser.add_argument('--collapse', type=int, metavar='N',
+                       help='并排模式下折叠相同区域，只保留 N 行上下文')
+    parser.add_argument('--intraline', choices=INTRALINE_MODES,
+                       help='标出修改行的行内差异 (word 按单词，char 按字符)')
+    parser.add_argument('--intraline-max-length', type=int,
+                       default=DEFAULT_INTRALINE_MAX_LENGTH, metavar='N',
+                       help=f'超过 N 个字符的行不做行内细化 (默认: {DEFAULT_INTRALINE_MAX_LENGTH})')
+    parser.add_argument('--ignore-whitespace', action='store_true',
+                       help='比较时忽略所有空白字符')
+    parser.add_argument('--ignore-case', action='store_true', help='比较时忽略大小写')
+    parser.add_argument('--detect-moves', action='store_true',
+                       help='在并排和 HTML 视图中标出移动的代码块，并统计移动行数')
+    parser.add_argument('--algorithm', '-a', choices=DIFF_ALGORITHMS,
+                       default=DEFAULT_ALGORITHM,
+                       help=f'差异算法 (默认: {DEFAULT_ALGORITHM})，大文件推荐 histogram')
+    parser.add_argument('--stream', action='store_true',
+                       help='流式对比大文件 (仅 --files 与单个 unified 或 side-by-side 格式，'
+                            'difflib 算法按 myers 处理)')
+    parser.add_argument('--approx', action='store_true',
+                       help='stats 格式下用 MinHash 估计词 shingle 的 Jaccard 相似度，'
+                            '不计算完整差异 (与默认的 SequenceMatcher 相似度不是同一指标)')
+    parser.add_argument('--error', type=float, default=DEFAULT_SIMILARITY_ERROR,
+                       help='近似相似度相对于 Jaccard 相似度的误差上限 '
+                            f'(默认: {DEFAULT_SIMILARITY_ERROR})')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_DUPLICATE_THRESHOLD,
+                       help=f'近似重复文件的相似度阈值 (默认: {DEFAULT_DUPLICATE_THRESHOLD})')
+    parser.add_argument('--hunks', action='store_true',
+                       help='目录对比时输出修改文件的差异块')
+    parser.add_argument('--jobs', '-j', type=int, help='目录对比与补丁应用的并行任务数')
+    parser.add_argument('--fuzz', type=int, default=0, metavar='N',
+                       help='应用补丁时允许忽略的首尾上下文行数 (默认: 0)')
+    parser.add_argument('--strip', '-p', type=int, metavar='N',
+                       help='应用补丁时去掉路径的前 N 级目录 (默认: 自动识别 git 的 a/ b/ 前缀)')
+    parser.add_argument('--binary', action='store_true',
+                       help='按二进制文件对比 (默认根据文件开头自动识别)')
+    parser.add_argument('--chunking', choices=BINARY_CHUNKING, default='fixed',
+                       help='二进制对比的分块方式: fixed 按位置, cdc 按内容定义边界 (默认: fixed)')
+    parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE,
+                       help=f'二进制对比的块大小，单位字节 (默认: {DEFAULT_BLOCK_SIZE})')
+    parser.add_argument('--diff3', action='store_true',
+                       help='三方合并时在冲突块中同时输出基础版本内容')
     parser.add_argument('--output', '-o', help='输出文件路径')
     
     parser.set_defaults(func=main)
@@ -192,51 +2419,113 @@ def register_parser(subparsers):
 def main(args):
     """diff-tool 工具的主函数"""
     try:
-        if args.files:
-            # 对比文件
-            file1, file2 = args.files
-            
-            if args.format == 'unified':
-                result = compare_files(file1, file2, args.context)
-            elif args.format == 'side-by-side':
-                with open(file1, 'r', encoding='utf-8') as f1:
-                    text1 = f1.read()
-                with open(file2, 'r', encoding='utf-8') as f2:
-                    text2 = f2.read()
-                result = get_side_by_side_diff(text1, text2, args.width)
-            elif args.format == 'stats':
-                with open(file1, 'r', encoding='utf-8') as f1:
-                    text1 = f1.read()
-                with open(file2, 'r', encoding='utf-8') as f2:
-                    text2 = f2.read()
-                stats = analyze_changes(text1, text2)
-                result = [
-                    f"文件1行数: {stats['total_lines_1']}",
-                    f"文件2行数: {stats['total_lines_2']}",
-                    f"新增行数: {stats['additions']}",
-                    f"删除行数: {stats['deletions']}",
-                    f"修改行数: {stats['modifications']}",
-                    f"相似度: {stats['similarity']:.2%}",
-                    f"总变更数: {stats['total_changes']}"
-                ]
-                
-        elif args.text1 and args.text2:
-            # 对比文本
-            if args.format == 'unified':
-                result = compare_texts(args.text1, args.text2, args.context)
-            elif args.format == 'side-by-side':
-                result = get_side_by_side_diff(args.text1, args.text2, args.width)
-            elif args.format == 'stats':
-                stats = analyze_changes(args.text1, args.text2)
-                result = [
-                    f"文本1行数: {stats['total_lines_1']}",
-                    f"文本2行数: {stats['total_lines_2']}",
-                    f"新增行数: {stats['additions']}",
-                    f"删除行数: {stats['deletions']}",
-                    f"修改行数: {stats['modifications']}",
-                    f"相似度: {stats['similarity']:.2%}",
-                    f"总变更数: {stats['total_changes']}"
-                ]
+        if args.dirs:
+            # 对比目录
+            algorithm = 'myers' if args.algorithm == 'difflib' else args.algorithm
+            dir_result = compare_directories(args.dirs[0], args.dirs[1], args.hunks,
+                                             args.context, algorithm, args.jobs)
+            result = format_directory_diff(dir_result)
+        elif args.find_duplicates:
+            # 查找近似重复文件
+            algorithm = 'histogram' if args.algorithm == 'difflib' else args.algorithm
+            clusters = find_near_duplicates(args.find_duplicates, args.threshold,
+                                            algorithm, args.jobs)
+            result = format_duplicates(clusters, args.threshold)
+        elif args.apply:
+            # 应用补丁
+            results = apply_patch(args.apply, fuzz=args.fuzz, strip=args.strip,
+                                  max_workers=args.jobs)
+            report = '\n'.join(format_patch_results(results))
+            if any(result['status'] == 'failed' for result in results):
+                print(report)
+                raise ValueError("部分文件的补丁应用失败")
+            result = report
+        elif args.merge:
+            # 三方合并，结果直接流式写出 (输出文件可以就是 OURS，用作 git 合并驱动)
+            algorithm = 'histogram' if args.algorithm == 'difflib' else args.algorithm
+            base, ours, theirs = args.merge
+            if args.output:
+                with _atomic_output(args.output) as f:
+                    conflicts = merge_files(base, ours, theirs, f, algorithm,
+                                            args.diff3)
+            else:
+                conflicts = merge_files(base, ours, theirs, sys.stdout, algorithm,
+                                        args.diff3)
+            if conflicts:
+                raise ValueError(f"合并存在 {conflicts} 处冲突")
+            if args.output:
+                print(f"合并结果已保存到: {args.output}")
+            return None
+        elif args.files and (args.binary or
+                             any(os.path.exists(path) and is_binary_file(path)
+                                 for path in args.files)):
+            # 对比二进制文件
+            algorithm = 'histogram' if args.algorithm == 'difflib' else args.algorithm
+            binary_result = compare_binary_files(args.files[0], args.files[1],
+                                                 args.chunking, args.block_size,
+                                                 algorithm)
+            result = format_binary_diff(binary_result)
+        elif args.files or (args.text1 and args.text2):
+            options = {
+                'intraline': args.intraline,
+                'intraline_max_length': args.intraline_max_length,
+                'ignore_whitespace': args.ignore_whitespace,
+                'ignore_case': args.ignore_case,
+                'detect_moves': args.detect_moves
+            }
+            if args.files:
+                # 对比文件
+                file1, file2 = args.files
+                if args.stream:
+                    if args.format not in (['unified'], ['side-by-side']):
+                        raise ValueError(
+                            "--stream 仅支持单独使用 unified 或 side-by-side 格式")
+                    if args.ignore_whitespace or args.ignore_case or \
+                            args.detect_moves:
+                        raise ValueError("--stream 不支持 --ignore-whitespace、"
+                                         "--ignore-case 和 --detect-moves")
+                    algorithm = args.algorithm
+                    if algorithm == 'difflib':
+                        algorithm = 'myers'
+                    if args.format == ['unified']:
+                        diff = stream_file_diff(file1, file2, args.context, algorithm,
+                                                args.intraline,
+                                                args.intraline_max_length)
+                    else:
+                        collapse = args.collapse
+                        if collapse is None:
+                            collapse = args.context
+                        diff = (line + '\n' for line in stream_side_by_side(
+                            file1, file2, args.width, collapse, algorithm,
+                            args.intraline, args.intraline_max_length))
+                    if args.output:
+                        with open(args.output, 'w', encoding='utf-8') as f:
+                            write_unified_diff(diff, f)
+                        print(f"差异对比结果已保存到: {args.output}")
+                    else:
+                        write_unified_diff(diff, sys.stdout)
+                    return None
+                diff_result = DiffResult.from_files(file1, file2, args.algorithm,
+                                                    **options)
+                label = '文件'
+            else:
+                # 对比文本
+                diff_result = DiffResult.from_texts(args.text1, args.text2,
+                                                    args.algorithm, **options)
+                label = '文本'
+
+            # 所有视图共用同一个 DiffResult，操作码只计算一次
+            result = []
+            for view in dict.fromkeys(args.format):
+                if result:
+                    result.append('')
+                if view == 'stats' and args.approx:
+                    stats = approximate_stats(''.join(diff_result.lines1),
+                                              ''.join(diff_result.lines2), args.error)
+                    result.extend(_format_approximate_stats(stats, label))
+                else:
+                    result.extend(diff_result.render(view, args.context, args.width,
+                                                     label, args.collapse))
         else:
             raise ValueError("使用 --files 对比文件，或使用 --text1 和 --text2 对比文本")
         
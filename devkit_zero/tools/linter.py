@@ -5,8 +5,16 @@
 
 import argparse
 import ast
+import multiprocessing
 import os
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, Optional
+
+
+# 资源保护阈值：超过大小上限的文件直接跳过，超过内联上限的文件在子进程中解析
+DEFAULT_MAX_FILE_SIZE = 2 * 1024 * 1024
+DEFAULT_PARSE_TIMEOUT = 10.0
+INLINE_PARSE_LIMIT = 256 * 1024
 
 
 class CodeLinter:
@@ -146,10 +154,161 @@ class CodeLinter:
                 })
 
 
-def lint_file(file_path: str) -> List[Dict[str, Any]]:
-    """检查文件"""
-    linter = CodeLinter()
-    return linter.check_python_file(file_path)
+def _lint_worker(code: str, filename: str) -> List[Dict[str, Any]]:
+    """子进程中执行的检查函数（需位于模块顶层以便序列化）"""
+    return CodeLinter().check_python_code(code, filename)
+
+
+def _guard_issue(message: str) -> Dict[str, Any]:
+    """构造资源保护触发时的诊断信息"""
+    return {
+        'type': 'resource_guard',
+        'message': message,
+        'line': None,
+        'column': None,
+        'severity': 'warning'
+    }
+
+
+class GuardedLinter:
+    """
+    带资源保护的文件检查器
+
+    - 超过 max_file_size 的文件不读取，直接跳过并给出诊断
+    - 超过 inline_limit 的文件在子进程中解析，超过 parse_timeout 即终止
+    - AST 嵌套过深导致的 RecursionError 同样以诊断方式跳过
+    - 不是 UTF-8 编码的文件跳过并给出诊断
+
+    子进程池在多个文件之间复用，超时后会被终止并在下次需要时重建，
+    因此目录扫描不会被单个异常文件卡住。
+    """
+
+    def __init__(self, max_file_size: Optional[int] = DEFAULT_MAX_FILE_SIZE,
+                 parse_timeout: Optional[float] = DEFAULT_PARSE_TIMEOUT,
+                 inline_limit: int = INLINE_PARSE_LIMIT):
+        self.max_file_size = max_file_size
+        self.parse_timeout = parse_timeout
+        self.inline_limit = inline_limit
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """关闭子进程池"""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(processes=1)
+        return self._pool
+
+    def lint_file(self, file_path: str) -> Dict[str, Any]:
+        """
+        检查单个文件
+
+        Returns:
+            检查记录，包含 file、size、status ('ok' 或 'skipped')、
+            guard (触发的保护类型，未触发为 None)、elapsed (秒) 和 issues
+        """
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"文件不存在: {file_path}")
+
+        start = time.perf_counter()
+        size = os.path.getsize(file_path)
+        record = {
+            'file': file_path,
+            'size': size,
+            'status': 'ok',
+            'guard': None,
+            'elapsed': 0.0,
+            'issues': []
+        }
+
+        if self.max_file_size is not None and size > self.max_file_size:
+            record['status'] = 'skipped'
+            record['guard'] = 'size'
+            record['issues'] = [_guard_issue(
+                f"文件过大 ({size / 1024:.1f} KB > "
+                f"{self.max_file_size / 1024:.1f} KB)，已跳过检查"
+            )]
+            record['elapsed'] = time.perf_counter() - start
+            return record
+
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except UnicodeDecodeError:
+            record['status'] = 'skipped'
+            record['guard'] = 'encoding'
+            record['issues'] = [_guard_issue("无法以 UTF-8 读取，已跳过检查")]
+            record['elapsed'] = time.perf_counter() - start
+            return record
+
+        try:
+            if self.parse_timeout is None or size <= self.inline_limit:
+                record['issues'] = _lint_worker(content, file_path)
+            else:
+                pending = self._get_pool().apply_async(_lint_worker,
+                                                       (content, file_path))
+                record['issues'] = pending.get(self.parse_timeout)
+        except multiprocessing.TimeoutError:
+            # 终止卡住的子进程，下一个文件会使用新的进程池
+            self.close()
+            record['status'] = 'skipped'
+            record['guard'] = 'timeout'
+            record['issues'] = [_guard_issue(
+                f"解析超时 (> {self.parse_timeout:g} 秒)，已跳过检查"
+            )]
+        except (RecursionError, MemoryError) as e:
+            record['status'] = 'skipped'
+            record['guard'] = 'recursion' if isinstance(e, RecursionError) else 'memory'
+            record['issues'] = [_guard_issue(
+                f"代码结构过于复杂，无法完成解析 ({type(e).__name__})，已跳过检查"
+            )]
+
+        record['elapsed'] = time.perf_counter() - start
+        return record
+
+    def lint_directory(self, directory: str,
+                       recursive: bool = True) -> List[Dict[str, Any]]:
+        """检查目录下的所有 Python 文件"""
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"目录不存在: {directory}")
+
+        records = []
+        for root, dirs, files in os.walk(directory):
+            dirs[:] = sorted(d for d in dirs
+                             if not d.startswith('.') and d != '__pycache__')
+            for name in sorted(files):
+                if name.endswith('.py'):
+                    records.append(self.lint_file(os.path.join(root, name)))
+            if not recursive:
+                break
+        return records
+
+
+def lint_file(file_path: str, max_file_size: Optional[int] = DEFAULT_MAX_FILE_SIZE,
+              parse_timeout: Optional[float] = DEFAULT_PARSE_TIMEOUT
+              ) -> List[Dict[str, Any]]:
+    """检查文件（超大文件或解析超时会以 resource_guard 诊断代替检查结果）"""
+    with GuardedLinter(max_file_size, parse_timeout) as linter:
+        return linter.lint_file(file_path)['issues']
+
+
+def lint_directory(directory: str, recursive: bool = True,
+                   max_file_size: Optional[int] = DEFAULT_MAX_FILE_SIZE,
+                   parse_timeout: Optional[float] = DEFAULT_PARSE_TIMEOUT
+                   ) -> List[Dict[str, Any]]:
+    """检查目录，返回每个文件的检查记录"""
+    with GuardedLinter(max_file_size, parse_timeout) as linter:
+        return linter.lint_directory(directory, recursive)
 
 
 def lint_code(code: str, filename: str = "<string>") -> List[Dict[str, Any]]:
@@ -179,25 +338,65 @@ def format_issues(issues: List[Dict[str, Any]]) -> str:
     return '\n'.join(result)
 
 
+def format_directory_report(records: List[Dict[str, Any]]) -> str:
+    """格式化目录检查结果，并列出触发资源保护的文件及耗时"""
+    if not records:
+        return "❌ 未找到 Python 文件"
+
+    result = []
+    for record in records:
+        if record['status'] == 'ok' and record['issues']:
+            result.append(f"📄 {record['file']}")
+            result.append(format_issues(record['issues']))
+            result.append("")
+
+    guarded = [record for record in records if record['guard']]
+    total_issues = sum(len(record['issues']) for record in records
+                       if record['status'] == 'ok')
+    result.append(f"📊 共检查 {len(records)} 个文件, 发现 {total_issues} 个问题, "
+                  f"{len(guarded)} 个文件触发资源保护")
+
+    for record in guarded:
+        result.append(f"⏱️ {record['file']} [{record['guard']}] "
+                      f"{record['size'] / 1024:.1f} KB, 耗时 {record['elapsed']:.2f} 秒: "
+                      f"{record['issues'][0]['message']}")
+
+    return '\n'.join(result)
+
+
 def register_parser(subparsers):
     """注册 linter 命令的参数解析器"""
     parser = subparsers.add_parser('lint', help='代码静态检查工具')
     parser.add_argument('--file', '-f', help='要检查的文件路径')
     parser.add_argument('--code', '-c', help='要检查的代码')
+    parser.add_argument('--dir', '-d', help='要检查的目录 (递归扫描 .py 文件)')
     parser.add_argument('--format', choices=['detailed', 'summary'], default='detailed',
                        help='输出格式')
+    parser.add_argument('--max-size', type=int, default=DEFAULT_MAX_FILE_SIZE // 1024,
+                       help=f'单个文件大小上限 KB，超过则跳过 (默认: {DEFAULT_MAX_FILE_SIZE // 1024})')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_PARSE_TIMEOUT,
+                       help=f'单个文件解析超时秒数 (默认: {DEFAULT_PARSE_TIMEOUT:g})')
     parser.set_defaults(func=main)
 
 
 def main(args):
     """linter 工具的主函数"""
     try:
-        if args.file:
-            issues = lint_file(args.file)
+        max_file_size = args.max_size * 1024 if args.max_size > 0 else None
+        parse_timeout = args.timeout if args.timeout > 0 else None
+
+        if args.dir:
+            records = lint_directory(args.dir, max_file_size=max_file_size,
+                                     parse_timeout=parse_timeout)
+            if args.format != 'summary':
+                return format_directory_report(records)
+            issues = [issue for record in records for issue in record['issues']]
+        elif args.file:
+            issues = lint_file(args.file, max_file_size, parse_timeout)
         elif args.code:
             issues = lint_code(args.code)
         else:
-            raise ValueError("请提供要检查的文件 (--file) 或代码 (--code)")
+            raise ValueError("请提供要检查的文件 (--file)、目录 (--dir) 或代码 (--code)")
         
         if args.format == 'summary':
             error_count = sum(1 for issue in issues if issue['severity'] == 'error')
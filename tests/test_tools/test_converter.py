@@ -0,0 +1,815 @@
+"""
+测试数据格式转换工具
+"""
+
+import argparse
+import contextlib
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+from devkit_zero.tools import converter
+
+
+def make_args(**kwargs):
+    """构造与命令行解析结果相同的参数对象"""
+    parser = argparse.ArgumentParser()
+    converter.register_parser(parser.add_subparsers())
+    defaults = parser.parse_args(['convert', '-i', '', '--from', 'csv', '--to', 'json'])
+    for key, value in kwargs.items():
+        setattr(defaults, key, value)
+    return defaults
+
+
+class TestJsonStreaming(unittest.TestCase):
+    """JSON 增量读取与转换测试类"""
+
+    def setUp(self):
+        """测试准备"""
+        self.rows = [{"id": i, "name": f"名字{i}", "note": "a,\"b\"\nc",
+                      "nested": [i, {"x": None}]}
+                     for i in range(50)]
+        self.rows[40]["late"] = True
+
+    def test_iter_json_array_small_reads(self):
+        """测试元素跨越读入边界时仍能正确解析"""
+        text = json.dumps(self.rows, ensure_ascii=False, indent=2)
+        for read_size in (1, 7, 4096):
+            items = list(converter.iter_json_array(io.StringIO(text), read_size))
+            self.assertEqual(items, self.rows)
+        self.assertEqual(list(converter.iter_json_array(io.StringIO("[1, 23456]"), 2)),
+                         [1, 23456])
+        numbers = [1.25, -3e-07, 4.5e+20, 0.5, 10]
+        text = json.dumps(numbers, separators=(',', ':'))
+        for read_size in (1, 2, 3):
+            values = converter.iter_json_array(io.StringIO(text), read_size)
+            self.assertEqual(list(values), numbers)
+
+    def test_invalid_arrays(self):
+        """测试格式错误的输入"""
+        for text in ('{"a": 1}', '[1, 2', '[1 2]', '', '[1,]', '[1]x', '[1] ]'):
+            with self.assertRaises(ValueError):
+                list(converter.iter_json_array(io.StringIO(text)))
+
+    def test_schema_strategies(self):
+        """测试不同的表头策略"""
+        text = json.dumps(self.rows, ensure_ascii=False)
+
+        def convert(**kwargs):
+            output = io.StringIO()
+            count = converter.stream_json_to_csv(io.StringIO(text), output, **kwargs)
+            self.assertEqual(count, 50)
+            return list(csv.reader(io.StringIO(output.getvalue())))
+
+        self.assertEqual(convert(schema='sample', sample_size=10)[0],
+                         ['id', 'name', 'nested', 'note'])
+        self.assertEqual(convert(schema='two-pass')[0],
+                         ['id', 'late', 'name', 'nested', 'note'])
+        table = convert(schema='header', header=['note', 'id'])
+        self.assertEqual(table[1], ['a,"b"\nc', '0'])
+        with self.assertRaises(ValueError):
+            convert(schema='header')
+
+    def test_json_to_csv_compatible(self):
+        """测试 json_to_csv 保持原有输出"""
+        result = converter.json_to_csv('[{"b": 1, "a": 2}, {"c": 3}]')
+        self.assertEqual(result, "a,b,c\r\n2,1,\r\n,,3\r\n")
+        self.assertEqual(converter.json_to_csv('[]'), "")
+        with self.assertRaises(ValueError):
+            converter.json_to_csv('[1, 2]')
+
+
+class TestStreamingFormats(unittest.TestCase):
+    """流式读写与 NDJSON 测试类"""
+
+    def setUp(self):
+        """测试准备"""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """测试清理"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_write_json_array_matches_dumps(self):
+        """测试逐行写出的 JSON 数组与 json.dumps 相同"""
+        for rows in ([], [{"a": "1", "b": {"c": [1, 2]}}], [{"x": "中"}, {"y": None}]):
+            output = io.StringIO()
+            self.assertEqual(converter.write_json_array(rows, output), len(rows))
+            self.assertEqual(output.getvalue(),
+                             json.dumps(rows, ensure_ascii=False, indent=2) + "\n")
+
+    def test_ndjson_roundtrip(self):
+        """测试 CSV -> NDJSON -> JSON"""
+        ndjson = io.StringIO()
+        count = converter.convert_stream(io.StringIO("a,b\n1,\"x\ny\"\n3,4\n"), ndjson,
+                                         'csv', 'ndjson')
+        self.assertEqual(count, 2)
+        self.assertEqual(ndjson.getvalue().splitlines()[0], '{"a": "1", "b": "x\\ny"}')
+        output = io.StringIO()
+        converter.convert_stream(io.StringIO(ndjson.getvalue() + "\n"), output,
+                                 'ndjson', 'json')
+        self.assertEqual(json.loads(output.getvalue())[1], {"a": "3", "b": "4"})
+        with self.assertRaises(ValueError):
+            list(converter.iter_ndjson(io.StringIO('{"a": 1}\n{oops}\n')))
+
+    def test_main_streams_to_file(self):
+        """测试命令行从文件转换到文件"""
+        source = os.path.join(self.temp_dir, 'in.csv')
+        target = os.path.join(self.temp_dir, 'out.ndjson')
+        with open(source, 'w', encoding='utf-8') as f:
+            f.write("name,age\n张三,25\n李四,30\n")
+        message = converter.main(make_args(input=source, from_format='csv',
+                                           to_format='ndjson', output=target))
+        self.assertIn('2 行', message)
+        with open(target, encoding='utf-8') as f:
+            self.assertEqual([json.loads(line)['name'] for line in f], ['张三', '李四'])
+
+    def test_main_json_to_csv_keeps_late_keys(self):
+        """测试命令行默认收集全部字段，不丢弃采样范围之后才出现的键"""
+        rows = [{"a": i} for i in range(5)] + [{"a": 5, "late": "x"}]
+        target = os.path.join(self.temp_dir, 'out.csv')
+        converter.main(make_args(input=json.dumps(rows), from_format='json',
+                                 to_format='csv', output=target, sample_size=2))
+        with open(target, newline='', encoding='utf-8') as f:
+            result = list(csv.DictReader(f))
+        self.assertEqual(result[-1], {"a": "5", "late": "x"})
+
+    def test_csv_to_csv_keeps_header_order(self):
+        """测试 CSV -> CSV 保持源文件的列顺序，超出表头的多余字段被丢弃"""
+        text = "b,a\n1,2,extra\n3,4\n"
+        for options in ({}, {'schema': 'two-pass'}, {'where': 'a'},
+                        {'infer_types': True}):
+            output = io.StringIO()
+            converter.convert_stream(io.StringIO(text), output, 'csv', 'csv', **options)
+            self.assertEqual(output.getvalue(), "b,a\r\n1,2\r\n3,4\r\n")
+
+    def test_schema_ignores_csv_extra_fields(self):
+        """测试多余字段 (键为 None) 不参与表头排序"""
+        for strategy in ('sample', 'two-pass'):
+            rows = csv.DictReader(io.StringIO("b,a\n1,2,extra\n"))
+            fieldnames, rows = converter.resolve_schema(rows, strategy)
+            self.assertEqual(fieldnames, ['a', 'b'])
+            self.assertEqual(len(list(rows)), 1)
+
+    def test_csv_to_json_compatible(self):
+        """测试 csv_to_json 保持原有输出"""
+        self.assertEqual(converter.csv_to_json("a,b\n1,2\n"),
+                         json.dumps([{"a": "1", "b": "2"}], indent=2))
+
+
+class TestParallelCsv(unittest.TestCase):
+    """CSV 分块并行解析测试类"""
+
+    def setUp(self):
+        """测试准备"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'data.csv')
+        with open(self.path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['id', '备注', 'n'])
+            for i in range(2000):
+                writer.writerow([i, f'多行\n"{i}",\n' if i % 3 == 0 else f'v{i}', i * 2])
+            f.write('short\n1,2,3,extra\n')
+
+    def tearDown(self):
+        """测试清理"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_chunks_align_to_records(self):
+        """测试切分点不会落在带引号的换行中"""
+        header_end, ranges = converter.csv_chunk_ranges(self.path, chunk_size=97)
+        self.assertGreater(len(ranges), 10)
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        self.assertEqual(data[:header_end], 'id,备注,n\r\n'.encode('utf-8'))
+        self.assertEqual(ranges[0][0], header_end)
+        self.assertEqual(ranges[-1][1], len(data))
+        for start, end in ranges:
+            self.assertEqual(data[start:end].count(b'"') % 2, 0)
+
+    def test_parallel_matches_sequential(self):
+        """测试并行转换与顺序转换输出一致"""
+        with open(self.path, newline='', encoding='utf-8') as f:
+            rows = converter.iter_csv_parallel(self.path, 2, chunk_size=500)
+            self.assertEqual(list(rows), list(csv.DictReader(f)))
+        for fmt in converter.FORMATS:
+            expected = io.StringIO()
+            with open(self.path, newline='', encoding='utf-8') as f:
+                converter.convert_stream(f, expected, 'csv', fmt)
+            output = io.StringIO()
+            count = converter.convert_csv_parallel(self.path, output, fmt, 2,
+                                                   chunk_size=500)
+            self.assertEqual(count, 2002)
+            self.assertEqual(output.getvalue(), expected.getvalue())
+
+    def test_main_jobs_respects_header(self):
+        """测试命令行 --jobs 与 --header 同时使用时输出与串行相同"""
+        outputs = []
+        for jobs in (None, 2):
+            target = os.path.join(self.temp_dir, f'out{jobs}.csv')
+            converter.main(make_args(input=self.path, output=target, to_format='csv',
+                                     header='n,id', jobs=jobs))
+            with open(target, encoding='utf-8') as f:
+                outputs.append(f.read())
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertTrue(outputs[0].startswith('n,id\n'))
+
+    def test_unordered_output(self):
+        """测试按完成顺序输出时行集合不变"""
+        output = io.StringIO()
+        converter.convert_csv_parallel(self.path, output, 'ndjson', 2, chunk_size=500,
+                                       ordered=False)
+        ids = sorted(json.loads(line)['id'] for line in output.getvalue().splitlines())
+        self.assertEqual(ids, sorted([str(i) for i in range(2000)] + ['short', '1']))
+
+
+class TestTable(unittest.TestCase):
+    """列式表格测试类"""
+
+    def test_csv_table_matches_dict_reader(self):
+        """测试列式读取与 csv.DictReader 的行一致"""
+        text = "a,b,c\n1,x,y\n2\n\n3,z,w,extra,more\n4,x,y\n"
+        tables = list(converter.iter_tables(io.StringIO(text), 'csv', batch_size=2))
+        self.assertEqual(len(tables), 3)
+        rows = [row for table in tables for row in table.iter_rows()]
+        self.assertEqual(rows, list(csv.DictReader(io.StringIO(text))))
+        self.assertIs(tables[0].column('b')[0], tables[2].column('b')[0])
+
+    def test_from_rows_and_extend(self):
+        """测试从字典行构造并追加"""
+        table = converter.Table.from_rows([{"a": 1}, {"b": 2, "a": 3}])
+        self.assertEqual(table.fieldnames, ['a', 'b'])
+        self.assertEqual(table.columns, [[1, 3], [None, 2]])
+        table.extend(converter.Table(['c'], [[5]]))
+        self.assertEqual(len(table), 3)
+        self.assertEqual(list(table.iter_tuples())[2], (None, None, 5))
+        with self.assertRaises(ValueError):
+            converter.Table.from_rows([1])
+
+    def test_select_and_typed_columns(self):
+        """测试投影与紧凑数值列"""
+        table = converter.read_table(io.StringIO("x,y\n1,a\n2,b\n"), 'csv')
+        projected = table.select(['y'])
+        self.assertIs(projected.column('y'), table.column('y'))
+        with self.assertRaises(KeyError):
+            table.select(['z'])
+        table.set_column('x', [int(value) for value in table.column('x')])
+        table.to_array('x', 'q')
+        self.assertEqual(table.column('x').typecode, 'q')
+        with self.assertRaises(ValueError):
+            table.to_array('y', 'd')
+        output = io.StringIO()
+        self.assertEqual(converter.write_table(table, output, 'csv'), 2)
+        self.assertEqual(output.getvalue(), "x,y\r\n1,a\r\n2,b\r\n")
+        output = io.StringIO()
+        converter.write_table(table, output, 'ndjson')
+        self.assertEqual(output.getvalue().splitlines()[1], '{"x": 2, "y": "b"}')
+
+
+class TestTypeInference(unittest.TestCase):
+    """列类型推断测试类"""
+
+    def test_classify_values(self):
+        """测试一组取值的类型判断"""
+        self.assertEqual(converter.classify_values(['1', '-2', '', 'null']), 'int')
+        self.assertEqual(converter.classify_values(['1', '2.5', '1e3']), 'float')
+        self.assertEqual(converter.classify_values(['true', 'False']), 'bool')
+        self.assertEqual(converter.classify_values(['2024-02-29', '2023-01-01']),
+                         'date')
+        self.assertEqual(converter.classify_values(['2023-02-30']), 'string')
+        self.assertEqual(converter.classify_values(['007', '1']), 'string')
+        self.assertEqual(converter.classify_values(['1\n2']), 'string')
+        self.assertEqual(converter.classify_values(['', None]), 'null')
+        self.assertEqual(converter.classify_values(['1', '2'], guess='float'), 'float')
+
+    def test_csv_to_json_infer_types(self):
+        """测试推断类型后输出数字、布尔值和 null"""
+        text = "id,price,ok,day,code\n1,2.5,true,2024-01-31,007\n2,,false,,010\n"
+        rows = json.loads(converter.csv_to_json(text, infer_types=True))
+        self.assertEqual(rows[0], {"id": 1, "price": 2.5, "ok": True,
+                                   "day": "2024-01-31", "code": "007"})
+        self.assertEqual(rows[1]["price"], None)
+        self.assertEqual(rows[1]["day"], None)
+        self.assertEqual(json.loads(converter.csv_to_json(text))[0]["id"], "1")
+        with self.assertRaises(ValueError):
+            converter.convert_stream(io.StringIO('[]'), io.StringIO(), 'json', 'csv',
+                                     infer_types=True)
+
+    def test_types_widen_across_batches(self):
+        """测试后续批次验证失败时类型被放宽"""
+        text = "a,b\n" + "1,x\n" * 5 + "1.5,y\n"
+        tables = converter.iter_tables(io.StringIO(text), 'csv', batch_size=3)
+        typed = list(converter.iter_typed_tables(tables, sample_size=2))
+        self.assertEqual(typed[0].column('a').typecode, 'q')
+        self.assertEqual(list(typed[1].column('a')), [1.0, 1.0, 1.5])
+
+    def test_late_widening_applies_to_all_rows(self):
+        """测试类型在后面的批次放宽时，已经读过的行也按最终类型输出"""
+        text = "v\n" + "".join(f"{i}\n" for i in range(70000)) + "x\n"
+
+        class Unseekable(io.StringIO):
+            def seekable(self):
+                return False
+
+        for source in (io.StringIO(text), Unseekable(text)):
+            output = io.StringIO()
+            converter.convert_stream(source, output, 'csv', 'ndjson', infer_types=True)
+            lines = output.getvalue().splitlines()
+            self.assertEqual((lines[0], lines[-1]), ('{"v": "0"}', '{"v": "x"}'))
+
+    def test_parallel_infer_types(self):
+        """测试并行转换时的类型推断"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(temp_dir, 'data.csv')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write("n,flag\n" + "".join(f"{i},true\n" for i in range(500)))
+            output = io.StringIO()
+            converter.convert_csv_parallel(path, output, 'ndjson', 2, chunk_size=256,
+                                           infer_types=True)
+            self.assertEqual(output.getvalue().splitlines()[499],
+                             '{"n": 499, "flag": true}')
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write("1.5,true\n")
+            output = io.StringIO()
+            converter.convert_csv_parallel(path, output, 'ndjson', 2, chunk_size=256,
+                                           infer_types=True)
+            self.assertEqual(output.getvalue().splitlines()[0],
+                             '{"n": 0.0, "flag": true}')
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+class TestSelectWhere(unittest.TestCase):
+    """投影与过滤测试类"""
+
+    def setUp(self):
+        """测试准备"""
+        self.text = "id,name,age,city\n1,a,20,北京\n2,b,17,上海\n3,c,,广州\n4,d,30,上海\n"
+
+    def convert(self, to_format='ndjson', **options):
+        output = io.StringIO()
+        converter.convert_stream(io.StringIO(self.text), output, 'csv', to_format,
+                                 **options)
+        return output.getvalue()
+
+    def ids(self, where):
+        lines = self.convert(where=where).splitlines()
+        return [json.loads(line)['id'] for line in lines]
+
+    def test_predicates(self):
+        """测试过滤表达式的语义"""
+        self.assertEqual(self.ids("age >= 18"), ['1', '4'])
+        self.assertEqual(self.ids("age >= 18 and city in ['上海', '广州']"), ['4'])
+        self.assertEqual(self.ids("not age"), ['3'])
+        self.assertEqual(self.ids("city == '上海' or id == 1"), ['1', '2', '4'])
+        self.assertEqual(self.ids("10 < age < 25"), ['1', '2'])
+        self.assertEqual(self.ids("col('name') != 'a' and city != None"),
+                         ['2', '3', '4'])
+
+    def test_unknown_where_column_rejected(self):
+        """测试过滤表达式中拼错的列名报错，而不是按空值处理后静默输出空结果"""
+        for select in (None, ['id']):
+            with self.assertRaises(ValueError):
+                self.convert(select=select, where="agee >= 18")
+        rows = '[{"id": 1}, {"id": 2, "age": 30}]'
+        output = io.StringIO()
+        converter.convert_stream(io.StringIO(rows), output, 'json', 'ndjson',
+                                 where="age > 18")
+        self.assertEqual(output.getvalue(), '{"id": 2, "age": 30}\n')
+        for select in (None, ['id']):
+            with self.assertRaises(ValueError):
+                converter.convert_stream(io.StringIO(rows), io.StringIO(), 'json',
+                                         'ndjson', select=select, where="agee > 18")
+
+    def test_unsafe_expressions_rejected(self):
+        """测试表达式只允许安全的子集"""
+        for expression in ("__import__('os')", "a.b", "a + 1 > 2", "x ==",
+                           "(lambda: 1)()"):
+            with self.assertRaises(ValueError):
+                converter.compile_predicate(expression)
+        columns, predicate = converter.compile_predicate("b > 1 and a == 'x'")
+        self.assertEqual(columns, ['b', 'a'])
+        self.assertTrue(predicate(('2', 'x')))
+
+    def test_select_order_and_pruning(self):
+        """测试投影按指定顺序输出，且只读取需要的列"""
+        self.assertEqual(self.convert('csv', select=['city', 'id'], where='age > 18'),
+                         "city,id\r\n北京,1\r\n上海,4\r\n")
+        tables = converter.iter_tables(io.StringIO(self.text), 'csv', columns=['age'])
+        table = next(tables)
+        self.assertEqual(table.fieldnames, ['age'])
+        with self.assertRaises(ValueError):
+            self.convert(select=['nope'])
+
+    def test_main_select_where(self):
+        """测试命令行选项"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            source = os.path.join(temp_dir, 'in.csv')
+            target = os.path.join(temp_dir, 'out.json')
+            with open(source, 'w', encoding='utf-8') as f:
+                f.write(self.text)
+            for jobs in (None, 2):
+                args = make_args(input=source, output=target, jobs=jobs,
+                                 select='name,age', where='age < 18', infer_types=True)
+                message = converter.main(args)
+                self.assertIn('1 行', message)
+                with open(target, encoding='utf-8') as f:
+                    self.assertEqual(json.load(f), [{"name": "b", "age": 17}])
+                with self.assertRaises(RuntimeError):
+                    converter.main(make_args(input=source, output=target, jobs=jobs,
+                                             where='agee < 18'))
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+class TestFlatten(unittest.TestCase):
+    """嵌套 JSON 展开测试类"""
+
+    def setUp(self):
+        """测试准备"""
+        self.data = json.dumps([
+            {"id": 1, "user": {"name": "a", "geo": {"lat": 1.5}}, "tags": ["x", "y"],
+             "items": [{"sku": "s1"}, {"sku": "s2"}]},
+            {"id": 2, "user": {"name": "b"}, "tags": [], "items": []},
+        ])
+
+    def table(self, **kwargs):
+        text = converter.json_to_csv(self.data, flatten=True, **kwargs)
+        return list(csv.reader(io.StringIO(text)))
+
+    def test_join_arrays(self):
+        """测试展开对象并连接数组元素"""
+        table = self.table()
+        self.assertEqual(table[0],
+                         ['id', 'items', 'tags', 'user.geo.lat', 'user.name'])
+        self.assertEqual(table[1],
+                         ['1', '{"sku": "s1"};{"sku": "s2"}', 'x;y', '1.5', 'a'])
+        self.assertEqual(table[2], ['2', '', '', '', 'b'])
+        self.assertEqual(self.table(arrays='json')[1][2], '["x", "y"]')
+
+    def test_explode_arrays(self):
+        """测试数组元素展开为多行"""
+        table = self.table(arrays='explode')
+        self.assertEqual(table[0],
+                         ['id', 'items.sku', 'tags', 'user.geo.lat', 'user.name'])
+        self.assertEqual([row[1:3] for row in table[1:5]],
+                         [['s1', 'x'], ['s2', 'x'], ['s1', 'y'], ['s2', 'y']])
+        self.assertEqual(table[5][:3], ['2', '', ''])
+        header = self.table(arrays='explode', schema='header',
+                            header=['user.name', 'items.sku'])
+        self.assertEqual(header[1:], [['a', 's1'], ['a', 's2'], ['b', '']])
+
+    def test_schema_discovered_once(self):
+        """测试 sample 策略只按样本发现路径，访问函数处理形状不同的行"""
+        flattener = converter.Flattener(separator='/')
+        output = io.StringIO()
+        rows = [{"a": {"b": 1}}, {"a": 5}, {"a": {"b": 2, "c": 3}}]
+        count = converter.write_flat_csv(rows, output, flattener, sample_size=1)
+        self.assertEqual(count, 3)
+        self.assertEqual(output.getvalue(), 'a/b\r\n1\r\n""\r\n2\r\n')
+        with self.assertRaises(ValueError):
+            converter.convert_stream(io.StringIO('[]'), io.StringIO(), 'json', 'ndjson',
+                                     flatten=flattener)
+
+
+class TestCompression(unittest.TestCase):
+    """压缩输入输出测试类"""
+
+    def setUp(self):
+        """测试准备"""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """测试清理"""
+        shutil.rmtree(self.temp_dir)
+
+    def path(self, name):
+        return os.path.join(self.temp_dir, name)
+
+    def test_roundtrip_all_formats(self):
+        """测试各压缩格式按扩展名读写"""
+        for extension in ('gz', 'bz2', 'xz'):
+            path = self.path(f'data.csv.{extension}')
+            with converter.open_text(path, 'w', level=1) as f:
+                f.write("名字,值\n张三,1\n")
+            self.assertEqual(converter.detect_compression(path, sniff=False),
+                             {'gz': 'gzip'}.get(extension, extension))
+            result = converter.csv_to_json(input_file=path)
+            self.assertEqual(json.loads(result), [{"名字": "张三", "值": "1"}])
+
+    def test_detect_by_magic_bytes(self):
+        """测试没有扩展名时按文件头识别"""
+        path = self.path('export')
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            f.write('[{"a": 1}]')
+        self.assertEqual(converter.detect_compression(path), 'gzip')
+        plain = self.path('plain')
+        with open(plain, 'w', encoding='utf-8') as f:
+            f.write('[]')
+        self.assertIsNone(converter.detect_compression(plain))
+
+    def test_main_compressed_input_and_output(self):
+        """测试命令行读取压缩输入并写出压缩输出"""
+        source = self.path('in.json.bz2')
+        target = self.path('out.ndjson.xz')
+        with converter.open_text(source, 'w') as f:
+            f.write('[{"a": 1}, {"a": 2}]')
+        message = converter.main(make_args(input=source, from_format='json',
+                                           to_format='ndjson', output=target))
+        self.assertIn('2 行', message)
+        with converter.open_text(target) as f:
+            self.assertEqual(f.read(), '{"a": 1}\n{"a": 2}\n')
+        converter.main(make_args(input=source, from_format='json', to_format='csv',
+                                 output=self.path('out.csv'), compression='gzip'))
+        with gzip.open(self.path('out.csv'), 'rb') as f:
+            self.assertEqual(f.read(), b'a\r\n1\r\n2\r\n')
+
+
+class TestSqlite(unittest.TestCase):
+    """导入 SQLite 测试类"""
+
+    def setUp(self):
+        """测试准备"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.database = os.path.join(self.temp_dir, 'out.db')
+
+    def tearDown(self):
+        """测试清理"""
+        shutil.rmtree(self.temp_dir)
+
+    def query(self, sql):
+        connection = sqlite3.connect(self.database)
+        try:
+            return connection.execute(sql).fetchall()
+        finally:
+            connection.close()
+
+    def test_csv_schema_from_inferred_types(self):
+        """测试 CSV 导入时根据推断的类型建表，并在导入后创建索引"""
+        text = "id,price,ok,name\n1,2.5,true,a\n2,,false,b\n"
+        count = converter.convert_to_sqlite(io.StringIO(text), 'csv', self.database,
+                                            'items', indexes=['name'])
+        self.assertEqual(count, 2)
+        schema = dict(self.query("SELECT name, sql FROM sqlite_master"))
+        self.assertEqual(schema['items'],
+                         'CREATE TABLE "items" ("id" INTEGER, "price" REAL, '
+                         '"ok" INTEGER, "name" TEXT)')
+        self.assertIn('idx_items_name', schema)
+        self.assertEqual(self.query("SELECT * FROM items"),
+                         [(1, 2.5, 1, 'a'), (2, None, 0, 'b')])
+
+    def test_json_new_columns_and_if_exists(self):
+        """测试 JSON 中新出现的列与表已存在时的处理"""
+        text = '[{"a": 1, "b": {"c": 2}}, {"a": 2, "z": [1]}]'
+        tables = converter.iter_tables(io.StringIO(text), 'json', batch_size=1)
+        converter.load_sqlite(tables, self.database)
+        self.assertEqual(self.query("SELECT * FROM data"),
+                         [(1, '{"c": 2}', None), (2, None, '[1]')])
+        with self.assertRaises(ValueError):
+            converter.convert_to_sqlite(io.StringIO(text), 'json', self.database)
+        converter.convert_to_sqlite(io.StringIO(text), 'json', self.database,
+                                    if_exists='append')
+        self.assertEqual(self.query("SELECT COUNT(*) FROM data"), [(4,)])
+        converter.convert_to_sqlite(io.StringIO('[{"x": 1}]'), 'json', self.database,
+                                    if_exists='replace')
+        self.assertEqual(self.query("SELECT * FROM data"), [(1,)])
+
+    def test_failed_load_leaves_database_unchanged(self):
+        """测试输入有错误时 replace 不会删除原表、append 不会留下部分数据"""
+        bad = '[{"a": 10}, {"a": 11}, {"a": '
+        with self.assertRaises(ValueError):
+            tables = converter.iter_tables(io.StringIO(bad), 'json', batch_size=1)
+            converter.load_sqlite(tables, self.database)
+        self.assertFalse(os.path.exists(self.database))
+
+        converter.convert_to_sqlite(io.StringIO('[{"a": 1}, {"a": 2}]'), 'json',
+                                    self.database)
+        for if_exists in ('replace', 'append'):
+            tables = converter.iter_tables(io.StringIO(bad), 'json', batch_size=1)
+            with self.assertRaises(ValueError):
+                converter.load_sqlite(tables, self.database, if_exists=if_exists)
+            self.assertEqual(self.query("SELECT a FROM data"), [(1,), (2,)])
+
+    def test_main_requires_output(self):
+        """测试命令行导入 SQLite"""
+        with self.assertRaises(RuntimeError):
+            converter.main(make_args(input="a\n1\n", to_format='sqlite'))
+        message = converter.main(make_args(input="a\n1\n", to_format='sqlite',
+                                           output=self.database, table='t',
+                                           where='a > 0'))
+        self.assertIn('1 行', message)
+        self.assertEqual(self.query("SELECT a FROM t"), [(1,)])
+
+
+class TestExternalSort(unittest.TestCase):
+    """外部排序测试类"""
+
+    def setUp(self):
+        """测试准备"""
+        self.rows = [{"k": (i * 7919) % 101, "v": i} for i in range(1000)]
+        self.expected = sorted(self.rows, key=lambda row: row["k"])
+
+    def test_sorted_runs_merge_stably(self):
+        """测试多个有序段 (含多轮归并) 的结果与内存排序一致且稳定"""
+        for run_rows in (10 ** 6, 100, 7):
+            result = list(converter.external_sort(iter(self.rows), ['k'],
+                                                  run_rows=run_rows))
+            self.assertEqual(result, self.expected)
+        result = list(converter.external_sort(iter(self.rows), ['k'],
+                                              memory_limit=2000))
+        self.assertEqual(result, self.expected)
+
+    def test_unique_keeps_first_row(self):
+        """测试去重保留输入中的第一行"""
+        result = list(converter.external_sort(iter(self.rows), ['k'], unique=True,
+                                              run_rows=50))
+        self.assertEqual(len(result), 101)
+        first = {}
+        for row in self.rows:
+            first.setdefault(row["k"], row)
+        self.assertEqual(result, [first[k] for k in range(101)])
+
+    def test_mixed_types_and_multiple_keys(self):
+        """测试不同类型的值与多个排序列"""
+        rows = [{"a": value, "b": index} for index, value in
+                enumerate(["b", None, 2, "a", 1.5, [1], 2])]
+        result = list(converter.external_sort(rows, ['a', 'b'], run_rows=2))
+        self.assertEqual([row["a"] for row in result], [None, 1.5, 2, 2, "a", "b", [1]])
+
+    def test_convert_with_sort(self):
+        """测试转换时排序 (CSV 需要推断类型才能按数值排序)"""
+        text = "id,name\n10,a\n9,b\n10,c\n"
+        output = io.StringIO()
+        converter.convert_stream(io.StringIO(text), output, 'csv', 'csv',
+                                 infer_types=True, sort_by=['id'], unique=True,
+                                 sort_run_rows=1)
+        self.assertEqual(output.getvalue(), "id,name\r\n9,b\r\n10,a\r\n")
+        with self.assertRaises(ValueError):
+            converter.convert_stream(io.StringIO(text), io.StringIO(), 'csv', 'csv',
+                                     select=['name'], sort_by=['id'])
+        with self.assertRaises(RuntimeError):
+            converter.main(make_args(input=text, unique=True))
+
+
+class TestBatchConvert(unittest.TestCase):
+    """批量转换测试类"""
+
+    def setUp(self):
+        """测试准备"""
+        self.temp_dir = tempfile.mkdtemp()
+        for index in range(3):
+            with open(os.path.join(self.temp_dir, f"part{index}.json"), 'w') as f:
+                json.dump([{"id": index * 10 + i} for i in range(index + 1)], f)
+        with gzip.open(os.path.join(self.temp_dir, "zipped.json.gz"), 'wt') as f:
+            json.dump([{"id": 99}], f)
+        with open(os.path.join(self.temp_dir, "broken.json"), 'w') as f:
+            f.write('[{"id": 1}, {"id": ')
+        with open(os.path.join(self.temp_dir, "notes.txt"), 'w') as f:
+            f.write("ignored")
+
+    def tearDown(self):
+        """测试清理"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_output_path_template(self):
+        """测试输出文件名模板去掉格式与压缩扩展名"""
+        path = os.path.join('in', 'day1', 'a.b.json.gz')
+        self.assertEqual(converter.batch_output_path(path, 'csv'),
+                         os.path.join('in', 'day1', 'a.b.csv'))
+        output = converter.batch_output_path(path, 'ndjson', '{parent}-{stem}.{ext}.gz',
+                                             'out')
+        self.assertEqual(output, os.path.join('out', 'day1-a.b.ndjson.gz'))
+
+    def test_batch_directory_keeps_going_past_failures(self):
+        """测试目录批量转换：坏文件记录失败，其余文件正常输出"""
+        out_dir = os.path.join(self.temp_dir, 'out')
+        args = make_args(input=None, batch=self.temp_dir, from_format='json',
+                         to_format='csv', output_dir=out_dir, jobs=2)
+        printed = io.StringIO()
+        with contextlib.redirect_stdout(printed), self.assertRaises(RuntimeError):
+            converter.main(args)
+        report = printed.getvalue()
+        self.assertIn("4 成功, 1 失败, 7 行", report)
+        self.assertIn("❌ " + os.path.join(self.temp_dir, "broken.json"), report)
+        self.assertEqual(sorted(os.listdir(out_dir)),
+                         ['part0.csv', 'part1.csv', 'part2.csv', 'zipped.csv'])
+        with open(os.path.join(out_dir, 'part2.csv'), newline='') as f:
+            self.assertEqual(f.read().split(), ['id', '20', '21', '22'])
+
+    def test_batch_sqlite_outputs(self):
+        """测试批量导入 SQLite：每个文件各自的数据库，或多个文件追加到同一个数据库"""
+        pattern = os.path.join(self.temp_dir, 'part*.json')
+        args = make_args(input=None, batch=pattern, from_format='json',
+                         to_format='sqlite', jobs=2)
+        self.assertIn("3 成功", converter.main(args))
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, 'part2.db')))
+
+        def count_rows():
+            connection = sqlite3.connect(os.path.join(self.temp_dir, 'all.db'))
+            try:
+                return connection.execute("SELECT COUNT(*) FROM data").fetchone()[0]
+            finally:
+                connection.close()
+
+        # 第一个文件按 --if-exists 建表或替换，其余文件追加，不会互相覆盖
+        args.output_template = 'all.db'
+        for if_exists in ('fail', 'replace', 'replace'):
+            args.if_exists = if_exists
+            self.assertIn("3 成功", converter.main(args))
+            self.assertEqual(count_rows(), 6)
+        # 表已存在时 fail 让第一个文件失败，后面的文件也不会追加进去
+        args.if_exists = 'fail'
+        paths = converter.find_batch_inputs(pattern, 'json')
+        results = converter.convert_batch(args, paths)
+        self.assertEqual([result['status'] for result in results], ['error'] * 3)
+        self.assertEqual(count_rows(), 6)
+
+    def test_batch_glob_and_conflicts(self):
+        """测试 glob 输入，以及输出文件相同时拒绝转换"""
+        pattern = os.path.join(self.temp_dir, 'part*.json')
+        self.assertEqual(len(converter.find_batch_inputs(pattern, 'json')), 3)
+        args = make_args(input=None, batch=pattern, from_format='json',
+                         to_format='ndjson', output_dir=self.temp_dir,
+                         output_template='all.{ext}', jobs=1)
+        with self.assertRaises(RuntimeError):
+            converter.main(args)
+        args.output_template = '{stem}.{ext}'
+        report = converter.main(args)
+        self.assertIn("3 成功, 0 失败, 6 行", report)
+
+
+class TestInputSources(unittest.TestCase):
+    """显式输入源测试类"""
+
+    def setUp(self):
+        """测试准备"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.stdin = sys.stdin
+
+    def tearDown(self):
+        """测试清理"""
+        sys.stdin = self.stdin
+        shutil.rmtree(self.temp_dir)
+
+    def test_data_is_never_treated_as_path(self):
+        """测试 csv_to_json 的数据参数即使与文件同名也按数据处理"""
+        path = os.path.join(self.temp_dir, 'a')
+        with open(path, 'w') as f:
+            f.write("x\n1\n")
+        self.assertEqual(json.loads(converter.csv_to_json(path)), [])
+        self.assertEqual(json.loads(converter.csv_to_json(input_file=path)),
+                         [{"x": "1"}])
+        with self.assertRaises(ValueError):
+            converter.csv_to_json("x\n1\n", input_file=path)
+        json_path = self._write('b.json', '[{"k": 1}]')
+        self.assertEqual(converter.json_to_csv(input_file=json_path), "k\r\n1\r\n")
+
+    def test_input_data_and_input_file(self):
+        """测试 --input-data 和 --input-file"""
+        output = os.path.join(self.temp_dir, 'out.json')
+        converter.main(make_args(input=None, input_data="a\n1\n", output=output))
+        with open(output) as f:
+            self.assertEqual(json.load(f), [{"a": "1"}])
+        source = self._write('in.csv', "a\n2\n")
+        result = converter.main(make_args(input=None, input_file=source, output=output))
+        self.assertIn("(1 行)", result)
+
+    def test_stdin_streams_compressed_input(self):
+        """测试从标准输入读取 (按数据头识别 gzip)，且不会关闭标准输入"""
+        path = os.path.join(self.temp_dir, 'in.csv.gz')
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            f.write("名字\n张三\n")
+        output = os.path.join(self.temp_dir, 'out.ndjson')
+        with open(path) as stdin:
+            sys.stdin = stdin
+            converter.main(make_args(input=None, input_file='-', to_format='ndjson',
+                                     output=output))
+            self.assertFalse(stdin.closed)
+        with open(output, encoding='utf-8') as f:
+            self.assertEqual(json.loads(f.read()), {"名字": "张三"})
+
+    def test_stdin_without_file_descriptor_stays_open(self):
+        """测试标准输入被替换为普通文本流时读取后不会被关闭"""
+        sys.stdin = io.StringIO("a\n1\n")
+        self.assertEqual(json.loads(converter.csv_to_json(input_file='-')),
+                         [{"a": "1"}])
+        self.assertFalse(sys.stdin.closed)
+
+    def _write(self, name, text):
+        """在临时目录中写入文件并返回路径"""
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,677 @@
+"""
+测试文本差异对比工具
+"""
+
+import argparse
+import contextlib
+import difflib
+import io
+import os
+import random
+import shutil
+import stat
+import tempfile
+import unittest
+from devkit_zero.tools import diff_tool
+
+
+def apply_opcodes(lines1, lines2, opcodes):
+    """根据操作码从 lines1 重建 lines2，并校验 equal 块内容"""
+    result = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal':
+            assert lines1[i1:i2] == lines2[j1:j2]
+        result.extend(lines2[j1:j2])
+    return result
+
+
+class TestDiffAlgorithms(unittest.TestCase):
+    """差异算法测试类"""
+
+    def setUp(self):
+        """测试准备"""
+        rng = random.Random(42)
+        self.cases = []
+        for _ in range(200):
+            lines1 = [rng.choice('abcde') for _ in range(rng.randint(0, 30))]
+            lines2 = [rng.choice('abcde') for _ in range(rng.randint(0, 30))]
+            self.cases.append((lines1, lines2))
+
+    def test_opcodes_reconstruct_target(self):
+        """测试所有算法的操作码都能重建目标文本"""
+        for algorithm in diff_tool.DIFF_ALGORITHMS:
+            for lines1, lines2 in self.cases:
+                opcodes = diff_tool.get_opcodes(lines1, lines2, algorithm)
+                self.assertEqual(apply_opcodes(lines1, lines2, opcodes), lines2)
+
+    def test_myers_is_minimal(self):
+        """测试 Myers 算法匹配的行数不少于 difflib"""
+        for lines1, lines2 in self.cases:
+            myers = diff_tool.get_opcodes(lines1, lines2, 'myers')
+            reference = difflib.SequenceMatcher(None, lines1, lines2, autojunk=False)
+            matched = sum(i2 - i1 for tag, i1, i2, _, _ in myers if tag == 'equal')
+            blocks = reference.get_matching_blocks()
+            reference_matched = sum(block.size for block in blocks)
+            self.assertGreaterEqual(matched, reference_matched)
+
+    def test_unified_output_matches_difflib(self):
+        """测试基于操作码的统一格式输出与 difflib 一致"""
+        text1 = "a\nb\nc\nd\ne\nf\ng\nh\ni\n"
+        text2 = "a\nb\nX\nd\ne\nf\ng\nh\ni\nj\n"
+        expected = diff_tool.compare_texts(text1, text2, algorithm='difflib')
+        for algorithm in ('myers', 'histogram'):
+            self.assertEqual(diff_tool.compare_texts(text1, text2, algorithm=algorithm),
+                             expected)
+
+    def test_identical_texts(self):
+        """测试相同文本没有差异"""
+        for algorithm in diff_tool.DIFF_ALGORITHMS:
+            self.assertEqual(
+                diff_tool.compare_texts("same\n", "same\n", algorithm=algorithm), [])
+
+    def test_analyze_changes_with_algorithm(self):
+        """测试变化统计支持选择算法"""
+        stats = diff_tool.analyze_changes("a\nb\nc", "a\nx\nc\nd",
+                                          algorithm='histogram')
+        self.assertEqual(stats['modifications'], 1)
+        self.assertEqual(stats['additions'], 1)
+        self.assertAlmostEqual(stats['similarity'], 4 / 7)
+
+    def test_unknown_algorithm(self):
+        """测试不支持的算法"""
+        with self.assertRaises(ValueError):
+            diff_tool.get_opcodes(['a'], ['b'], 'unknown')
+
+
+class TestDiffResult(unittest.TestCase):
+    """DiffResult 多视图测试类"""
+
+    def test_opcodes_computed_once(self):
+        """测试多个视图共用一次差异计算"""
+        result = diff_tool.DiffResult.from_texts("a\nb\nc\n", "a\nx\nc\nd\n", 'myers')
+        calls = []
+        original = diff_tool.get_opcodes
+
+        def counting_get_opcodes(*args, **kwargs):
+            calls.append(args)
+            return original(*args, **kwargs)
+
+        diff_tool.get_opcodes = counting_get_opcodes
+        try:
+            result.render('unified')
+            result.render('side-by-side')
+            result.render('stats')
+        finally:
+            diff_tool.get_opcodes = original
+        self.assertEqual(len(calls), 1)
+
+    def test_views_match_legacy_functions(self):
+        """测试视图输出与原有函数一致"""
+        text1, text2 = "a\nb\nc\n", "a\nx\nc\nd\n"
+        result = diff_tool.DiffResult.from_texts(text1, text2)
+        self.assertEqual(list(result.unified()), diff_tool.compare_texts(text1, text2))
+        self.assertEqual(result.stats(), diff_tool.analyze_changes(text1, text2))
+
+    def test_stats_ignore_line_endings(self):
+        """测试末尾缺少换行或换行符不同不计为修改"""
+        for text1, text2 in (("a\nb", "a\nb\n"), ("a\r\nb\r\n", "a\nb\n")):
+            stats = diff_tool.DiffResult.from_texts(text1, text2).stats()
+            self.assertEqual((stats['modifications'], stats['similarity']), (0, 1.0))
+            self.assertEqual(stats, diff_tool.analyze_changes(text1, text2))
+
+    def test_unknown_view(self):
+        """测试不支持的视图"""
+        with self.assertRaises(ValueError):
+            diff_tool.DiffResult.from_texts("a", "b").render('xml')
+
+
+class TestSideBySide(unittest.TestCase):
+    """并排对比测试类"""
+
+    def test_insertion_keeps_alignment(self):
+        """测试插入一行后后续行仍然对齐"""
+        text1 = "a\nb\nc\nd"
+        text2 = "a\nnew\nb\nc\nd"
+        rows = diff_tool.get_side_by_side_diff(text1, text2, width=10)[2:]
+        markers = [row[11:13] for row in rows]
+        self.assertEqual(markers, ['  ', '>>', '  ', '  ', '  '])
+
+    def test_collapse_unchanged_regions(self):
+        """测试折叠相同区域"""
+        lines1 = [f"{i}" for i in range(100)]
+        lines2 = list(lines1)
+        lines2[50] = "changed"
+        rows = diff_tool.get_side_by_side_diff('\n'.join(lines1), '\n'.join(lines2),
+                                               width=10, collapse=2)[2:]
+        self.assertEqual(len(rows), 7)
+        self.assertIn('省略 48 行', rows[0])
+        self.assertIn('!=', rows[3])
+        self.assertIn('省略 47 行', rows[-1])
+
+    def test_side_by_side_is_lazy(self):
+        """测试并排视图以生成器方式输出"""
+        result = diff_tool.DiffResult.from_texts("a\n" * 10, "a\n" * 10)
+        rows = result.side_by_side(collapse=0)
+        self.assertEqual(next(rows).split()[0], '文本1')
+
+
+class TestIntraline(unittest.TestCase):
+    """行内差异测试类"""
+
+    def test_refine_word_and_char(self):
+        """测试按单词和按字符细化"""
+        old, new = diff_tool.refine_line_pair('foo = 1, bar = 2', 'foo = 1, bar = 3')
+        self.assertEqual(old[-1], ('2', True))
+        self.assertEqual(''.join(text for text, _ in new), 'foo = 1, bar = 3')
+        old, new = diff_tool.refine_line_pair('abcdef', 'abXdef', 'char')
+        self.assertEqual(old, [('ab', False), ('c', True), ('def', False)])
+        self.assertEqual(new, [('ab', False), ('X', True), ('def', False)])
+
+    def test_long_lines_are_skipped(self):
+        """测试超过长度阈值的行不做细化"""
+        self.assertIsNone(diff_tool.refine_line_pair('a' * 50, 'b' * 50, max_length=10))
+        result = diff_tool.DiffResult.from_texts('x' * 50 + '\n', 'y' * 50 + '\n',
+                                                 intraline='char',
+                                                 intraline_max_length=10)
+        self.assertNotIn('[-', ''.join(result.unified()))
+
+    def test_views_mark_changes(self):
+        """测试 unified、side-by-side 和 html 视图标出行内差异"""
+        result = diff_tool.DiffResult.from_texts('a\nfoo bar <b>\nc\n',
+                                                 'a\nfoo qux <b>\nc\n',
+                                                 intraline='word')
+        unified = result.render('unified')
+        self.assertIn('-foo [-bar-] <b>', unified)
+        self.assertIn('+foo {+qux+} <b>', unified)
+        self.assertIn('[-bar-]', '\n'.join(result.render('side-by-side')))
+        page = '\n'.join(result.render('html'))
+        self.assertIn('<span class="del">bar</span> &lt;b&gt;', page)
+        self.assertIn('<span class="ins">qux</span>', page)
+
+    def test_unknown_mode(self):
+        """测试不支持的细化粒度"""
+        with self.assertRaises(ValueError):
+            diff_tool.DiffResult.from_texts("a", "b", intraline='line')
+
+
+class TestNormalizedDiff(unittest.TestCase):
+    """忽略空白/大小写与移动检测测试类"""
+
+    def test_ignore_whitespace_and_case(self):
+        """测试忽略空白和大小写后视为相同"""
+        text1 = "def f(a, b):\n    return a+b\n"
+        text2 = "def f(a,b):\n    RETURN a + b\r\n"
+        stats = diff_tool.DiffResult.from_texts(text1, text2).stats()
+        self.assertEqual(stats['total_changes'], 2)
+        result = diff_tool.DiffResult.from_texts(text1, text2, ignore_whitespace=True,
+                                                 ignore_case=True)
+        self.assertEqual(result.stats()['total_changes'], 0)
+        self.assertEqual(list(result.unified()), [])
+
+    def test_comparison_keys(self):
+        """测试比较键只在需要时计算"""
+        lines = ["A b\n", "A b\n"]
+        self.assertIs(diff_tool.comparison_keys(lines), lines)
+        self.assertEqual(diff_tool.comparison_keys(lines, True, True), ["ab", "ab"])
+
+    def test_detect_moves(self):
+        """测试移动的代码块被识别并在并排视图中标记"""
+        block = [f"moved {i}\n" for i in range(5)]
+        other = [f"other {i}\n" for i in range(10)]
+        result = diff_tool.DiffResult(block + other, other + block, 'myers',
+                                      detect_moves=True)
+        self.assertEqual(result.moves, [(0, 5, 10, 15)])
+        self.assertEqual(result.stats()['moved'], 5)
+        rows = list(result.side_by_side(width=12))[2:]
+        self.assertEqual([row[13:15] for row in rows].count('<~'), 5)
+        self.assertEqual([row[13:15] for row in rows].count('~>'), 5)
+        self.assertNotIn('moved', diff_tool.DiffResult(block, block).stats())
+
+    def test_short_blocks_are_not_moves(self):
+        """测试少于最少行数的块不算移动"""
+        a, b = diff_tool.intern_lines(["x\n", "y\n", "z\n"], ["z\n", "x\n", "y\n"])
+        opcodes = diff_tool.get_opcodes(a, b, 'myers')
+        self.assertEqual(diff_tool.find_moves(a, b, opcodes), [])
+        self.assertEqual(diff_tool.find_moves(a, b, opcodes, min_lines=1),
+                         [(2, 3, 0, 1)])
+
+
+class TestApproximateSimilarity(unittest.TestCase):
+    """MinHash 近似相似度测试类"""
+
+    def test_small_inputs_are_exact(self):
+        """测试 shingle 数量少于签名长度时结果为精确 Jaccard 相似度"""
+        self.assertAlmostEqual(
+            diff_tool.estimate_similarity('a b c d e f', 'a b c d e g'), 0.6)
+        self.assertEqual(
+            diff_tool.estimate_similarity('same text here', 'same text here'), 1.0)
+        self.assertEqual(diff_tool.estimate_similarity('', ''), 1.0)
+        self.assertEqual(diff_tool.estimate_similarity('text', ''), 0.0)
+
+    def test_estimate_within_error_bound(self):
+        """测试大文本的估计值与精确的词 3-shingle Jaccard 相似度相差不超过误差上限"""
+        words = [f"w{i}" for i in range(2000)]
+        for seed in range(7, 12):
+            rng = random.Random(seed)
+            tokens1 = [rng.choice(words) for _ in range(20000)]
+            tokens2 = list(tokens1)
+            for i in range(0, len(tokens2), 20):
+                tokens2[i] = 'changed'
+            text1, text2 = ' '.join(tokens1), ' '.join(tokens2)
+
+            shingles1 = set(zip(tokens1, tokens1[1:], tokens1[2:]))
+            shingles2 = set(zip(tokens2, tokens2[1:], tokens2[2:]))
+            exact = len(shingles1 & shingles2) / len(shingles1 | shingles2)
+            for error in (0.05, 0.02):
+                estimate = diff_tool.get_similarity_ratio(text1, text2, approx=True,
+                                                          error=error)
+                self.assertLessEqual(abs(estimate - exact), error)
+
+    def test_signature_size_from_error(self):
+        """测试签名长度由误差上限决定"""
+        self.assertEqual(diff_tool.signature_size(0.1), 100)
+        with self.assertRaises(ValueError):
+            diff_tool.signature_size(0)
+
+    def test_char_shingles(self):
+        """测试字符 shingle"""
+        similarity = diff_tool.estimate_similarity('abcdefgh', 'abcdefgx', k=3,
+                                                   unit='char')
+        self.assertAlmostEqual(similarity, 5 / 7)
+
+
+class TestNearDuplicates(unittest.TestCase):
+    """近似重复文件查找测试类"""
+
+    def setUp(self):
+        """测试准备"""
+        self.temp_dir = tempfile.mkdtemp()
+        rng = random.Random(3)
+        base = [f"option{i} = {rng.randint(0, 10 ** 6)}\n" for i in range(50)]
+        for variant in range(3):
+            lines = list(base)
+            lines[variant * 10] = f"option{variant} = changed\n"
+            self.write_file(f'similar{variant}.conf', ''.join(lines))
+        for other in range(5):
+            lines = [f"key{rng.randint(0, 10 ** 6)} = {other}\n" for _ in range(50)]
+            self.write_file(f'other{other}.conf', ''.join(lines))
+
+    def tearDown(self):
+        """测试清理"""
+        shutil.rmtree(self.temp_dir)
+
+    def write_file(self, name, content):
+        with open(os.path.join(self.temp_dir, name), 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    def test_find_near_duplicates(self):
+        """测试相似文件被归为一组"""
+        clusters = diff_tool.find_near_duplicates(self.temp_dir, threshold=0.8,
+                                                  max_workers=2)
+        self.assertEqual(len(clusters), 1)
+        self.assertEqual(clusters[0]['files'],
+                         ['similar0.conf', 'similar1.conf', 'similar2.conf'])
+        self.assertGreaterEqual(clusters[0]['min_similarity'], 0.8)
+
+    def test_lsh_signature_is_aligned(self):
+        """测试 LSH 签名长度固定且相同文本签名相同"""
+        signature = diff_tool.lsh_signature("a b c d e f g")
+        self.assertEqual(len(signature), diff_tool.LSH_BINS)
+        self.assertEqual(signature, diff_tool.lsh_signature("a b c d e f g"))
+
+    def test_invalid_threshold(self):
+        """测试无效阈值"""
+        with self.assertRaises(ValueError):
+            diff_tool.find_near_duplicates(self.temp_dir, threshold=0)
+
+
+class TestStreamDiff(unittest.TestCase):
+    """流式文件对比测试类"""
+
+    def setUp(self):
+        """测试准备"""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """测试清理"""
+        shutil.rmtree(self.temp_dir)
+
+    def write_file(self, name, content):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            f.write(content)
+        return path
+
+    def test_stream_matches_compare_files(self):
+        """测试流式对比与内存对比结果一致"""
+        lines = [f"line {i}\n" for i in range(200)]
+        changed = list(lines)
+        changed[10] = "changed\n"
+        del changed[100]
+        changed.insert(150, "inserted\n")
+        file1 = self.write_file('a.txt', ''.join(lines))
+        file2 = self.write_file('b.txt', ''.join(changed))
+        for algorithm in ('myers', 'histogram'):
+            streamed = diff_tool.stream_file_diff(file1, file2, 3, algorithm)
+            self.assertEqual(list(streamed),
+                             diff_tool.compare_files(file1, file2, 3, algorithm))
+
+    def test_stream_identical_and_empty_files(self):
+        """测试相同文件与空文件"""
+        file1 = self.write_file('a.txt', "same\n")
+        file2 = self.write_file('b.txt', "same\n")
+        empty = self.write_file('empty.txt', "")
+        self.assertEqual(list(diff_tool.stream_file_diff(file1, file2)), [])
+        self.assertEqual(list(diff_tool.stream_file_diff(empty, file1))[-1], "+same\n")
+
+    def test_stream_side_by_side(self):
+        """测试流式并排对比"""
+        lines = ''.join(f"line {i}\n" for i in range(100))
+        file1 = self.write_file('a.txt', lines)
+        file2 = self.write_file('b.txt', lines.replace("line 60\n", "line sixty\n"))
+        rows = list(diff_tool.stream_side_by_side(file1, file2, width=20,
+                                                  context_lines=1))[2:]
+        self.assertIn('省略 59 行', rows[0])
+        self.assertIn('!=', rows[2])
+
+    def test_write_unified_diff_marks_missing_newline(self):
+        """测试缺少结尾换行符的行会补充标记"""
+        file1 = self.write_file('a.txt', "a\nb")
+        file2 = self.write_file('b.txt', "a\nc")
+        output = io.StringIO()
+        diff_tool.write_unified_diff(diff_tool.stream_file_diff(file1, file2), output)
+        self.assertIn("-b\n\\ No newline at end of file\n", output.getvalue())
+
+
+class TestMerge(unittest.TestCase):
+    """三方合并测试类"""
+
+    def setUp(self):
+        """测试准备"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.base = [f"line {i}\n" for i in range(20)]
+
+    def tearDown(self):
+        """测试清理"""
+        shutil.rmtree(self.temp_dir)
+
+    def write_file(self, name, lines):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+        return path
+
+    def test_clean_merge(self):
+        """测试两方修改不同区域时自动合并"""
+        ours = list(self.base)
+        ours[2] = "ours\n"
+        theirs = list(self.base)
+        del theirs[15]
+        theirs.append("tail")
+        for algorithm in ('myers', 'histogram'):
+            merged = list(diff_tool.merge_lines(self.base, ours, theirs, algorithm))
+            self.assertEqual(merged, ours[:15] + theirs[15:])
+
+    def test_identical_changes_are_not_conflicts(self):
+        """测试两方相同的修改不产生冲突"""
+        changed = list(self.base)
+        changed[5] = "both\n"
+        regions = list(diff_tool.iter_merge_regions(self.base, changed, changed))
+        self.assertIn('same', [region[0] for region in regions])
+        self.assertEqual(list(diff_tool.merge_lines(self.base, changed, changed)),
+                         changed)
+
+    def test_conflict_markers(self):
+        """测试冲突标记与 diff3 风格输出"""
+        ours = list(self.base)
+        ours[5] = "ours"
+        theirs = list(self.base)
+        theirs[5] = "theirs\n"
+        merged = list(diff_tool.merge_lines(self.base, ours, theirs, base_label='base'))
+        start = merged.index("<<<<<<< ours\n")
+        self.assertEqual(merged[start:start + 7],
+                         ["<<<<<<< ours\n", "ours\n", "||||||| base\n", "line 5\n",
+                          "=======\n", "theirs\n", ">>>>>>> theirs\n"])
+
+    def test_merge_files_counts_conflicts(self):
+        """测试合并文件时流式写出并统计冲突"""
+        ours = list(self.base)
+        ours[1] = "ours\n"
+        theirs = list(self.base)
+        theirs[1] = "theirs\n"
+        paths = [self.write_file(name, lines) for name, lines in
+                 (('base.txt', self.base), ('ours.txt', ours), ('theirs.txt', theirs))]
+        output = io.StringIO()
+        self.assertEqual(diff_tool.merge_files(*paths, output), 1)
+        self.assertIn(f">>>>>>> {paths[2]}\n", output.getvalue())
+
+    @unittest.skipIf(os.name == 'nt', "Windows 不支持完整的权限位")
+    def test_main_merge_keeps_output_mode(self):
+        """测试命令行合并结果写回 OURS 时保留原文件的权限位"""
+        ours = list(self.base)
+        ours[2] = "ours\n"
+        theirs = list(self.base)
+        theirs[15] = "theirs\n"
+        paths = [self.write_file(name, lines) for name, lines in
+                 (('base.txt', self.base), ('ours.txt', ours), ('theirs.txt', theirs))]
+        os.chmod(paths[1], 0o640)
+        parser = argparse.ArgumentParser()
+        diff_tool.register_parser(parser.add_subparsers())
+        args = parser.parse_args(['diff', '--merge', *paths, '--output', paths[1]])
+        with contextlib.redirect_stdout(io.StringIO()):
+            diff_tool.main(args)
+        with open(paths[1], encoding='utf-8') as f:
+            self.assertEqual(f.readlines(), ours[:15] + theirs[15:])
+        self.assertEqual(stat.S_IMODE(os.stat(paths[1]).st_mode), 0o640)
+        self.assertEqual(sorted(os.listdir(self.temp_dir)),
+                         ['base.txt', 'ours.txt', 'theirs.txt'])
+
+
+class TestPatchApply(unittest.TestCase):
+    """补丁应用测试类"""
+
+    def setUp(self):
+        """测试准备"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.lines = [f"line {i}\n" for i in range(30)]
+        self.changed = list(self.lines)
+        self.changed[3] = "changed\n"
+        del self.changed[20]
+        self.changed.append("tail\n")
+
+    def tearDown(self):
+        """测试清理"""
+        shutil.rmtree(self.temp_dir)
+
+    def write_file(self, name, content):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def parse(self, lines1, lines2, fromfile='a', tofile='a'):
+        output = io.StringIO()
+        diff = difflib.unified_diff(lines1, lines2, fromfile, tofile)
+        diff_tool.write_unified_diff(diff, output)
+        return list(diff_tool.parse_patch(output.getvalue().splitlines(keepends=True)))
+
+    def test_roundtrip(self):
+        """测试应用生成的补丁得到目标内容"""
+        target = self.changed[:-1] + ["no newline"]
+        patches = self.parse(self.lines, target)
+        self.assertEqual(len(patches), 1)
+        result, applied = diff_tool.apply_hunks(self.lines, patches[0]['hunks'])
+        self.assertEqual(result, target)
+        self.assertEqual({offset for offset, _ in applied}, {0})
+
+    def test_offset_and_fuzz(self):
+        """测试上下文移动后的偏移搜索与模糊匹配"""
+        hunks = self.parse(self.lines, self.changed)[0]['hunks']
+        moved = ["extra\n"] * 5 + self.lines
+        result, applied = diff_tool.apply_hunks(moved, hunks)
+        self.assertEqual(result, ["extra\n"] * 5 + self.changed)
+        self.assertEqual(applied[0][0], 5)
+
+        edited = list(self.lines)
+        edited[0] = "context changed\n"
+        with self.assertRaises(ValueError):
+            diff_tool.apply_hunks(edited, hunks)
+        result, applied = diff_tool.apply_hunks(edited, hunks, fuzz=1)
+        self.assertEqual(result[3], "changed\n")
+        self.assertEqual(applied[0][1], 1)
+
+    def test_apply_patch_multiple_files(self):
+        """测试多文件补丁：修改、新建、删除，失败的文件保持不变"""
+        self.write_file('a.txt', ''.join(self.lines))
+        self.write_file('gone.txt', "bye\n")
+        self.write_file('bad.txt', "unrelated\n")
+        patch = ''.join(
+            list(difflib.unified_diff(self.lines, self.changed, 'a/a.txt', 'b/a.txt')) +
+            list(difflib.unified_diff([], ["hello\n"], '/dev/null', 'b/new.txt')) +
+            list(difflib.unified_diff(["bye\n"], [], 'a/gone.txt', '/dev/null')) +
+            list(difflib.unified_diff(["x\n"], ["y\n"], 'a/bad.txt', 'b/bad.txt')))
+        patch_path = self.write_file('all.patch', patch)
+
+        results = diff_tool.apply_patch(patch_path, self.temp_dir, max_workers=2)
+        statuses = {os.path.basename(result['file']): result['status']
+                    for result in results}
+        self.assertEqual(statuses, {'a.txt': 'ok', 'new.txt': 'created',
+                                    'gone.txt': 'deleted', 'bad.txt': 'failed'})
+        with open(os.path.join(self.temp_dir, 'a.txt'), encoding='utf-8') as f:
+            self.assertEqual(f.readlines(), self.changed)
+        with open(os.path.join(self.temp_dir, 'bad.txt'), encoding='utf-8') as f:
+            self.assertEqual(f.read(), "unrelated\n")
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, 'gone.txt')))
+        self.assertIn("失败: 1 个文件", diff_tool.format_patch_results(results)[0])
+
+    def test_apply_patch_rejects_paths_outside_directory(self):
+        """测试补丁中的 .. 路径和绝对路径被拒绝，不会写到目录之外"""
+        work_dir = os.path.join(self.temp_dir, 'work')
+        os.makedirs(work_dir)
+        outside = os.path.join(self.temp_dir, 'escaped.txt')
+        for name in ('../escaped.txt', outside, 'sub/../../escaped.txt'):
+            patch = ''.join(difflib.unified_diff([], ["pwned\n"], '/dev/null', name))
+            patch_path = self.write_file('evil.patch', patch)
+            with self.assertRaises(ValueError):
+                diff_tool.apply_patch(patch_path, work_dir, strip=0)
+            self.assertFalse(os.path.exists(outside))
+
+    def test_truncated_patch(self):
+        """测试不完整的补丁"""
+        with self.assertRaises(ValueError):
+            list(diff_tool.parse_patch(["--- a\n", "+++ a\n", "@@ -1,2 +1,2 @@\n",
+                                        " x\n"]))
+
+
+class TestBinaryDiff(unittest.TestCase):
+    """二进制文件对比测试类"""
+
+    def setUp(self):
+        """测试准备"""
+        self.temp_dir = tempfile.mkdtemp()
+        rng = random.Random(0)
+        self.data = bytes(rng.getrandbits(8) for _ in range(300000))
+
+    def tearDown(self):
+        """测试清理"""
+        shutil.rmtree(self.temp_dir)
+
+    def write_file(self, name, content):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def test_is_binary_file(self):
+        """测试采样检测二进制文件"""
+        self.assertTrue(diff_tool.is_binary_file(self.write_file('a.bin', b'abc\0def')))
+        self.assertTrue(diff_tool.is_binary_file(self.write_file('b.bin', b'\xff\xfe')))
+        # 采样边界截断多字节字符不算二进制
+        text = self.write_file('c.txt', '中文'.encode('utf-8') * 10)
+        self.assertFalse(diff_tool.is_binary_file(text, sample_size=4))
+
+    def test_fixed_block_ranges(self):
+        """测试按位置分块对比"""
+        changed = bytearray(self.data)
+        changed[5000:5010] = b'x' * 10
+        file1 = self.write_file('a.bin', self.data)
+        file2 = self.write_file('b.bin', bytes(changed) + b'tail')
+        result = diff_tool.compare_binary_files(file1, file2, block_size=1024)
+        self.assertEqual(result['ranges'], [(4096, 5120, 4096, 5120),
+                                            (300000, 300000, 300000, 300004)])
+        self.assertEqual(result['changed_bytes'], 1028)
+        self.assertIn('2 处', diff_tool.format_binary_diff(result)[1])
+
+    def test_cdc_handles_insertion(self):
+        """测试内容定义分块在插入数据后只报告附近的块"""
+        inserted = self.data[:100000] + b'INSERTED' + self.data[100000:]
+        file1 = self.write_file('a.bin', self.data)
+        file2 = self.write_file('b.bin', inserted)
+        fixed = diff_tool.compare_binary_files(file1, file2, 'fixed')
+        cdc = diff_tool.compare_binary_files(file1, file2, 'cdc', block_size=256)
+        self.assertGreater(fixed['change_ratio'], 0.5)
+        self.assertLess(cdc['change_ratio'], 0.5)
+        for s1, e1, s2, e2 in cdc['ranges']:
+            self.assertTrue(s1 <= 100000 <= e1)
+            self.assertEqual((e2 - s2) - (e1 - s1), 8)
+        same = diff_tool.compare_binary_files(file1, file1, 'cdc')
+        self.assertEqual(same['ranges'], [])
+        self.assertEqual(diff_tool.format_binary_diff(same)[-1], "内容相同")
+
+    def test_compare_files_binary(self):
+        """测试 compare_files 遇到二进制文件不再解码失败"""
+        file1 = self.write_file('a.bin', b'\0\1\2')
+        file2 = self.write_file('b.bin', b'\0\1\3')
+        self.assertIn("二进制文件", diff_tool.compare_files(file1, file2)[0])
+        self.assertEqual(diff_tool.compare_files(file1, file1), [])
+
+
+class TestDirectoryDiff(unittest.TestCase):
+    """目录对比测试类"""
+
+    def setUp(self):
+        """测试准备"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.dir1 = os.path.join(self.temp_dir, 'a')
+        self.dir2 = os.path.join(self.temp_dir, 'b')
+        for directory in (self.dir1, self.dir2):
+            os.makedirs(os.path.join(directory, 'sub'))
+            for i in range(5):
+                self.write_file(directory, f'sub/file{i}.txt', f"content {i}\n")
+        self.write_file(self.dir1, 'removed.txt', "old\n")
+        self.write_file(self.dir2, 'added.txt', "new\n")
+        self.write_file(self.dir2, 'sub/file1.txt', "content X\n")
+        self.write_file(self.dir2, 'sub/file2.txt', "content 2\nmore\n")
+
+    def tearDown(self):
+        """测试清理"""
+        shutil.rmtree(self.temp_dir)
+
+    def write_file(self, directory, name, content):
+        with open(os.path.join(directory, name), 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    def test_compare_directories_summary(self):
+        """测试目录对比的新增、删除、修改统计"""
+        result = diff_tool.compare_directories(self.dir1, self.dir2)
+        self.assertEqual(result['added'], ['added.txt'])
+        self.assertEqual(result['removed'], ['removed.txt'])
+        self.assertEqual(result['changed'], ['sub/file1.txt', 'sub/file2.txt'])
+        self.assertEqual(result['identical'], 3)
+        self.assertEqual(result['hunks'], {})
+
+    def test_compare_directories_hunks(self):
+        """测试目录对比输出修改文件的差异块"""
+        result = diff_tool.compare_directories(self.dir1, self.dir2, include_hunks=True)
+        self.assertIn("+more\n", result['hunks']['sub/file2.txt'])
+        self.assertIn("-content 1\n", result['hunks']['sub/file1.txt'])
+
+    def test_missing_directory(self):
+        """测试目录不存在"""
+        with self.assertRaises(FileNotFoundError):
+            diff_tool.compare_directories(self.dir1,
+                                          os.path.join(self.temp_dir, 'missing'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+"""
+测试代码静态检查工具
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from devkit_zero.tools import linter
+
+
+class TestLinterGuards(unittest.TestCase):
+    """代码检查资源保护测试类"""
+
+    def setUp(self):
+        """测试准备"""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """测试清理"""
+        shutil.rmtree(self.temp_dir)
+
+    def write_file(self, name, content):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def test_lint_file_normal(self):
+        """测试普通文件正常检查"""
+        path = self.write_file('ok.py', "def BadName():\n    pass\n")
+        issues = linter.lint_file(path)
+        types = [issue['type'] for issue in issues]
+        self.assertIn('missing_docstring', types)
+        self.assertNotIn('resource_guard', types)
+
+    def test_size_guard_skips_file(self):
+        """测试超过大小上限的文件被跳过"""
+        path = self.write_file('big.py', "x = 1\n" * 1000)
+        issues = linter.lint_file(path, max_file_size=100)
+        self.assertEqual(len(issues), 1)
+        self.assertEqual(issues[0]['type'], 'resource_guard')
+
+    def test_timeout_guard_in_worker(self):
+        """测试在子进程中解析超时后跳过"""
+        path = self.write_file('slow.py', "x = 1\n" * 20000)
+        with linter.GuardedLinter(parse_timeout=0.000001, inline_limit=0) as guarded:
+            record = guarded.lint_file(path)
+        self.assertEqual(record['status'], 'skipped')
+        self.assertEqual(record['guard'], 'timeout')
+
+    def test_worker_path_returns_issues(self):
+        """测试子进程解析路径返回正常检查结果"""
+        path = self.write_file('worker.py', "class bad:\n    pass\n")
+        with linter.GuardedLinter(inline_limit=0) as guarded:
+            record = guarded.lint_file(path)
+        self.assertEqual(record['status'], 'ok')
+        self.assertEqual(record['issues'][0]['type'], 'naming_convention')
+
+    def test_lint_directory_reports_guarded_files(self):
+        """测试目录扫描报告触发保护的文件"""
+        self.write_file('a.py', "def f():\n    pass\n")
+        self.write_file('b.py', "y = 2\n" * 500)
+        records = linter.lint_directory(self.temp_dir, max_file_size=1024)
+        self.assertEqual(len(records), 2)
+        guarded = [record for record in records if record['guard']]
+        self.assertEqual(len(guarded), 1)
+        self.assertTrue(guarded[0]['file'].endswith('b.py'))
+
+        report = linter.format_directory_report(records)
+        self.assertIn('b.py', report)
+        self.assertIn('1 个文件触发资源保护', report)
+
+    def test_non_utf8_file_is_skipped(self):
+        """测试非 UTF-8 文件给出诊断，不会中断目录扫描"""
+        self.write_file('a.py', "x = 1\n")
+        with open(os.path.join(self.temp_dir, 'latin.py'), 'wb') as f:
+            f.write("s = 'caf\u00e9'\n".encode('latin-1'))
+        records = linter.lint_directory(self.temp_dir)
+        self.assertEqual(len(records), 2)
+        skipped = [record for record in records if record['guard'] == 'encoding']
+        self.assertEqual(len(skipped), 1)
+        self.assertEqual(skipped[0]['issues'][0]['type'], 'resource_guard')
+
+
+if __name__ == '__main__':
+    unittest.main()